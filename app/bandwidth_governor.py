@@ -0,0 +1,135 @@
+"""
+Bandwidth governor - one process-wide limit shared by every HTTP and torrent
+job, with optional time-of-day schedules (e.g. full speed at night, 20%
+during office hours).
+"""
+import re
+import time
+import threading
+from datetime import datetime
+
+JOB_HTTP = 'http'
+JOB_TORRENT = 'torrent'
+
+MAX_SLEEP = 2.0  # Longest single sleep in throttle(), so rate changes are picked up quickly
+
+
+def parse_schedule(text):
+    """
+    Parse a schedule like "01:00-07:00=100, 09:00-17:00=20" into a list of
+    (start_minute, end_minute, percent). Ranges may wrap around midnight.
+    """
+    rules = []
+    for part in text.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        match = re.match(r'^(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*=\s*(\d{1,3})%?$', part)
+        if not match:
+            raise ValueError(f"Invalid schedule rule: '{part}' (expected HH:MM-HH:MM=PERCENT)")
+        start_h, start_m, end_h, end_m, percent = (int(value) for value in match.groups())
+        if start_h > 23 or end_h > 24 or start_m > 59 or end_m > 59:
+            raise ValueError(f"Invalid time in schedule rule: '{part}'")
+        rules.append((start_h * 60 + start_m, end_h * 60 + end_m, min(max(percent, 1), 100)))
+    return rules
+
+
+class BandwidthGovernor:
+    """
+    Splits a total download rate (bytes/s, 0 = unlimited) across all
+    registered jobs in proportion to their weights. HTTP downloads are
+    throttled with a token bucket per job; torrent jobs read their share
+    through rate_for() and apply it to their libtorrent handle.
+    """
+
+    def __init__(self, total_limit=0, upload_limit=0, schedule=None):
+        self.total_limit = total_limit
+        self.upload_limit = upload_limit
+        self.schedule = schedule or []
+        self._jobs = {}  # job_key -> {'weight', 'kind', 'tokens', 'last'}
+        self._lock = threading.Lock()
+
+    def set_total_limit(self, bytes_per_second):
+        with self._lock:
+            self.total_limit = max(0, int(bytes_per_second))
+
+    def set_upload_limit(self, bytes_per_second):
+        with self._lock:
+            self.upload_limit = max(0, int(bytes_per_second))
+
+    def set_schedule(self, rules):
+        with self._lock:
+            self.schedule = list(rules)
+
+    def register(self, job_key, weight=1.0, kind=JOB_HTTP):
+        with self._lock:
+            self._jobs[job_key] = {'weight': max(weight, 0.01), 'kind': kind, 'tokens': 0.0, 'last': time.monotonic()}
+
+    def unregister(self, job_key):
+        with self._lock:
+            self._jobs.pop(job_key, None)
+
+    def schedule_percent(self, now=None):
+        """Percentage of the total limit allowed at the given time (100 when no rule matches)."""
+        now = now or datetime.now()
+        minute = now.hour * 60 + now.minute
+        for start, end, percent in self.schedule:
+            if start <= end:
+                if start <= minute < end:
+                    return percent
+            elif minute >= start or minute < end:
+                return percent
+        return 100
+
+    def _scaled(self, limit):
+        """Apply the schedule to a limit. Without a total limit a schedule caps nothing."""
+        if not limit:
+            return 0
+        return limit * self.schedule_percent() / 100.0
+
+    def rate_for(self, job_key):
+        """Current download share for a job in bytes/s, or 0 when unlimited."""
+        with self._lock:
+            return self._share(job_key, self._scaled(self.total_limit), kinds=None)
+
+    def upload_rate_for(self, job_key):
+        """Current upload share for a torrent job in bytes/s, or 0 when unlimited."""
+        with self._lock:
+            return self._share(job_key, self._scaled(self.upload_limit), kinds=(JOB_TORRENT,))
+
+    def _share(self, job_key, total, kinds):
+        job = self._jobs.get(job_key)
+        if not total or job is None:
+            return 0
+        weights = sum(other['weight'] for other in self._jobs.values() if kinds is None or other['kind'] in kinds)
+        return max(1.0, total * job['weight'] / weights)
+
+    def throttle(self, job_key, nbytes):
+        """Account `nbytes` received by a job and sleep if it is ahead of its share."""
+        rate = self.rate_for(job_key)
+        if not rate or nbytes <= 0:
+            return
+        with self._lock:
+            job = self._jobs.get(job_key)
+            if job is None:
+                return
+            now = time.monotonic()
+            # Refill, allowing at most one second of burst
+            job['tokens'] = min(rate, job['tokens'] + (now - job['last']) * rate) - nbytes
+            job['last'] = now
+            deficit = -job['tokens']
+        if deficit > 0:
+            time.sleep(min(deficit / rate, MAX_SLEEP))
+
+
+_governor = None
+_governor_lock = threading.Lock()
+
+
+def get_bandwidth_governor():
+    """Return the process-wide bandwidth governor."""
+    global _governor
+    with _governor_lock:
+        if _governor is None:
+            _governor = BandwidthGovernor()
+        return _governor
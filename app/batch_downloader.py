@@ -1,68 +1,262 @@
 import os
-import requests
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QTextEdit, QPushButton, QHBoxLayout, QFileDialog, QMessageBox, QProgressBar, QDialog
-from PyQt5.QtCore import QThread, pyqtSignal, QObject
+import queue
+import threading
+import time
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QTextEdit, QPushButton, QHBoxLayout, QFileDialog, QMessageBox, QProgressBar, QSpinBox
+from PyQt5.QtCore import Qt, QThread, pyqtSignal, QObject
 import yt_dlp
-import json
 import logging
 from app.logger import YTDLPLogger
+from app.bandwidth_governor import get_bandwidth_governor
+from app.progress_bus import get_progress_bus
+from app.extraction_cache import extract_info_cached, get_extraction_cache, cache_variant
+from app.duplicate_check import DuplicateChecker
+from app.url_utils import normalize_url
+from app.history_store import get_history_store
+from app.thumbnail_fetcher import get_thumbnail_fetcher
+from app.download_worker import history_entry
 
 class BatchDownloadWorker(QObject):
     progress_updated = pyqtSignal(int)
+    url_finished = pyqtSignal(dict)  # {url, success, error, filename, duplicate}
     output_received = pyqtSignal(str)
-    batch_download_finished = pyqtSignal()
+    batch_download_finished = pyqtSignal(list)  # per-URL results
     batch_download_failed = pyqtSignal(str)
 
-    def __init__(self, urls, output_folder, settings_tab):
+    def __init__(self, urls, output_folder, settings_tab, max_workers=1, scheduler=None):
         super().__init__()
         self.urls = urls
         self.output_folder = output_folder
         self.settings_tab = settings_tab
+        # Global DownloadScheduler; every URL waits there for a slot like any other download
+        self.scheduler = scheduler
+        self.max_workers = max(1, min(max_workers, len(urls) or 1))
         self.total_urls = len(urls)
         self.urls_downloaded = 0
+        self.urls_failed = 0
+        self.results = []
+        self.running = True
+        self._lock = threading.Lock()
+        self._url_queue = queue.Queue()
+        self._bytes = {}  # url -> (downloaded_bytes, total_bytes, speed)
+        self._totals = [0, 0, 0]  # running sums of the _bytes columns
+        self._start_time = None
+        # Aggregate progress is published on the progress bus under this key
+        self.progress_key = f"batch:{id(self)}"
+        # Videos already in the download history are skipped or linked instead of downloaded
+        self.duplicates = DuplicateChecker(settings_tab.get_duplicate_policy())
 
     def run(self):
         try:
-            for idx, url in enumerate(self.urls):
-                self.download_single_video(url)
-                self.urls_downloaded += 1
-                progress = int((self.urls_downloaded / self.total_urls) * 100)
-                self.progress_updated.emit(progress)
-            self.batch_download_finished.emit()
+            self._start_time = time.time()
+            seen = set()
+            for url in self.urls:
+                # The same video (or playlist) listed twice in one batch is only downloaded once
+                key = normalize_url(url, keep_playlist=True)
+                if key in seen:
+                    self.duplicates.skipped += 1
+                    self._record_result({'url': url, 'success': True, 'error': None, 'filename': None,
+                                         'duplicate': True})
+                    continue
+                seen.add(key)
+                self._url_queue.put(url)
+
+            # Each worker thread owns one YoutubeDL instance and pulls URLs
+            # from the shared queue until it is empty
+            threads = [
+                threading.Thread(target=self._worker_loop, name=f"batch-worker-{i}", daemon=True)
+                for i in range(self.max_workers)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            self._publish_aggregate()
+            self.batch_download_finished.emit(self.results)
         except Exception as e:
             self.batch_download_failed.emit(str(e))
+        finally:
+            get_progress_bus().remove(self.progress_key)
+
+    def stop(self):
+        """Cancel the batch: no new URLs are started and running downloads abort at their next progress update."""
+        self.running = False
 
-    def download_single_video(self, url):
+    def _wait_for_slot(self, url):
+        """Queue a URL with the download scheduler and block until it may start; None if the batch was stopped."""
+        started = threading.Event()
+        job_id = self.scheduler.submit(url, lambda job_id: started.set())
+        while not started.wait(0.2):
+            if not self.running:
+                if not self.scheduler.cancel(job_id):
+                    # Got its slot meanwhile
+                    self.scheduler.job_done(job_id, success=False, error="Cancelled")
+                return None
+        return job_id
+
+    def _worker_loop(self):
+        # Every worker thread is one job for the bandwidth governor
+        governor = get_bandwidth_governor()
+        governor_key = f"batch:{id(self)}:{threading.get_ident()}"
+        governor.register(governor_key)
+        state = {'url': None, 'governor_key': governor_key, 'accounted': 0, 'duplicate': None}
+        logger = YTDLPLogger()
+        # Emitted straight from this thread; a queued connection would wait for the worker's (busy) thread
+        logger.output_signal.connect(self.output_received, Qt.DirectConnection)
+        ydl_opts = {
+            'outtmpl': os.path.join(self.output_folder, '%(title)s.%(ext)s'),
+            'format': 'best',
+            'logger': logger,
+            'progress_hooks': [lambda d: self.my_hook(d, state)],
+            'match_filter': lambda info, *, incomplete=False: self.filter_entry(info, state),
+            'quiet': True,
+            'no_warnings': True,
+            'noprogress': True,
+        }
         try:
-            ydl_opts = {
-                'outtmpl': os.path.join(self.output_folder, '%(title)s.%(ext)s'),
-                'format': 'best',
-                'logger': YTDLPLogger(self.output_received),
-                'progress_hooks': [self.my_hook],
-                'quiet': True,
-                'no_warnings': True,
-            }
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([url])
+                while self.running:
+                    try:
+                        url = self._url_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    job_id = None
+                    if self.scheduler is not None:
+                        job_id = self._wait_for_slot(url)
+                        if job_id is None:
+                            break
+                    state['url'] = url
+                    state['accounted'] = 0
+                    state['duplicate'] = None
+                    result = self.download_single_video(ydl, url, state)
+                    if job_id is not None:
+                        self.scheduler.job_done(job_id, success=result['success'], error=result['error'])
+                    self._record_result(result)
+        finally:
+            governor.unregister(governor_key)
+
+    def download_single_video(self, ydl, url, state):
+        """Download one URL and return its result instead of raising, so one bad link doesn't stop the batch."""
+        result = {'url': url, 'success': False, 'error': None, 'filename': None, 'duplicate': False}
+        try:
+            # A link already in the history costs no extraction at all
+            existing = self.duplicates.find(url=url)
+            if existing is not None:
+                state['duplicate'] = self.handle_duplicate(existing)
+            else:
+                info = extract_info_cached(ydl, url, variant=cache_variant('best'))
+                # Other links to a video in the history are caught by filter_entry
+                info = ydl.process_ie_result(info, download=True)
+                if info and not state['duplicate']:
+                    result['filename'] = ydl.prepare_filename(info)
+            if state['duplicate']:
+                result['filename'] = state['duplicate']
+                result['duplicate'] = True
+            result['success'] = True
+        except yt_dlp.utils.DownloadCancelled:
+            result['error'] = "Cancelled"
         except Exception as e:
+            get_extraction_cache().invalidate(url, cache_variant('best'))
+            result['error'] = str(e)
+            logging.error(f"Batch download failed for {url}: {e}")
             self.output_received.emit(f"Error downloading {url}: {e}")
-            raise Exception(f"Failed to download {url}: {e}")
+        return result
+
+    def filter_entry(self, info, state):
+        """yt-dlp match_filter: skip (or link) videos that are already in the download history."""
+        existing = self.duplicates.find(info=info)
+        if existing is None:
+            return None
+        state['duplicate'] = self.handle_duplicate(existing)
+        return "Already in the download history"
+
+    def handle_duplicate(self, existing):
+        path = self.duplicates.handle(existing, self.output_folder)
+        self.output_received.emit(f"Already downloaded: {existing.get('title', 'Unknown Title')} ({path})")
+        return path
+
+    def save_history_entry(self, info, filename):
+        """Record a finished file in the download history, so a re-run of the batch recognises it."""
+        try:
+            entry_id = get_history_store().add(history_entry(info, filename))
+            if self.settings_tab.download_thumbnails_checkbox.isChecked():
+                get_thumbnail_fetcher().fetch(
+                    info, lambda thumbnail_path: get_history_store().update(entry_id, thumbnail=thumbnail_path))
+        except Exception as e:
+            logging.error(f"Error saving batch download to history: {e}")
+
+    def _record_result(self, result):
+        with self._lock:
+            self.results.append(result)
+            if result['success']:
+                self.urls_downloaded += 1
+            else:
+                self.urls_failed += 1
+            done = self.urls_downloaded + self.urls_failed
+        self.progress_updated.emit(int((done / self.total_urls) * 100))
+        self.url_finished.emit(result)
+        self._publish_aggregate()
+
+    def _set_url_bytes(self, url, downloaded, total, speed):
+        """Update one URL's byte counters and the running totals in O(1). Caller holds the lock."""
+        previous = self._bytes.get(url, (0, 0, 0))
+        current = (downloaded, total, speed)
+        self._bytes[url] = current
+        for index in range(3):
+            self._totals[index] += current[index] - previous[index]
 
-    def my_hook(self, d):
+    def _publish_aggregate(self):
+        """Put combined progress for the whole batch on the progress bus; the GUI samples it."""
+        with self._lock:
+            downloaded_bytes, total_bytes, speed = self._totals
+            items_done = self.urls_downloaded + self.urls_failed
+            items_failed = self.urls_failed
+
+        # Estimate the remaining time from the average time per finished item
+        elapsed = time.time() - self._start_time if self._start_time else 0
+        eta = None
+        if items_done:
+            eta = int(elapsed / items_done * (self.total_urls - items_done))
+        get_progress_bus().update(
+            self.progress_key,
+            items_done=items_done,
+            items_failed=items_failed,
+            items_total=self.total_urls,
+            downloaded_bytes=downloaded_bytes,
+            total_bytes=total_bytes,
+            speed=speed,
+            eta=eta,
+        )
+
+    def my_hook(self, d, state):
+        url = state['url']
         if d['status'] == 'downloading':
-            filename = d.get('filename', 'unknown')
-            speed = d.get('_speed_str', '')
-            eta = d.get('_eta_str', '')
-            progress = d.get('_percent_str', '').strip()
-            self.output_received.emit(f"{filename} - {progress} - Speed: {speed} - ETA: {eta}")
+            if not self.running:
+                raise yt_dlp.utils.DownloadCancelled("Batch download stopped")
+            total = d.get('total_bytes') or d.get('total_bytes_estimate') or 0
+            downloaded = d.get('downloaded_bytes') or 0
+            with self._lock:
+                self._set_url_bytes(url, downloaded, total, d.get('speed') or 0)
+            self._publish_aggregate()
+            # Sleeps here if this worker is above its share of the bandwidth limit
+            get_bandwidth_governor().throttle(state['governor_key'], downloaded - state['accounted'])
+            state['accounted'] = downloaded
         elif d['status'] == 'finished':
+            with self._lock:
+                downloaded = d.get('downloaded_bytes') or d.get('total_bytes') or 0
+                self._set_url_bytes(url, downloaded, downloaded, 0)
             filename = d.get('filename', 'unknown')
             self.output_received.emit(f"Finished downloading {filename}")
+            if isinstance(d.get('info_dict'), dict):
+                self.save_history_entry(d['info_dict'], filename)
 
 class BatchDownloader(QWidget):
-    def __init__(self, settings_tab):
+    def __init__(self, settings_tab, scheduler=None):
         super().__init__()
         self.settings_tab = settings_tab
+        self.scheduler = scheduler
+        self.worker = None
         self.layout = QVBoxLayout()
 
         self.label = QLabel("Batch Download Videos")
@@ -75,27 +269,43 @@ class BatchDownloader(QWidget):
         self.save_button = QPushButton("Save to TXT File")
         self.save_button.clicked.connect(self.save_to_txt)
 
+        # Number of URLs downloaded in parallel
+        self.parallel_label = QLabel("Parallel Downloads:")
+        self.parallel_spin = QSpinBox()
+        self.parallel_spin.setRange(1, 16)
+        self.parallel_spin.setValue(4)
+
         self.download_now_button = QPushButton("Download Now")
         self.download_now_button.clicked.connect(self.download_all_files)
 
+        self.stop_button = QPushButton("Stop")
+        self.stop_button.setEnabled(False)
+        self.stop_button.clicked.connect(self.stop_batch)
+
         self.add_to_download_later_button = QPushButton("Add to Download Later")
         self.add_to_download_later_button.clicked.connect(self.add_to_download_later)
 
         # Layout for buttons
         button_layout = QHBoxLayout()
+        button_layout.addWidget(self.parallel_label)
+        button_layout.addWidget(self.parallel_spin)
         button_layout.addWidget(self.save_button)
         button_layout.addWidget(self.download_now_button)
+        button_layout.addWidget(self.stop_button)
         button_layout.addWidget(self.add_to_download_later_button)
 
         # Progress bar for download
         self.progress_bar = QProgressBar()
         self.progress_bar.setValue(0)
+        self.batch_status_label = QLabel("")
+        get_progress_bus().snapshot_ready.connect(self.on_progress_snapshot)
 
         # Add widgets to the layout
         self.layout.addWidget(self.label)
         self.layout.addWidget(self.url_text_edit)
         self.layout.addLayout(button_layout)
         self.layout.addWidget(self.progress_bar)
+        self.layout.addWidget(self.batch_status_label)
         self.setLayout(self.layout)
 
     def save_to_txt(self):
@@ -116,7 +326,7 @@ class BatchDownloader(QWidget):
 
     def download_all_files(self):
         """Download the URLs in the text area."""
-        urls = self.url_text_edit.toPlainText().splitlines()
+        urls = [url.strip() for url in self.url_text_edit.toPlainText().splitlines() if url.strip()]
         self.download_files(urls)
 
     def download_files(self, urls):
@@ -129,7 +339,8 @@ class BatchDownloader(QWidget):
 
         if output_folder:
             self.thread = QThread()
-            self.worker = BatchDownloadWorker(urls, output_folder, self.settings_tab)
+            self.worker = BatchDownloadWorker(urls, output_folder, self.settings_tab, self.parallel_spin.value(),
+                                              scheduler=self.scheduler)
             self.worker.moveToThread(self.thread)
 
             # Connect signals
@@ -142,17 +353,70 @@ class BatchDownloader(QWidget):
             self.thread.finished.connect(self.thread.deleteLater)
 
             self.thread.start()
+            self.download_now_button.setEnabled(False)
+            self.stop_button.setEnabled(True)
         else:
             QMessageBox.warning(self, "Folder Selection", "Please select an output folder.")
 
+    def stop_batch(self):
+        """Cancel the running batch; URLs not started yet are left out."""
+        if self.worker is not None:
+            # Only sets a flag, so it is safe to call on the worker from the GUI thread
+            self.worker.stop()
+            self.stop_button.setEnabled(False)
+            self.batch_status_label.setText("Stopping...")
+
+    def finish_batch(self):
+        self.download_now_button.setEnabled(True)
+        self.stop_button.setEnabled(False)
+        self.thread.quit()
+
     def output_received(self, text):
         # Handle output from the worker (e.g., print to console or log)
         print(text)
 
-    def on_batch_download_complete(self):
-        QMessageBox.information(self, "Batch Download Complete", "All videos downloaded successfully.")
-        self.thread.quit()
+    def on_progress_snapshot(self, snapshot):
+        """Pick the running batch out of a progress bus snapshot."""
+        if self.worker is None:
+            return
+        stats = snapshot.get(self.worker.progress_key)
+        if stats is not None:
+            self.update_batch_status(stats)
+
+    def update_batch_status(self, stats):
+        """Show aggregate progress (items, bytes, speed, ETA) for the running batch."""
+        downloaded_mb = stats['downloaded_bytes'] / (1024 * 1024)
+        speed_kb = stats['speed'] / 1024
+        eta = stats['eta']
+        eta_text = f"{eta // 60} min {eta % 60} sec" if eta is not None else "Unknown"
+        self.batch_status_label.setText(
+            f"Items: {stats['items_done']}/{stats['items_total']} "
+            f"(Failed: {stats['items_failed']}) | Downloaded: {downloaded_mb:.2f} MB | "
+            f"Speed: {speed_kb:.1f} KB/s | ETA: {eta_text}"
+        )
+
+    def on_batch_download_complete(self, results):
+        failed = [result for result in results if not result['success']]
+        duplicates = self.worker.duplicates.summary()
+        duplicates_text = f"\n{duplicates}." if duplicates else ""
+        if not self.worker.running:
+            QMessageBox.information(
+                self, "Batch Download Stopped",
+                f"{len(results) - len(failed)} of {self.worker.total_urls} videos downloaded "
+                f"before the batch was stopped.{duplicates_text}"
+            )
+        elif failed:
+            failed_urls = "\n".join(result['url'] for result in failed[:20])
+            QMessageBox.warning(
+                self, "Batch Download Complete",
+                f"{len(results) - len(failed)} of {len(results)} videos downloaded.{duplicates_text}"
+                f"\n\nFailed:\n{failed_urls}"
+            )
+        else:
+            QMessageBox.information(self, "Batch Download Complete",
+                                    f"All videos downloaded successfully.{duplicates_text}")
+        self.finish_batch()
 
     def on_batch_download_failed(self, error_message):
         QMessageBox.critical(self, "Batch Download Error", error_message)
-        self.thread.quit()
+        self.finish_batch()
@@ -3,14 +3,23 @@ import json
 import logging
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QLineEdit,
-    QTreeWidget, QScrollArea, QGridLayout, QMenu, QAction, QInputDialog,
-    QMessageBox, QListWidgetItem, QTreeWidgetItem, QCheckBox, QTextEdit
+    QTableView, QHeaderView, QAbstractItemView, QMenu, QAction, QInputDialog,
+    QMessageBox, QCheckBox, QTextEdit
 )
-from PyQt5.QtCore import Qt, QEvent, QThread
-from PyQt5.QtGui import QIcon, QPixmap, QFontMetrics
-from app.clickable_label import ClickableLabel
+from PyQt5.QtCore import Qt, QEvent, QThread, QTimer
+from PyQt5.QtGui import QIcon, QCursor
 from app.upload_worker import UploadWorker
 from app.video_preview_dialog import VideoPreviewDialog
+from app.history_store import get_history_store, EVENT_INSERTED, EVENT_REMOVED, EVENT_RESET
+from app.history_model import HistoryTableModel, HistoryChangeRelay
+from app.history_grid import HistoryGridView
+from app.history_search import parse_search_query
+from app.history_stats_dialog import HistoryStatsDialog
+from app.history_scanner import HistoryReconciler
+from app.media_probe import get_media_probe
+
+SEARCH_DEBOUNCE_MS = 200
+SORT_ORDER_KEY = 'history_sort_order'  # History store meta key of the last sort order
 
 class DownloadsHistoryTab(QWidget):
     def __init__(self, settings_tab):
@@ -20,8 +29,18 @@ class DownloadsHistoryTab(QWidget):
 
         # Create search bar
         self.search_bar = QLineEdit()
-        self.search_bar.setPlaceholderText("Search downloads...")
-        self.search_bar.textChanged.connect(self.update_downloads_display)
+        self.search_bar.setPlaceholderText("Search downloads... (e.g. cats source:youtube size>1GB)")
+        self.search_bar.setToolTip(
+            "Words match the start of words in the title, source, path and URL.\n"
+            "Limit a word to one field with title:, source:, path: or url:.\n"
+            "Filter by size or duration with size>1GB, size<=500MB, duration>10m."
+        )
+        # Search once typing pauses instead of on every keystroke
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(self.update_downloads_display)
+        self.search_bar.textChanged.connect(self.search_timer.start)
 
         # Create separate buttons for Grid View and List View
         self.grid_view_button = QPushButton("Grid View")
@@ -33,6 +52,16 @@ class DownloadsHistoryTab(QWidget):
         self.total_videos_label = QLabel("Total Videos: 0")
         self.total_size_label = QLabel("Total Size: 0 MB")
 
+        # Breakdown of the shown downloads per site, day and format
+        self.stats_button = QPushButton("Statistics")
+        self.stats_button.clicked.connect(self.show_statistics)
+        self.stats_dialog = None
+
+        # Media files found in the download folders that are not in the history
+        self.import_untracked_button = QPushButton()
+        self.import_untracked_button.setVisible(False)
+        self.import_untracked_button.clicked.connect(self.import_untracked_files)
+
         # Layout for the buttons, search bar, and labels
         top_layout = QHBoxLayout()
         top_layout.addWidget(self.grid_view_button)
@@ -40,34 +69,79 @@ class DownloadsHistoryTab(QWidget):
         top_layout.addWidget(self.search_bar)
         top_layout.addWidget(self.total_videos_label)
         top_layout.addWidget(self.total_size_label)
+        top_layout.addWidget(self.stats_button)
+        top_layout.addWidget(self.import_untracked_button)
         self.layout.addLayout(top_layout)
 
-        # Initialize the history tree (list view)
-        self.history_tree = QTreeWidget()
-        self.history_tree.setHeaderLabels(['Name', 'Size', 'Duration', 'Source', 'Path'])
+        # Initialize the history list view; only the rows on screen are ever formatted
+        self.history_model = HistoryTableModel(self)
+        self.history_tree = QTableView()
+        self.history_tree.setModel(self.history_model)
+        self.history_tree.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.history_tree.setShowGrid(False)
+        self.history_tree.setWordWrap(False)
+        self.history_tree.verticalHeader().hide()
+        # Fixed row heights keep layout independent of the number of rows
+        self.history_tree.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.history_tree.verticalHeader().setDefaultSectionSize(self.fontMetrics().height() + 8)
+        self.history_tree.horizontalHeader().setStretchLastSection(True)
+        # Restore the last sort order before sorting is enabled, which sorts by the header's indicator;
+        # every change is saved with the history
+        self.restore_sort_order()
         self.history_tree.setSortingEnabled(True)
+        self.history_model.sort_columns_changed.connect(self.save_sort_order)
         self.history_tree.setContextMenuPolicy(Qt.CustomContextMenu)
         self.history_tree.customContextMenuRequested.connect(self.show_context_menu)
-        self.history_tree.itemDoubleClicked.connect(self.item_double_clicked)
+        self.history_tree.doubleClicked.connect(self.item_double_clicked)
 
-        # Initialize the scroll area for grid view
-        self.scroll_area = QScrollArea()
-        self.scroll_area.setWidgetResizable(True)
-        self.scroll_widget = QWidget()
-        self.grid_layout = QGridLayout(self.scroll_widget)
-        self.scroll_area.setWidget(self.scroll_widget)
+        # Initialize the grid view over the same model; it only paints the visible cells
+        self.grid_view = HistoryGridView(self.history_model)
+        self.grid_view.clicked.connect(self.grid_item_clicked)
 
-        # Initially, add the QTreeWidget (list view) to the layout
+        # Initially, add the history tree (list view) to the layout
         self.layout.addWidget(self.history_tree)
 
         self.setLayout(self.layout)
 
         self.current_view = 'list'
-        self.downloads_data = []
+
+        # Apply row-level changes from the history store instead of reloading everything
+        self.history_relay = HistoryChangeRelay(self)
+        self.history_relay.changed.connect(self.on_history_changed)
+        get_history_store().subscribe(self.history_relay.changed.emit)
+
+        # Keep the history in step with the files on disk from a background thread
+        self.reconciler = HistoryReconciler(parent=self)
+        self.reconciler.untracked_changed.connect(self.update_untracked_button)
+
+        # Fill in duration, codecs, resolution and real sizes with ffprobe once the files were checked
+        self.media_probe = get_media_probe()
+        self.reconciler.scan_finished.connect(lambda result: self.media_probe.probe_unprobed())
 
         self.load_downloads_history()
         self.load_default_view()
 
+    def restore_sort_order(self):
+        try:
+            sort_columns = json.loads(get_history_store().get_meta(SORT_ORDER_KEY, '[]'))
+        except Exception as e:
+            logging.error(f"Error loading history sort order: {e}")
+            return
+        if sort_columns:
+            self.history_model.set_sort_columns(sort_columns)
+        # Only move the indicator; the model is already sorted. Without a saved order no column is marked
+        column, order = (self.history_model.sort_columns() or [(-1, Qt.AscendingOrder)])[0]
+        header = self.history_tree.horizontalHeader()
+        header.blockSignals(True)
+        header.setSortIndicator(column, order)
+        header.blockSignals(False)
+
+    def save_sort_order(self, sort_columns):
+        try:
+            get_history_store().set_meta(SORT_ORDER_KEY, json.dumps([[column, int(order)] for column, order in sort_columns]))
+        except Exception as e:
+            logging.error(f"Error saving history sort order: {e}")
+
     def load_default_view(self):
         settings_path = os.path.join('data', 'settings.json')
         if os.path.exists(settings_path):
@@ -82,21 +156,41 @@ class DownloadsHistoryTab(QWidget):
             self.switch_to_list_view()
 
     def load_downloads_history(self):
-        """Load the downloads history by reading from data/downloads.json."""
-        self.downloads_data = []
-        json_file_path = os.path.join('data', 'downloads.json')
-        if not os.path.exists(json_file_path):
-            return
+        """Load the downloads history from the history store."""
+        downloads_data = []
         try:
-            with open(json_file_path, 'r', encoding='utf-8') as f:
-                self.downloads_data = json.load(f)
+            downloads_data = get_history_store().all()
         except Exception as e:
             logging.error(f"Error loading downloads history: {e}")
+        self.history_model.set_entries(downloads_data)
         self.update_downloads_display()
 
-    def item_double_clicked(self, item, column):
-        data = item.data(0, Qt.UserRole)
-        if data and data.get('type') == 'file':
+    def on_history_changed(self, event, payload):
+        """Apply one change notification from the history store to the views."""
+        if event == EVENT_RESET:
+            self.load_downloads_history()
+            return
+        if event == EVENT_REMOVED:
+            self.history_model.remove_ids(payload)
+        else:
+            # With a search active, ask the index whether the changed entries match it
+            matching_ids = None
+            query = parse_search_query(self.search_bar.text())
+            if not query.is_empty():
+                try:
+                    matching_ids = set(get_history_store().search(query, ids=[entry['id'] for entry in payload]))
+                except Exception as e:
+                    logging.error(f"Error searching downloads history: {e}")
+                    matching_ids = set()
+            if event == EVENT_INSERTED:
+                self.history_model.insert_entries(payload, matching_ids)
+            else:
+                self.history_model.update_entries(payload, matching_ids)
+        self.update_totals()
+
+    def item_double_clicked(self, index):
+        data = self.history_model.entry(index)
+        if data:
             video_path = data.get('path')
             if video_path and os.path.exists(video_path):
                 os.startfile(video_path)  # This will open the video with the default player
@@ -104,31 +198,30 @@ class DownloadsHistoryTab(QWidget):
                 QMessageBox.warning(self, "File Error", "The video file could not be found.")
 
     def show_context_menu(self, position):
-        item = self.history_tree.itemAt(position)
-        if item:
+        index = self.history_tree.indexAt(position)
+        data = self.history_model.entry(index)
+        if data:
             menu = QMenu()
-            data = item.data(0, Qt.UserRole)
-            if data['type'] == 'file':
-                play_action = QAction(QIcon("icons/play.png"), "Play", self)
-                preview_trim_action = QAction(QIcon("icons/video.png"), "Preview && Trim", self)
-                rename_action = QAction(QIcon("icons/rename.png"), "Rename", self)
-                delete_action = QAction(QIcon("icons/delete.png"), "Delete", self)
-                upload_action = QAction(QIcon("icons/upload.png"), "Upload", self)
-                details_action = QAction(QIcon("icons/info.png"), "Details", self)
-
-                play_action.triggered.connect(lambda: self.play_video(item))
-                preview_trim_action.triggered.connect(lambda: self.preview_and_trim_video(item))
-                rename_action.triggered.connect(lambda: self.rename_video(item))
-                delete_action.triggered.connect(lambda: self.delete_video(item))
-                upload_action.triggered.connect(lambda: self.upload_video(item))
-                details_action.triggered.connect(lambda: self.show_video_details(data))
-
-                menu.addAction(play_action)
-                menu.addAction(preview_trim_action)
-                menu.addAction(rename_action)
-                menu.addAction(delete_action)
-                menu.addAction(upload_action)
-                menu.addAction(details_action)
+            play_action = QAction(QIcon("icons/play.png"), "Play", self)
+            preview_trim_action = QAction(QIcon("icons/video.png"), "Preview && Trim", self)
+            rename_action = QAction(QIcon("icons/rename.png"), "Rename", self)
+            delete_action = QAction(QIcon("icons/delete.png"), "Delete", self)
+            upload_action = QAction(QIcon("icons/upload.png"), "Upload", self)
+            details_action = QAction(QIcon("icons/info.png"), "Details", self)
+
+            play_action.triggered.connect(lambda: self.play_video(index))
+            preview_trim_action.triggered.connect(lambda: self.preview_and_trim_video(index))
+            rename_action.triggered.connect(lambda: self.rename_video(index))
+            delete_action.triggered.connect(lambda: self.delete_video(index))
+            upload_action.triggered.connect(lambda: self.upload_video(index))
+            details_action.triggered.connect(lambda: self.show_video_details(data))
+
+            menu.addAction(play_action)
+            menu.addAction(preview_trim_action)
+            menu.addAction(rename_action)
+            menu.addAction(delete_action)
+            menu.addAction(upload_action)
+            menu.addAction(details_action)
 
             menu.exec_(self.history_tree.viewport().mapToGlobal(position))
 
@@ -143,19 +236,18 @@ class DownloadsHistoryTab(QWidget):
         top_layout.addWidget(self.search_bar)
         top_layout.addWidget(self.total_videos_label)
         top_layout.addWidget(self.total_size_label)
+        top_layout.addWidget(self.stats_button)
+        top_layout.addWidget(self.import_untracked_button)
         self.layout.addLayout(top_layout)
 
-        # Hide the QTreeWidget (list view) and show the scroll area (grid view)
+        # Hide the history tree (list view) and show the grid view
         self.history_tree.setVisible(False)
-        self.scroll_area.setVisible(True)
+        self.grid_view.setVisible(True)
 
-        # Re-add the scroll area (grid view) to the layout
-        self.layout.addWidget(self.scroll_area)
+        # Re-add the grid view to the layout
+        self.layout.addWidget(self.grid_view)
         self.update_downloads_display()  # Refresh the display
 
-        # Ensure the grid layout adjusts when the window is resized
-        self.scroll_area.resizeEvent = self.on_resize
-
     def switch_to_list_view(self):
         self.clear_history_layout()
         self.current_view = 'list'
@@ -167,122 +259,66 @@ class DownloadsHistoryTab(QWidget):
         top_layout.addWidget(self.search_bar)
         top_layout.addWidget(self.total_videos_label)
         top_layout.addWidget(self.total_size_label)
+        top_layout.addWidget(self.stats_button)
+        top_layout.addWidget(self.import_untracked_button)
         self.layout.addLayout(top_layout)
 
-        # Show the QTreeWidget (history_tree) and hide the scroll area (grid view)
+        # Show the history_tree and hide the grid view
         self.history_tree.setVisible(True)
-        self.scroll_area.setVisible(False)
+        self.grid_view.setVisible(False)
 
-        # Re-add the QTreeWidget (history_tree) to the layout
+        # Re-add the history_tree to the layout
         self.layout.addWidget(self.history_tree)
         self.update_downloads_display()  # Refresh the display
 
     def update_downloads_display(self):
-        """Update the displayed downloads based on the current view and search text."""
-        search_text = self.search_bar.text().lower()
-        filtered_downloads = [
-            video for video in self.downloads_data
-            if search_text in video.get('title', '').lower()
-        ]
-
-        # Calculate total videos and total size
-        total_videos = len(filtered_downloads)
-        total_size_bytes = sum(
-            video.get('size', 0) for video in filtered_downloads
-            if isinstance(video.get('size', 0), (int, float))
-        )
-        total_size_mb = total_size_bytes / (1024 * 1024)
+        """Update the displayed downloads based on the search text."""
+        # The store answers the query from its full-text index; both views only ask for the rows on screen
+        query = parse_search_query(self.search_bar.text())
+        try:
+            matching_ids = None if query.is_empty() else get_history_store().search(query)
+        except Exception as e:
+            logging.error(f"Error searching downloads history: {e}")
+            matching_ids = []
+        self.history_model.set_filter_ids(matching_ids)
+        self.update_totals()
+
+    def update_totals(self):
+        # Totals come from the model's running aggregates, not a sum over the entries
+        total_videos = self.history_model.visible_count()
+        total_size_mb = self.history_model.visible_size() / (1024 * 1024)
 
         # Update labels
         self.total_videos_label.setText(f"Total Videos: {total_videos}")
         self.total_size_label.setText(f"Total Size: {total_size_mb:.2f} MB")
+        if self.stats_dialog is not None and self.stats_dialog.isVisible():
+            self.stats_dialog.refresh()
+
+    def update_untracked_button(self, count):
+        self.import_untracked_button.setText(f"Import Untracked ({count})")
+        self.import_untracked_button.setToolTip(
+            "Video files in the download folders that are not in the history")
+        self.import_untracked_button.setVisible(count > 0)
+
+    def import_untracked_files(self):
+        count = len(self.reconciler.untracked_files())
+        reply = QMessageBox.question(self, "Import Untracked Files",
+                                     f"Add {count} video files found in the download folders to the history?",
+                                     QMessageBox.Yes | QMessageBox.No)
+        if reply == QMessageBox.Yes:
+            try:
+                self.reconciler.import_untracked()
+            except Exception as e:
+                logging.error(f"Error importing untracked files: {e}")
+                QMessageBox.critical(self, "Error", f"Failed to import files: {e}")
 
-        if self.current_view == 'list':
-            self.history_tree.clear()  # Clear previous items
-            for video in filtered_downloads:
-                if not video.get('path', '').lower().endswith(('.mp4', '.avi', '.mkv', '.flv', '.mov')):
-                    continue  # Skip non-video files
-                video_item = QTreeWidgetItem(self.history_tree)
-                video_item.setText(0, video.get('title', 'Unknown Title'))
-                size_value = video.get('size')
-                if size_value and isinstance(size_value, (int, float)):
-                    size_mb = size_value / (1024 * 1024)
-                    size_text = f"{size_mb:.2f} MB"
-                else:
-                    size_text = "Unknown"
-                video_item.setText(1, size_text)
-
-                # Add video length (duration) in a human-readable format
-                duration_seconds = video.get('duration', 0)
-                if isinstance(duration_seconds, (int, float)):
-                    minutes, seconds = divmod(int(duration_seconds), 60)
-                    duration_text = f"{minutes} min {seconds} sec"
-                else:
-                    duration_text = "Unknown"
-
-                video_item.setText(2, duration_text)  # Adding the video length in column 2
-                video_item.setText(3, video.get('source_site', 'Unknown Source'))
-                video_item.setText(4, video.get('path', 'Unknown Path'))
-                video_item.setData(0, Qt.UserRole, {'type': 'file', 'path': video.get('path', '')})
-        elif self.current_view == 'grid':
-            # Clear the grid layout
-            for i in reversed(range(self.grid_layout.count())):
-                widget_to_remove = self.grid_layout.itemAt(i).widget()
-                if widget_to_remove is not None:
-                    self.grid_layout.removeWidget(widget_to_remove)
-                    widget_to_remove.setParent(None)
-
-            thumb_width = 300
-            available_width = self.width()
-            num_columns = max(1, available_width // (thumb_width + self.grid_layout.horizontalSpacing()))
-            row = 0
-            col = 0
-
-            for video in filtered_downloads:
-                if not video.get('path', '').lower().endswith(('.mp4', '.avi', '.mkv', '.flv', '.mov')):
-                    continue  # Skip non-video files
-
-                # Create a ClickableLabel for the thumbnail
-                thumbnail_label = ClickableLabel()
-                thumbnail_path = video.get('thumbnail', '')
-                if os.path.exists(thumbnail_path):
-                    pixmap = QPixmap(thumbnail_path)
-                    # Scale pixmap to desired width, keep aspect ratio
-                    scaled_pixmap = pixmap.scaled(thumb_width, thumb_width, Qt.KeepAspectRatio)
-                    thumbnail_label.setPixmap(scaled_pixmap)
-                else:
-                    thumbnail_label.setText("No Thumbnail")
-                    thumbnail_label.setFixedWidth(thumb_width)
-                    thumbnail_label.setFixedHeight(thumb_width)
-
-                # Store video data in the label
-                thumbnail_label.setProperty('video_data', video)
-                thumbnail_label.clicked.connect(self.grid_item_clicked)
-
-                # Create a QLabel for the title
-                title_label = QLabel(video.get('title', 'Unknown Title'))
-                # Limit the width of the title label
-                title_label.setFixedWidth(thumb_width)
-                # Set word wrap and elide
-                title_label.setWordWrap(False)
-                title_label.setAlignment(Qt.AlignCenter)
-                title_label.setTextInteractionFlags(Qt.TextSelectableByMouse)
-                metrics = title_label.fontMetrics()
-                elided_text = metrics.elidedText(title_label.text(), Qt.ElideRight, thumb_width)
-                title_label.setText(elided_text)
-                title_label.setToolTip(video.get('title', 'Unknown Title'))
-
-                # Add the thumbnail and title to the grid layout
-                self.grid_layout.addWidget(thumbnail_label, row, col, alignment=Qt.AlignCenter)
-                self.grid_layout.addWidget(title_label, row + 1, col, alignment=Qt.AlignCenter)
-
-                col += 1
-                if col >= num_columns:
-                    col = 0
-                    row += 2
-
-            self.scroll_widget.adjustSize()
-            self.scroll_area.adjustSize()
+    def show_statistics(self):
+        if self.stats_dialog is None:
+            self.stats_dialog = HistoryStatsDialog(self.history_model, self)
+        else:
+            self.stats_dialog.refresh()
+        self.stats_dialog.show()
+        self.stats_dialog.raise_()
 
     def clear_history_layout(self):
         # Only remove widgets from the layout, don't delete them
@@ -292,9 +328,8 @@ class DownloadsHistoryTab(QWidget):
             if widget is not None:
                 widget.setParent(None)  # Detach the widget, but don't delete
 
-    def grid_item_clicked(self):
-        label = self.sender()
-        video_data = label.property('video_data')
+    def grid_item_clicked(self, index):
+        video_data = self.history_model.entry(index)
         if video_data:
             # Simulate right-click menu
             menu = QMenu()
@@ -307,9 +342,9 @@ class DownloadsHistoryTab(QWidget):
 
             play_action.triggered.connect(lambda: self.play_video_grid(video_data))
             preview_trim_action.triggered.connect(lambda: self.preview_and_trim_video_grid(video_data))
-            rename_action.triggered.connect(lambda: self.rename_video_grid(video_data))
-            delete_action.triggered.connect(lambda: self.delete_video_grid(video_data))
-            upload_action.triggered.connect(lambda: self.upload_video_grid(video_data))
+            rename_action.triggered.connect(lambda: self.rename_video(index))
+            delete_action.triggered.connect(lambda: self.delete_video(index))
+            upload_action.triggered.connect(lambda: self.upload_video(index))
             details_action.triggered.connect(lambda: self.show_video_details(video_data))
 
             menu.addAction(play_action)
@@ -319,42 +354,29 @@ class DownloadsHistoryTab(QWidget):
             menu.addAction(upload_action)
             menu.addAction(details_action)
 
-            cursor_pos = self.cursor().pos()
+            cursor_pos = QCursor.pos()
             menu.exec_(cursor_pos)
 
     # Methods for playing, renaming, deleting, uploading videos in grid and list views
 
-    def play_video(self, item):
-        data = item.data(0, Qt.UserRole)
+    def play_video(self, index):
+        data = self.history_model.entry(index)
         video_path = data.get('path')
         if video_path and os.path.exists(video_path):
             os.startfile(video_path)
         else:
+            if video_path:
+                self.reconciler.scan_folder(os.path.dirname(video_path))  # Flag the entry as missing
             QMessageBox.warning(self, "File Error", "The video file could not be found.")
 
-    def preview_and_trim_video(self, item):
+    def preview_and_trim_video(self, index):
         """Open video preview and trim dialog."""
-        data = item.data(0, Qt.UserRole)
+        data = self.history_model.entry(index)
         video_path = data.get('path')
-        video_duration = data.get('duration', 0)
-        
-        # Convert duration string to seconds if needed
-        if isinstance(video_duration, str):
-            try:
-                # Parse duration like "00:05:30" or "5:30"
-                parts = video_duration.split(':')
-                if len(parts) == 3:
-                    h, m, s = parts
-                    video_duration = int(h) * 3600 + int(m) * 60 + int(s)
-                elif len(parts) == 2:
-                    m, s = parts
-                    video_duration = int(m) * 60 + int(s)
-                else:
-                    video_duration = int(parts[0])
-            except:
-                video_duration = 0
         
         if video_path and os.path.exists(video_path):
+            # Probed duration, cached in the history until the file changes
+            video_duration = self.media_duration(data)
             # Open preview dialog
             dialog = VideoPreviewDialog(
                 video_path=video_path,
@@ -365,6 +387,17 @@ class DownloadsHistoryTab(QWidget):
         else:
             QMessageBox.warning(self, "File Error", "The video file could not be found.")
 
+    def media_duration(self, video_data):
+        """
+        Duration in seconds from the media probe, falling back to the one yt-dlp
+        reported. A file without a current probe is probed in the background and
+        its row is updated when the result is stored.
+        """
+        duration = (self.media_probe.cached_metadata(video_data) or {}).get('duration')
+        if duration is None:
+            duration = video_data.get('duration')
+        return duration if isinstance(duration, (int, float)) else 0
+
     def play_video_grid(self, video_data):
         """Plays the selected video from the grid."""
         video_path = video_data.get("path")
@@ -375,30 +408,17 @@ class DownloadsHistoryTab(QWidget):
             except Exception as e:
                 QMessageBox.critical(self, "Play Error", f"An error occurred while trying to play the video: {str(e)}")
         else:
+            if video_path:
+                self.reconciler.scan_folder(os.path.dirname(video_path))  # Flag the entry as missing
             QMessageBox.warning(self, "File Not Found", "The video file could not be found.")
 
     def preview_and_trim_video_grid(self, video_data):
         """Open video preview and trim dialog from grid view."""
         video_path = video_data.get('path')
-        video_duration = video_data.get('duration', 0)
-        
-        # Convert duration string to seconds if needed
-        if isinstance(video_duration, str):
-            try:
-                # Parse duration like "00:05:30" or "5:30"
-                parts = video_duration.split(':')
-                if len(parts) == 3:
-                    h, m, s = parts
-                    video_duration = int(h) * 3600 + int(m) * 60 + int(s)
-                elif len(parts) == 2:
-                    m, s = parts
-                    video_duration = int(m) * 60 + int(s)
-                else:
-                    video_duration = int(parts[0])
-            except:
-                video_duration = 0
         
         if video_path and os.path.exists(video_path):
+            # Probed duration, cached in the history until the file changes
+            video_duration = self.media_duration(video_data)
             # Open preview dialog
             dialog = VideoPreviewDialog(
                 video_path=video_path,
@@ -410,8 +430,8 @@ class DownloadsHistoryTab(QWidget):
             QMessageBox.warning(self, "File Error", "The video file could not be found.")
 
 
-    def rename_video(self, item):
-        data = item.data(0, Qt.UserRole)
+    def rename_video(self, index):
+        data = self.history_model.entry(index)
         old_path = data.get('path')
         if old_path and os.path.exists(old_path):
             new_name, ok = QInputDialog.getText(self, "Rename Video", "Enter new name:")
@@ -419,28 +439,23 @@ class DownloadsHistoryTab(QWidget):
                 new_name = new_name.strip()
                 new_path = os.path.join(os.path.dirname(old_path), new_name + os.path.splitext(old_path)[1])
                 os.rename(old_path, new_path)
-                data['path'] = new_path
-                data['title'] = new_name
-                self.save_downloads_data()
-                self.load_downloads_history()
+                get_history_store().update_path(old_path, new_path, title=new_name)
         else:
             QMessageBox.warning(self, "File Error", "The video file could not be found.")
 
-    def delete_video(self, item):
-        data = item.data(0, Qt.UserRole)
+    def delete_video(self, index):
+        data = self.history_model.entry(index)
         video_path = data.get('path')
         if video_path and os.path.exists(video_path):
             confirm = QMessageBox.question(self, "Delete Video", "Are you sure you want to delete this video?")
             if confirm == QMessageBox.Yes:
                 os.remove(video_path)
-                self.downloads_data.remove(data)
-                self.save_downloads_data()
-                self.load_downloads_history()
+                get_history_store().delete_by_path(video_path)
         else:
             QMessageBox.warning(self, "File Error", "The video file could not be found.")
 
-    def upload_video(self, item):
-        data = item.data(0, Qt.UserRole)
+    def upload_video(self, index):
+        data = self.history_model.entry(index)
         video_path = data.get('path')
         if video_path and os.path.exists(video_path):
             upload_site = self.settings_tab.get_upload_site()
@@ -493,93 +508,12 @@ class DownloadsHistoryTab(QWidget):
             f"Source: {video_data.get('source_site', 'Unknown Source')}\n"
             f"Path: {video_data.get('path', 'Unknown Path')}\n"
         )
+        # Media details from ffprobe, when the file has been probed
+        if video_data.get('width') and video_data.get('height'):
+            details += f"Resolution: {video_data['width']}x{video_data['height']}\n"
+        codecs = [codec for codec in (video_data.get('video_codec'), video_data.get('audio_codec')) if codec]
+        if codecs:
+            details += f"Codecs: {' / '.join(codecs)}\n"
+        if video_data.get('bitrate'):
+            details += f"Bitrate: {video_data['bitrate'] / 1000:.0f} kb/s\n"
         QMessageBox.information(self, "Video Details", details)
-
-    def save_downloads_data(self):
-        json_file_path = os.path.join('data', 'downloads.json')
-        with open(json_file_path, 'w', encoding='utf-8') as f:
-            json.dump(self.downloads_data, f, indent=4)
-
-    def resizeEvent(self, event):
-        """Handle window resize events to adjust the grid layout and refresh the view."""
-        super().resizeEvent(event)
-        try:
-            self.adjust_grid_columns()
-        except Exception as e:
-            logging.error(f"An error occurred in grid view handling: {e}")
-            QMessageBox.critical(self, "Error", "An unexpected error occurred while adjusting the grid view.")
-
-    def on_resize(self, event):
-        self.adjust_grid_columns()
-
-    def adjust_grid_columns(self):
-        """Adjust the number of columns and thumbnail sizes in the grid layout based on the window width."""
-        if self.current_view != 'grid':
-            return
-
-        # Calculate thumbnail width based on window size, setting a minimum and maximum width
-        min_thumb_width = 150  # Minimum thumbnail width
-        max_thumb_width = 300  # Maximum thumbnail width
-        available_width = self.width()  # Total available width in the current window
-        num_columns = max(1, available_width // (min_thumb_width + self.grid_layout.horizontalSpacing()))
-
-        # Calculate the actual thumbnail width based on the number of columns
-        if num_columns > 0:
-            thumb_width = min(max(min_thumb_width, available_width // num_columns), max_thumb_width)
-        else:
-            thumb_width = min_thumb_width
-
-        # Clear existing layout items
-        for i in reversed(range(self.grid_layout.count())):
-            widget_to_remove = self.grid_layout.itemAt(i).widget()
-            if widget_to_remove is not None:
-                widget_to_remove.setParent(None)
-
-        # Re-add the thumbnails and titles to the grid layout
-        row = 0
-        col = 0
-        for video_data in self.downloads_data:
-            # Skip non-video files
-            if not video_data.get('path', '').lower().endswith(('.mp4', '.avi', '.mkv', '.flv', '.mov')):
-                continue
-
-            # Create a ClickableLabel for the thumbnail
-            thumbnail_label = ClickableLabel()
-            thumbnail_path = video_data.get('thumbnail', '')
-            if os.path.exists(thumbnail_path):
-                pixmap = QPixmap(thumbnail_path)
-                # Scale pixmap to calculated thumbnail width, keeping aspect ratio
-                scaled_pixmap = pixmap.scaled(thumb_width, thumb_width, Qt.KeepAspectRatio)
-                thumbnail_label.setPixmap(scaled_pixmap)
-            else:
-                thumbnail_label.setText("No Thumbnail")
-                thumbnail_label.setFixedWidth(thumb_width)
-                thumbnail_label.setFixedHeight(thumb_width)
-
-            # Store video data in the label
-            thumbnail_label.setProperty('video_data', video_data)
-            thumbnail_label.clicked.connect(self.grid_item_clicked)
-
-            # Create a QLabel for the title
-            title_label = QLabel(video_data.get('title', 'Unknown Title'))
-            title_label.setFixedWidth(thumb_width)
-            title_label.setWordWrap(False)
-            title_label.setAlignment(Qt.AlignCenter)
-            title_label.setTextInteractionFlags(Qt.TextSelectableByMouse)
-            metrics = title_label.fontMetrics()
-            elided_text = metrics.elidedText(title_label.text(), Qt.ElideRight, thumb_width)
-            title_label.setText(elided_text)
-            title_label.setToolTip(video_data.get('title', 'Unknown Title'))
-
-            # Add the thumbnail and title to the grid layout
-            self.grid_layout.addWidget(thumbnail_label, row, col, alignment=Qt.AlignCenter)
-            self.grid_layout.addWidget(title_label, row + 1, col, alignment=Qt.AlignCenter)
-
-            col += 1
-            if col >= num_columns:
-                col = 0
-                row += 2
-
-        # Adjust the scroll area and scroll widget size
-        self.scroll_widget.adjustSize()
-        self.scroll_area.adjustSize()
@@ -3,6 +3,7 @@ import json
 from PyQt5.QtWidgets import QWidget, QVBoxLayout, QListWidget, QMenu, QAction, QMessageBox, QListWidgetItem
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QIcon
+from app.url_utils import normalize_url
 
 class DownloadLaterTab(QWidget):
     def __init__(self, download_manager):
@@ -36,7 +37,8 @@ class DownloadLaterTab(QWidget):
                 urls = json.load(f)
         else:
             urls = []
-        if url not in urls:
+        # Different links to the same video (tracking parameters, short links) count as one
+        if normalize_url(url, keep_playlist=True) not in {normalize_url(existing, keep_playlist=True) for existing in urls}:
             urls.append(url)
             with open(json_file_path, 'w', encoding='utf-8') as f:
                 json.dump(urls, f, indent=4)
@@ -1,10 +1,193 @@
 # app/downloads_manager.py
 
+import heapq
+import itertools
+import logging
+import threading
+import time
 from PyQt5.QtWidgets import QWidget, QVBoxLayout, QTabWidget, QPushButton
+from PyQt5.QtCore import Qt, QObject, QThread, pyqtSignal
 from app.download_tab import YTDLPTab
 from app.download_history_tab import DownloadsHistoryTab
 from app.download_later_tab import DownloadLaterTab
 from app.uploads_tab import UploadsTab
+from app.job_journal import DownloadJobJournal
+from app.progress_bus import get_progress_bus
+from app.url_utils import site_host
+
+# Job states tracked by the scheduler registry
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_FINISHED = 'finished'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+
+# Priorities: higher values are dispatched first, equal priorities run FIFO
+PRIORITY_LOW = -10
+PRIORITY_NORMAL = 0
+PRIORITY_HIGH = 10
+
+
+class DownloadJob:
+    """A single download tracked by the DownloadScheduler."""
+
+    def __init__(self, job_id, url, start_callback, priority=PRIORITY_NORMAL):
+        self.job_id = job_id
+        self.url = url
+        self.host = site_host(url)
+        self.start_callback = start_callback
+        self.priority = priority
+        self.state = JOB_QUEUED
+        self.error = None
+        self.queued_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+
+class DownloadScheduler(QObject):
+    """
+    Global download scheduler with a bounded number of concurrent jobs.
+
+    Jobs are started in priority order (FIFO within the same priority) as
+    long as both the global limit and the per-host limit allow it. Each job
+    provides a start callback which is invoked when a slot becomes free; the
+    owner must report completion through job_done() so the slot is released.
+    Finished, failed and cancelled jobs are dropped from the registry, so it
+    only ever holds the jobs that are queued or running.
+
+    The scheduler may be called from any thread, but start callbacks always
+    run on the thread the scheduler lives in (the GUI thread), because they
+    create widgets and QThreads.
+    """
+
+    job_queued = pyqtSignal(int)
+    job_started = pyqtSignal(int)
+    job_finished = pyqtSignal(int, str)  # job_id, final state
+    queue_changed = pyqtSignal()
+    _dispatch_requested = pyqtSignal()
+
+    def __init__(self, max_concurrent=3, max_per_host=2, parent=None):
+        super().__init__(parent)
+        self.max_concurrent = max_concurrent
+        self.max_per_host = max_per_host
+        self.jobs = {}  # job registry of queued and running jobs: job_id -> DownloadJob
+        self._running = 0
+        self._queued = 0
+        self._pending = []  # heap of (-priority, sequence, job_id)
+        self._sequence = itertools.count()
+        self._job_ids = itertools.count(1)
+        self._running_per_host = {}
+        self._lock = threading.RLock()
+        self._dispatch_requested.connect(self._dispatch, Qt.QueuedConnection)
+
+    def set_limits(self, max_concurrent=None, max_per_host=None):
+        """Change the concurrency limits and start queued jobs if slots opened up."""
+        with self._lock:
+            if max_concurrent is not None:
+                self.max_concurrent = max(1, int(max_concurrent))
+            if max_per_host is not None:
+                self.max_per_host = max(1, int(max_per_host))
+        self._dispatch()
+
+    def submit(self, url, start_callback, priority=PRIORITY_NORMAL):
+        """Queue a download and return its job id."""
+        with self._lock:
+            job_id = next(self._job_ids)
+            job = DownloadJob(job_id, url, start_callback, priority)
+            self.jobs[job_id] = job
+            self._queued += 1
+            heapq.heappush(self._pending, (-priority, next(self._sequence), job_id))
+        self.job_queued.emit(job_id)
+        self._dispatch()
+        return job_id
+
+    def job_done(self, job_id, success=True, error=None):
+        """Mark a running job as finished or failed and free its slot."""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.state != JOB_RUNNING:
+                return
+            del self.jobs[job_id]
+            self._running -= 1
+            job.state = JOB_FINISHED if success else JOB_FAILED
+            job.error = error
+            job.finished_at = time.time()
+            self._release_host(job.host)
+        self.job_finished.emit(job_id, job.state)
+        self._dispatch()
+
+    def cancel(self, job_id):
+        """Cancel a queued job. Running jobs must be stopped by their owner and reported via job_done()."""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.state != JOB_QUEUED:
+                return False
+            del self.jobs[job_id]
+            self._queued -= 1
+            job.state = JOB_CANCELLED
+            job.finished_at = time.time()
+            # The heap entry is dropped lazily when it reaches the top
+        self.job_finished.emit(job_id, JOB_CANCELLED)
+        self.queue_changed.emit()
+        return True
+
+    def get_job(self, job_id):
+        """The queued or running job with this id, None once it has finished, failed or been cancelled."""
+        return self.jobs.get(job_id)
+
+    def active_count(self):
+        """Number of jobs currently running."""
+        with self._lock:
+            return self._running
+
+    def queued_count(self):
+        """Number of jobs waiting for a free slot."""
+        with self._lock:
+            return self._queued
+
+    def _release_host(self, host):
+        count = self._running_per_host.get(host, 0) - 1
+        if count > 0:
+            self._running_per_host[host] = count
+        else:
+            self._running_per_host.pop(host, None)
+
+    def _dispatch(self):
+        """Start as many queued jobs as the global and per-host limits allow."""
+        if QThread.currentThread() is not self.thread():
+            # Called from a worker thread; start the jobs from the scheduler's own thread instead
+            self._dispatch_requested.emit()
+            return
+        to_start = []
+        with self._lock:
+            deferred = []
+            while self._pending and self._running < self.max_concurrent:
+                entry = heapq.heappop(self._pending)
+                job = self.jobs.get(entry[2])
+                if job is None or job.state != JOB_QUEUED:
+                    continue
+                if self._running_per_host.get(job.host, 0) >= self.max_per_host:
+                    # Host is saturated; keep the job's place in line for later
+                    deferred.append(entry)
+                    continue
+                job.state = JOB_RUNNING
+                job.started_at = time.time()
+                self._running_per_host[job.host] = self._running_per_host.get(job.host, 0) + 1
+                self._queued -= 1
+                self._running += 1
+                to_start.append(job)
+            for entry in deferred:
+                heapq.heappush(self._pending, entry)
+
+        # Start callbacks outside the lock, they may submit or finish other jobs
+        for job in to_start:
+            self.job_started.emit(job.job_id)
+            try:
+                job.start_callback(job.job_id)
+            except Exception as e:
+                self.job_done(job.job_id, success=False, error=str(e))
+        self.queue_changed.emit()
+
 
 class DownloadsManager(QWidget):
     def __init__(self, settings_tab, main_window):
@@ -18,6 +201,21 @@ class DownloadsManager(QWidget):
         self.download_queue = []
         self.active_workers = []
 
+        # Global scheduler that limits how many downloads run at once
+        self.scheduler = DownloadScheduler(
+            max_concurrent=self.settings_tab.get_max_concurrent_downloads(),
+            max_per_host=self.settings_tab.get_max_downloads_per_host(),
+        )
+        self.scheduler.queue_changed.connect(self.update_download_queue_label)
+        # Durable record of jobs so unfinished downloads survive a crash or restart
+        self.journal = DownloadJobJournal()
+        # Create the progress bus here so its timer runs on the GUI thread
+        self.progress_bus = get_progress_bus()
+        self.settings_tab.max_concurrent_spin.valueChanged.connect(
+            lambda value: self.scheduler.set_limits(max_concurrent=value))
+        self.settings_tab.max_per_host_spin.valueChanged.connect(
+            lambda value: self.scheduler.set_limits(max_per_host=value))
+
         self.add_download_tab_button = QPushButton("New Download Tab")
         self.add_download_tab_button.clicked.connect(self.add_new_download_tab)
 
@@ -32,12 +230,17 @@ class DownloadsManager(QWidget):
         # Add the first download tab
         self.add_new_download_tab()
 
+        # Re-enqueue downloads that were still queued or running when UVDM stopped
+        self.resume_unfinished_jobs()
+
     def add_to_download_queue(self, url):
         self.download_queue.append(url)
         self.update_download_queue_label()
 
     def update_download_queue_label(self):
-        num_queue = len(self.download_queue)
+        if not hasattr(self.main_window, 'download_queue_label'):
+            return  # Status bar not created yet
+        num_queue = len(self.download_queue) + self.scheduler.queued_count()
         # Include downloads from active playlist workers
         for tab_index in range(self.tab_widget.count()):
             tab = self.tab_widget.widget(tab_index)
@@ -47,6 +250,10 @@ class DownloadsManager(QWidget):
         num_queue += len(self.download_later_tab.get_pending_downloads())
         self.main_window.download_queue_label.setText(f"Downloads in Queue: {num_queue}")
 
+    def get_active_download_count(self):
+        """Return the number of downloads currently running."""
+        return self.scheduler.active_count()
+
     def add_new_download_tab(self):
         """Add a new download tab to allow concurrent downloads."""
         tab_index = self.tab_widget.count()  # Get the current tab index
@@ -54,15 +261,35 @@ class DownloadsManager(QWidget):
         self.tab_widget.addTab(new_tab, f"Download {tab_index + 1}")
         self.tab_widget.setCurrentWidget(new_tab)
 
-    def add_new_download_tab_with_url(self, url):
+    def add_new_download_tab_with_url(self, url, output_folder=None, journal_job=None):
         """Add a new download tab with the specified URL."""
         self.add_new_download_tab()
         # Get the newly added tab
         new_tab = self.tab_widget.currentWidget()
         new_tab.url_input.setText(url)
+        if output_folder:
+            new_tab.output_folder = output_folder
         # Optionally, start the download immediately
-        new_tab.start_download_thread()
+        new_tab.start_download_thread(journal_job)
+
+    def resume_unfinished_jobs(self):
+        """Replay the job journal and queue every download that never finished."""
+        try:
+            self.journal.compact()
+            unfinished = self.journal.unfinished_jobs()
+        except Exception as e:
+            logging.error(f"Error replaying download journal: {e}")
+            return
+        for job in unfinished:
+            if not job.get('url'):
+                continue
+            # yt-dlp continues from the .part files left in the same output folder
+            self.add_new_download_tab_with_url(job['url'], job.get('output_folder'), journal_job=job)
 
     def close_tab(self, index):
         """Handle tab close action."""
+        tab = self.tab_widget.widget(index)
+        if hasattr(tab, 'stop_download'):
+            # Drops the job if it is still waiting for a slot, otherwise cancels the running download
+            tab.stop_download()
         self.tab_widget.removeTab(index)
@@ -10,13 +10,14 @@ from PyQt5.QtCore import QThread
 from app.download_worker import DownloadWorker
 from app.upload_worker import UploadWorker
 from app.batch_downloader import BatchDownloader
+from app.progress_bus import get_progress_bus
 
 class YTDLPTab(QWidget):
     def __init__(self, settings_tab, download_manager, history_tab, tab_index, tab_widget, download_later_tab):
         super().__init__()
         self.settings_tab = settings_tab
-        self.batch_downloader = BatchDownloader(self.settings_tab)
         self.download_manager = download_manager
+        self.batch_downloader = BatchDownloader(self.settings_tab, scheduler=download_manager.scheduler)
         self.history_tab = history_tab
         self.download_later_tab = download_later_tab
         self.tab_index = tab_index
@@ -32,6 +33,9 @@ class YTDLPTab(QWidget):
 
         self.download_button = QPushButton("Download")
         self.download_button.clicked.connect(self.start_download_thread)
+        self.stop_button = QPushButton("Stop")
+        self.stop_button.setEnabled(False)
+        self.stop_button.clicked.connect(self.stop_download)
         self.output_folder_label = QLabel("Output Folder:")
         self.output_folder_button = QPushButton("Select Folder")
         self.output_folder_button.clicked.connect(self.set_output_folder)
@@ -46,6 +50,7 @@ class YTDLPTab(QWidget):
         self.layout.addWidget(self.output_folder_button)
         self.layout.addWidget(self.output_file_name_input)
         self.layout.addWidget(self.download_button)
+        self.layout.addWidget(self.stop_button)
 
         self.video_title_label = QLabel("Title: ")
         self.video_path_label = QLabel("Path: ")
@@ -71,27 +76,58 @@ class YTDLPTab(QWidget):
         self.progress_bar.setValue(0)
         self.layout.addWidget(self.progress_bar)
 
+        # Progress arrives as coalesced snapshots from the progress bus
+        get_progress_bus().snapshot_ready.connect(self.on_progress_snapshot)
+
         self.downloaded_video_path = None
+        self.worker = None
+        self.job_id = None
+        self.journal_id = None
+        self.skip_entries = []
 
     def set_output_folder(self):
         folder = QFileDialog.getExistingDirectory(self, "Select Download Folder")
         if folder:
             self.output_folder = folder
 
-    def start_download_thread(self):
+    def start_download_thread(self, journal_job=None):
         url = self.url_input.text()
         if not url:
             QMessageBox.warning(self, "Input Error", "Please enter a valid URL.")
             return
 
+        journal = self.download_manager.journal
+        if journal_job:
+            # Resumed after a restart: keep the journal entry and skip finished playlist entries
+            self.journal_id = journal_job['id']
+            self.skip_entries = journal_job.get('done_entries', [])
+        else:
+            self.journal_id = journal.new_job(url, self.output_folder)
+            self.skip_entries = []
+
+        # Hand the download to the global scheduler, it starts once a slot is free
+        self.download_button.setEnabled(False)
+        self.stop_button.setEnabled(True)
+        self.worker = None
+        self.update_tab_title("Queued...")
+        self.job_id = self.download_manager.scheduler.submit(url, self.start_worker)
+
+    def start_worker(self, job_id):
+        """Start the download thread, called by the scheduler when the job gets a slot."""
+        url = self.url_input.text()
         self.update_tab_title("Downloading...")
+        self.download_manager.journal.record(self.journal_id, 'started')
 
         self.thread = QThread()
-        self.worker = DownloadWorker(url, self.output_folder, self.settings_tab)
+        self.worker = DownloadWorker(
+            url, self.output_folder, self.settings_tab,
+            journal=self.download_manager.journal, journal_id=self.journal_id,
+            skip_entries=self.skip_entries,
+        )
         self.worker.moveToThread(self.thread)
-        self.worker.progress_updated.connect(self.update_progress)
         self.worker.download_finished.connect(self.on_download_complete)
         self.worker.download_failed.connect(self.handle_error)
+        self.worker.download_cancelled.connect(self.on_download_cancelled)
         self.worker.title_found.connect(self.update_tab_title)
         self.worker.output_received.connect(self.update_cmd_output)
         self.thread.started.connect(self.worker.run)
@@ -100,15 +136,43 @@ class YTDLPTab(QWidget):
         self.start_time = time.time()
         self.thread.start()
 
+    def stop_download(self):
+        """Cancel the download: a queued one is dropped from the scheduler, a running one is stopped."""
+        self.stop_button.setEnabled(False)
+        if self.worker is not None:
+            # Only sets flags, so it is safe to call on the worker from the GUI thread
+            self.worker.stop()
+        elif self.job_id is not None and self.download_manager.scheduler.cancel(self.job_id):
+            self.download_manager.journal.record(self.journal_id, 'cancelled')
+            self.download_button.setEnabled(True)
+            self.update_tab_title("Cancelled")
+
+    def on_download_cancelled(self, url):
+        self.download_manager.scheduler.job_done(self.job_id, success=False, error="Cancelled")
+        self.download_button.setEnabled(True)
+        self.update_tab_title("Cancelled")
+        self.thread.quit()
+
     def update_cmd_output(self, output_text):
         """Update the command line output (cmd) section with real-time info."""
         self.cmd_output.append(output_text)
 
     def handle_error(self, url, error_message):
         """Handle errors emitted by the worker."""
+        self.download_manager.scheduler.job_done(self.job_id, success=False, error=error_message)
+        self.download_button.setEnabled(True)
+        self.stop_button.setEnabled(False)
         QMessageBox.critical(self, "Download Error", f"Error downloading {url}:\n{error_message}")
         self.thread.quit()
 
+    def on_progress_snapshot(self, snapshot):
+        """Pick this tab's download out of a progress bus snapshot."""
+        if self.worker is None:
+            return
+        state = snapshot.get(self.worker.progress_key)
+        if state is not None:
+            self.update_progress(int(state.get('percent') or 0))
+
     def update_progress(self, value):
         """Update the progress bar and show the percentage in the window."""
         self.progress_bar.setValue(value)
@@ -120,21 +184,25 @@ class YTDLPTab(QWidget):
 
     def on_download_complete(self, video_title, video_path):
         duration = time.time() - self.start_time
+        self.update_progress(100)
         self.video_title_label.setText(f"Title: {video_title}")
         self.video_path_label.setText(f"Path: {video_path}")
         self.download_duration_label.setText(f"Download Duration: {duration:.2f} seconds")
         self.downloaded_video_path = video_path
         self.play_button.setEnabled(True)
         self.upload_button.setEnabled(True)
+        self.download_button.setEnabled(True)
+        self.stop_button.setEnabled(False)
 
-        # Refresh download history
-        self.history_tab.load_downloads_history()
+        # Free the scheduler slot for the next queued download; the worker journaled the job as finished
+        self.download_manager.scheduler.job_done(self.job_id)
 
         # If the URL was in the Download Later list, remove it
         self.download_later_tab.remove_url(self.url_input.text())
 
         # Update download queue label
         self.download_manager.update_download_queue_label()
+        self.thread.quit()
 
     def play_video(self):
         if self.downloaded_video_path and os.path.exists(self.downloaded_video_path):
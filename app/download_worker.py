@@ -1,23 +1,51 @@
 import os
-import time
-import requests
 import re
-import json
 import logging
 import traceback
 from datetime import datetime
 from PyQt5.QtCore import QObject, pyqtSignal
 import yt_dlp
 from app.logger import YTDLPLogger
+from app.segmented_downloader import SegmentedDownloader, SegmentedDownloadError, MIN_SEGMENTED_SIZE
+from app.bandwidth_governor import get_bandwidth_governor
+from app.progress_bus import get_progress_bus
+from app.extraction_cache import extract_info_cached, get_extraction_cache, cache_variant
+from app.thumbnail_fetcher import get_thumbnail_fetcher
+from app.history_store import get_history_store
+from app.duplicate_check import DuplicateChecker, POLICY_LINK
+from app.url_utils import site_host
+
+
+def history_entry(info, file_path):
+    """Download history entry for a finished file from its yt-dlp info dict."""
+    try:
+        # yt-dlp's size is often an estimate; the size on disk is what later scans compare against
+        file_size = os.path.getsize(file_path)
+    except OSError:
+        file_size = None
+    return {
+        "title": info.get("title", "Unknown Title"),
+        "path": file_path,
+        "size": file_size or info.get("filesize") or info.get("filesize_approx"),
+        "file_size": file_size,
+        "url": info.get("webpage_url", ""),
+        "video_id": info.get("id"),
+        "extractor": info.get("extractor_key"),
+        "duration": info.get("duration", 0),
+        "thumbnail": "",
+        "source_site": site_host(info.get("webpage_url", "")),
+        "download_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    }
+
 
 class DownloadWorker(QObject):
-    progress_updated = pyqtSignal(int)
     download_finished = pyqtSignal(str, str)
     download_failed = pyqtSignal(str, str)
+    download_cancelled = pyqtSignal(str)  # url
     title_found = pyqtSignal(str)
     output_received = pyqtSignal(str)
 
-    def __init__(self, url, output_folder, settings_tab, parent=None):
+    def __init__(self, url, output_folder, settings_tab, journal=None, journal_id=None, skip_entries=None, parent=None):
         super().__init__(parent)
         self.url = url
         self.output_folder = output_folder
@@ -25,36 +53,61 @@ class DownloadWorker(QObject):
         self.total_videos = 1
         self.videos_downloaded = 0
         self.playlist_title = "Downloading..."
+        # Job journal used to resume after a crash; skip_entries are playlist
+        # indices that were already downloaded before the restart
+        self.journal = journal
+        self.journal_id = journal_id
+        self.skip_entries = set(skip_entries or [])
+        self.part_files = set()
+        # Bandwidth governor bookkeeping: bytes already accounted per file
+        self.governor_key = f"http:{id(self)}"
+        self.weight = 1.0
+        self.throttle_in_hook = True
+        self.accounted_bytes = {}
+        # Key of this download on the progress bus
+        self.progress_key = f"download:{id(self)}"
+        # Videos already in the download history are skipped or linked instead of downloaded
+        self.duplicates = DuplicateChecker(settings_tab.get_duplicate_policy(),
+                                           playlists=settings_tab.get_playlist_setting())
+        self.entry_folder = output_folder
+        self.running = True
+        self.segmented_downloader = None
+        # Set once download_finished, download_failed or download_cancelled went out;
+        # the owner frees the job's scheduler slot on exactly one of them
+        self.done = False
 
-    def extract_source_site(self, url):
-        from urllib.parse import urlparse
-        parsed_url = urlparse(url)
-        return parsed_url.netloc.replace('www.', '')
+    def cache_variant(self):
+        """Describe the options that change the extraction result, used in the cache key."""
+        return cache_variant('best', noplaylist=not self.settings_tab.get_playlist_setting())
 
-    def save_video_info(self, video_info, json_file_path):
-        """Save the video information to a JSON file."""
+    def save_video_info(self, video_info):
+        """Append the video to the download history; returns the history entry id."""
         try:
-            if os.path.exists(json_file_path):
-                with open(json_file_path, "r", encoding='utf-8') as f:
-                    data = json.load(f)
-            else:
-                data = []
-
-            data.append(video_info)
-
-            with open(json_file_path, "w", encoding='utf-8') as f:
-                json.dump(data, f, indent=4, ensure_ascii=False)
-
+            return get_history_store().add(video_info)
         except Exception as e:
             logging.error(f"Error in save_video_info: {e}")
+            return None
+
+    def update_video_thumbnail(self, entry_id, thumbnail_path):
+        """Patch the thumbnail of an already saved history entry once the image has arrived."""
+        try:
+            get_history_store().update(entry_id, thumbnail=thumbnail_path)
+        except Exception as e:
+            logging.error(f"Error in update_video_thumbnail: {e}")
 
     def run(self):
+        governor = get_bandwidth_governor()
+        governor.register(self.governor_key, self.weight)
         try:
             # Create an instance of YTDLPLogger
             self.logger = YTDLPLogger()
             # Connect the logger's output_signal to the worker's output_received signal
             self.logger.output_signal.connect(self.output_received)
 
+            # A link that is already in the history is answered before anything is extracted
+            if self.finish_duplicate(self.duplicates.find(url=self.url)):
+                return
+
             initial_opts = {
                 "format": "best",
                 "outtmpl": os.path.join(self.output_folder, "%(title)s.%(ext)s"),
@@ -63,11 +116,16 @@ class DownloadWorker(QObject):
                 'progress_hooks': [self.my_hook],
                 'quiet': True,
                 'no_warnings': True,
+                'noprogress': True,  # Progress goes through the hook, not the logger
+                # Fetch HLS/DASH fragments over several connections
+                'concurrent_fragment_downloads': self.settings_tab.get_download_connections(),
             }
 
             with yt_dlp.YoutubeDL(initial_opts) as ydl:
-                # Extract info to get playlist details
-                info = ydl.extract_info(self.url, download=False)
+                # Extract info once (or take it from the extraction cache),
+                # the same info dict is reused for the download below
+                info = extract_info_cached(ydl, self.url, variant=self.cache_variant())
+            self.check_running()
 
             if 'entries' in info and isinstance(info['entries'], list):
                 self.playlist_title = info.get('title', 'Playlist')
@@ -80,45 +138,204 @@ class DownloadWorker(QObject):
                 self.total_videos = 1
                 # Single video, no folder creation
                 output_path = os.path.join(self.output_folder, "%(title)s.%(ext)s")
+                # A different link to a video in the history is recognised by its id
+                if self.finish_duplicate(self.duplicates.find(info=info)):
+                    return
 
             # Update ydl_opts with the correct outtmpl
-            ydl_opts = {
-                "format": "best",
-                "outtmpl": output_path,
-                "noplaylist": not self.settings_tab.get_playlist_setting(),
-                'logger': self.logger,
-                'progress_hooks': [self.my_hook],
-                'quiet': True,
-                'no_warnings': True,
-            }
+            ydl_opts = dict(initial_opts, outtmpl=output_path)
+            self.entry_folder = os.path.dirname(output_path)
+            if self.skip_entries or self.duplicates.active:
+                ydl_opts['match_filter'] = self.filter_entries
+                self.videos_downloaded = len(self.skip_entries)
 
             self.title_found.emit(f"{self.playlist_title} (0/{self.total_videos})")
 
+            result = info
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([self.url])
+                if not (self.use_segmented_download(info) and self.download_segmented(ydl, info)):
+                    # process_ie_result downloads from the already resolved info dict
+                    # (formats and playlist entries), so the page isn't extracted again
+                    result = ydl.process_ie_result(info, download=True) or info
 
+            if self.duplicates.summary():
+                self.output_received.emit(f"Duplicates: {self.duplicates.summary()}")
+
+            # Files yt-dlp found already on disk and playlist entries it dropped (unavailable,
+            # private, ...) never reach the 'finished' hook, so the job may not be finished yet
+            self.report_finished(self.playlist_title, self.result_path(result))
+
+        except yt_dlp.utils.DownloadCancelled:
+            self.output_received.emit("Download stopped")
+            self.report_cancelled()
         except yt_dlp.utils.DownloadError as e:
+            # Cached media URLs may have expired, make a retry extract again
+            get_extraction_cache().invalidate(self.url, self.cache_variant())
             logging.error(f"Download error: {e}\n{traceback.format_exc()}")
-            self.download_failed.emit(self.url, str(e))
+            self.report_failed(str(e))
         except Exception as e:
             logging.error(f"An unexpected error occurred: {e}\n{traceback.format_exc()}")
-            self.download_failed.emit(self.url, str(e))
+            self.report_failed(str(e))
+        finally:
+            governor.unregister(self.governor_key)
+            get_progress_bus().remove(self.progress_key)
+
+    def stop(self):
+        """Cancel the download; it ends at its next progress update. Safe to call from the GUI thread."""
+        self.running = False
+        if self.segmented_downloader is not None:
+            self.segmented_downloader.stop()
+
+    def report_finished(self, title, file_path):
+        """Emit download_finished and journal the job as finished, unless the job already ended."""
+        if self.done:
+            return
+        self.done = True
+        self.record_journal('finished', path=file_path)
+        self.download_finished.emit(title, file_path)
+
+    def report_failed(self, error):
+        """Emit download_failed and journal the job as failed, unless the job already ended."""
+        if self.done:
+            return
+        self.done = True
+        self.record_journal('failed', error=error)
+        self.download_failed.emit(self.url, error)
+
+    def report_cancelled(self):
+        """Emit download_cancelled and journal the job as cancelled, unless the job already ended."""
+        if self.done:
+            return
+        self.done = True
+        self.record_journal('cancelled')
+        self.download_cancelled.emit(self.url)
+
+    def result_path(self, result):
+        """File of a single video yt-dlp processed, or the folder of a playlist's files."""
+        downloads = result.get('requested_downloads') or [{}]
+        return downloads[-1].get('filepath') or result.get('filepath') or self.entry_folder
+
+    def check_running(self):
+        if not self.running:
+            raise yt_dlp.utils.DownloadCancelled("Download stopped")
+
+    def filter_entries(self, info, *, incomplete=False):
+        """yt-dlp match_filter that skips playlist entries finished before a restart or already in the history."""
+        if info.get('playlist_index') in self.skip_entries:
+            return "Already downloaded before restart"
+        existing = self.duplicates.find(info=info)
+        if existing is not None:
+            self.finish_entry(self.handle_duplicate(existing))
+            return "Already in the download history"
+        return None
+
+    def handle_duplicate(self, existing):
+        """Skip or link a video found in the history; returns the file it is reported as."""
+        path = self.duplicates.handle(existing, self.entry_folder)
+        action = "linked" if self.duplicates.policy == POLICY_LINK else "skipped"
+        self.output_received.emit(f"Already downloaded, {action}: {existing.get('title', 'Unknown Title')} ({path})")
+        return path
+
+    def finish_duplicate(self, existing):
+        """Finish a single-video job whose video is already in the history; False if it isn't."""
+        if existing is None:
+            return False
+        path = self.handle_duplicate(existing)
+        self.report_finished(existing.get('title', 'Unknown Title'), path)
+        return True
+
+    def finish_entry(self, file_path):
+        """Count one finished (or skipped) video; download_finished is emitted after the last one."""
+        self.videos_downloaded += 1
+        # Update tab title with progress
+        self.title_found.emit(f"{self.playlist_title} ({self.videos_downloaded}/{self.total_videos})")
+        if self.videos_downloaded == self.total_videos:
+            self.report_finished(self.playlist_title, file_path)
+
+    def record_journal(self, event, **fields):
+        if self.journal:
+            self.journal.record(self.journal_id, event, **fields)
+
+    def use_segmented_download(self, info):
+        """Only single progressive HTTP files are split into ranges, everything else goes to yt-dlp."""
+        if not self.settings_tab.get_segmented_download_enabled():
+            return False
+        if info.get('_type', 'video') != 'video' or info.get('requested_formats'):
+            return False
+        if info.get('protocol') not in ('http', 'https') or not info.get('url'):
+            return False
+        size = info.get('filesize') or info.get('filesize_approx')
+        return size is None or size >= MIN_SEGMENTED_SIZE
+
+    def download_segmented(self, ydl, info):
+        """Download with the segmented downloader; returns False if yt-dlp should take over."""
+        filename = ydl.prepare_filename(info)
+        self.segmented_downloader = SegmentedDownloader(
+            info['url'],
+            filename,
+            headers=info.get('http_headers'),
+            connections=self.settings_tab.get_download_connections(),
+            segment_size=self.settings_tab.get_segment_size(),
+            progress_callback=lambda d: self.my_hook(dict(d, info_dict=info)),
+            throttle=lambda nbytes: get_bandwidth_governor().throttle(self.governor_key, nbytes),
+        )
+        # The segmented downloader throttles every chunk itself
+        self.throttle_in_hook = False
+        try:
+            self.segmented_downloader.download()
+            return True
+        except SegmentedDownloadError as e:
+            # Stopped on purpose: keep the .part file and its segment state, don't fall back to yt-dlp
+            self.check_running()
+            self.output_received.emit(f"Segmented download not possible ({e}), using yt-dlp downloader")
+            return False
+        finally:
+            self.throttle_in_hook = True
+
+    def throttle(self, d):
+        """Hand the bytes received since the last callback to the bandwidth governor."""
+        filename = d.get('tmpfilename') or d.get('filename')
+        downloaded = d.get('downloaded_bytes') or 0
+        delta = downloaded - self.accounted_bytes.get(filename, 0)
+        self.accounted_bytes[filename] = downloaded
+        get_bandwidth_governor().throttle(self.governor_key, delta)
+
+    def publish_progress(self, d):
+        """Store the latest progress on the progress bus; the GUI samples it at a fixed rate."""
+        downloaded = d.get('downloaded_bytes') or 0
+        total = d.get('total_bytes') or d.get('total_bytes_estimate')
+        if total:
+            percentage = downloaded / total * 100
+        else:
+            try:
+                percentage = float(re.sub(r'\x1b\[[0-9;]*m', '', d.get('_percent_str', '0%')).strip().rstrip('%'))
+            except ValueError:
+                return  # Ignore if percentage can't be converted
+        get_progress_bus().update(
+            self.progress_key,
+            percent=percentage,
+            downloaded_bytes=downloaded,
+            total_bytes=total,
+            speed=d.get('speed'),
+            eta=d.get('eta'),
+        )
 
     def my_hook(self, d):
+        # Raised outside the try below so that yt-dlp (or the segmented downloader) aborts the download
+        if d['status'] == 'downloading':
+            self.check_running()
         try:
             if d['status'] == 'downloading':
-                percentage = d.get('_percent_str', '0%').strip().replace('%', '')
-                try:
-                    percentage = float(percentage)
-                    self.progress_updated.emit(int(percentage))
-                except ValueError:
-                    pass  # Ignore if percentage can't be converted
+                part_file = d.get('tmpfilename') or d.get('filename')
+                if part_file and part_file not in self.part_files:
+                    self.part_files.add(part_file)
+                    self.record_journal('part_file', filename=part_file)
+                if self.throttle_in_hook:
+                    self.throttle(d)
+                self.publish_progress(d)
             elif d['status'] == 'finished':
-                self.videos_downloaded += 1
-                self.progress_updated.emit(100)
-                time.sleep(0.5)  # Small delay to ensure the progress bar shows 100%
-                # Update tab title with progress
-                self.title_found.emit(f"{self.playlist_title} ({self.videos_downloaded}/{self.total_videos})")
+                # The progress bus shows 100% on its next tick, the download thread never waits for the UI
+                get_progress_bus().update(self.progress_key, percent=100, speed=0, eta=0)
 
                 # Get video info
                 info = d.get('info_dict', {})
@@ -126,42 +343,15 @@ class DownloadWorker(QObject):
                     logging.error(f"Expected 'info_dict' to be a dict, got {type(info)}")
                     return
                 file_path = d.get('filename', '')
+                self.record_journal('entry_done', playlist_index=info.get('playlist_index'), filename=file_path)
+
+                # Write the history entry now; the thumbnail is fetched in the background
+                # and patched in when it lands, so a slow image host never delays the next entry
+                entry_id = self.save_video_info(history_entry(info, file_path))
+                if entry_id is not None and self.settings_tab.download_thumbnails_checkbox.isChecked():
+                    get_thumbnail_fetcher().fetch(
+                        info, lambda thumbnail_path: self.update_video_thumbnail(entry_id, thumbnail_path))
 
-                video_info = {
-                    "title": info.get("title", "Unknown Title"),
-                    "path": file_path,
-                    "size": info.get("filesize") or info.get("filesize_approx"),
-                    "url": info.get("webpage_url", ""),
-                    "duration": info.get("duration", 0),
-                    "thumbnail": "",
-                    "source_site": self.extract_source_site(info.get("webpage_url", "")),
-                    "download_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                }
-                # Download thumbnail if the option is enabled in settings
-                if self.settings_tab.download_thumbnails_checkbox.isChecked():
-                    thumbnail_url = info.get("thumbnail", "")
-                    if thumbnail_url:
-                        try:
-                            response = requests.get(thumbnail_url, stream=True)
-                            response.raise_for_status()
-
-                            # Extract video title for thumbnail filename
-                            video_title = re.sub(r'[\\/*?:"<>|]', "_", info.get("title", "unknown"))
-                            thumbnail_path = os.path.join("data", "thumbnails", f"{video_title}.jpg")
-                            if not os.path.exists(os.path.dirname(thumbnail_path)):
-                                os.makedirs(os.path.dirname(thumbnail_path))
-                            with open(thumbnail_path, "wb") as f:
-                                for chunk in response.iter_content(chunk_size=8192):
-                                    f.write(chunk)
-                            # Update the video_info with the downloaded thumbnail path
-                            video_info["thumbnail"] = thumbnail_path
-                        except requests.exceptions.RequestException as e:
-                            logging.error(f"Error downloading thumbnail: {e}")
-
-                self.save_video_info(video_info, os.path.join("data", "downloads.json"))
-
-                # If all videos are downloaded, emit download_finished signal
-                if self.videos_downloaded == self.total_videos:
-                    self.download_finished.emit(self.playlist_title, file_path)
+                self.finish_entry(file_path)
         except Exception as e:
             logging.error(f"Error in my_hook: {e}\n{traceback.format_exc()}")
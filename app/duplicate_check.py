@@ -0,0 +1,112 @@
+"""
+Duplicate detection - looks a URL or an extracted video up in the download
+history (by extractor + video id, webpage URL and normalized URL) before a
+download starts, and applies the duplicate policy: skip it, download it
+again, or link the existing file into the new output folder.
+"""
+import os
+import logging
+import threading
+from datetime import datetime
+from app.history_store import get_history_store, FILE_MISSING
+from app.url_utils import is_playlist_url
+
+POLICY_SKIP = 'skip'
+POLICY_LINK = 'link'
+POLICY_REDOWNLOAD = 'redownload'
+
+# Choices offered in the settings, in display order
+POLICY_LABELS = [
+    (POLICY_SKIP, "Skip"),
+    (POLICY_LINK, "Link to Existing File"),
+    (POLICY_REDOWNLOAD, "Download Again"),
+]
+
+
+class DuplicateChecker:
+    """
+    One checker per download job. find() returns the history entry of an
+    earlier download whose file is still on disk; handle() applies the
+    policy to it and counts it for the job summary. Safe to share between
+    the threads of a batch. With `playlists` set, playlist links are not
+    looked up by URL: theirs names one video of the playlist, the entries
+    are checked one by one once extracted.
+    """
+
+    def __init__(self, policy=POLICY_SKIP, store=None, playlists=True):
+        self.policy = policy
+        self.store = store or get_history_store()
+        self.playlists = playlists
+        self.skipped = 0
+        self.linked = 0
+        self._lock = threading.Lock()
+
+    @property
+    def active(self):
+        return self.policy != POLICY_REDOWNLOAD
+
+    def find(self, url=None, info=None):
+        """History entry for the same video as `url` or the extracted `info`, or None."""
+        if not self.active:
+            return None
+        candidates = []
+        try:
+            if info:
+                if info.get('id') and info.get('extractor_key'):
+                    candidates.extend(self.store.find_by_video_id(str(info['id']), info['extractor_key']))
+                if info.get('webpage_url'):
+                    candidates.extend(self.store.find_by_normalized_url(info['webpage_url']))
+            if url and not (self.playlists and is_playlist_url(url)):
+                candidates.extend(self.store.find_by_normalized_url(url))
+        except Exception as e:
+            logging.error(f"Error looking up duplicates of {url or info.get('webpage_url')}: {e}")
+            return None
+        for entry in candidates:
+            path = entry.get('path')
+            # An earlier download whose file is gone doesn't count
+            if path and entry.get('file_state') != FILE_MISSING and os.path.isfile(path):
+                return entry
+        return None
+
+    def handle(self, existing, output_folder):
+        """Apply the policy to a duplicate; returns the file path the job should report."""
+        if self.policy == POLICY_LINK:
+            path = self._link(existing, output_folder)
+            with self._lock:
+                self.linked += 1
+            return path
+        with self._lock:
+            self.skipped += 1
+        return existing['path']
+
+    def _link(self, existing, output_folder):
+        """Hard link the existing file into output_folder and record it in the history."""
+        source = existing['path']
+        target = os.path.join(output_folder, os.path.basename(source))
+        if os.path.normcase(os.path.abspath(target)) == os.path.normcase(os.path.abspath(source)):
+            return source
+        if os.path.exists(target):
+            return target
+        try:
+            os.makedirs(output_folder, exist_ok=True)
+            os.link(source, target)
+        except OSError as e:
+            # Different drive or no hard link support: point at the existing file instead
+            logging.info(f"Could not link {source} into {output_folder}: {e}")
+            return source
+        entry = {key: value for key, value in existing.items() if key not in ('id', 'file_state')}
+        entry.update(path=target, status='linked', download_date=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        try:
+            self.store.add(entry)
+        except Exception as e:
+            logging.error(f"Error saving linked download {target}: {e}")
+        return target
+
+    def summary(self):
+        """Short report for the job log, '' if nothing was skipped or linked."""
+        parts = []
+        if self.skipped:
+            parts.append(f"{self.skipped} already downloaded video(s) skipped")
+        if self.linked:
+            parts.append(f"{self.linked} already downloaded video(s) linked")
+        return ", ".join(parts)
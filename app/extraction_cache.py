@@ -0,0 +1,209 @@
+"""
+Extraction cache - keeps yt-dlp info dicts in memory and on disk so that a URL
+resolved a moment ago with the same options (a playlist preview loaded again,
+a download started again, a batch re-run) is not sent through the extractor
+again.
+"""
+import os
+import copy
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import yt_dlp
+from app.url_utils import normalize_url
+
+CACHE_DIR = os.path.join('data', 'extraction_cache')
+DEFAULT_TTL = 30 * 60  # Seconds; media URLs inside info dicts expire, keep this short
+DEFAULT_MAX_ENTRIES = 500
+
+@lru_cache(maxsize=4096)
+def extractor_id(url):
+    """
+    Return 'ExtractorKey:video_id' for URLs whose id can be read from the URL
+    itself (no network), so e.g. youtu.be and youtube.com links share an entry.
+    """
+    try:
+        for ie in yt_dlp.extractor.gen_extractor_classes():
+            if ie.ie_key() == 'Generic' or not ie.suitable(url):
+                continue
+            temp_id = ie.get_temp_id(url)
+            if temp_id:
+                return f"{ie.ie_key()}:{temp_id}"
+            break
+    except Exception as e:
+        logging.debug(f"Could not resolve extractor id for {url}: {e}")
+    return None
+
+
+class ExtractionCache:
+    """
+    In-memory LRU of yt-dlp info dicts backed by one JSON file per entry on disk.
+
+    Entries expire after `ttl` seconds. Both the memory and the disk store are
+    bounded to `max_entries`; the least recently used entries are evicted first.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES, enabled=True):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled and not os.environ.get('UVDM_NO_EXTRACTION_CACHE')
+        self._memory = OrderedDict()  # key -> {'created': ts, 'url': url, 'info': dict}
+        self._lock = threading.Lock()
+        self._writes_since_prune = 0
+
+    def make_key(self, url, variant=''):
+        """Build the cache key from the extractor id (or the normalized URL) and the option variant."""
+        # A playlist link extracts to the playlist, not to the video it points at
+        identity = extractor_id(url) or normalize_url(url, keep_playlist=True)
+        return hashlib.sha1(f"{identity}|{variant}".encode('utf-8')).hexdigest()
+
+    def get(self, url, variant=''):
+        """Return a copy of the cached info dict for `url`, or None on a miss."""
+        if not self.enabled:
+            return None
+        key = self.make_key(url, variant)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+        if entry is None:
+            entry = self._read_from_disk(key)
+            if entry is not None:
+                with self._lock:
+                    self._remember(key, entry)
+        if entry is None:
+            return None
+        if time.time() - entry['created'] > self.ttl:
+            self.invalidate(url, variant)
+            return None
+        # Callers (process_ie_result) mutate the dict, never hand out the cached object
+        return copy.deepcopy(entry['info'])
+
+    def put(self, url, info, variant=''):
+        """Store an info dict for `url`."""
+        if not self.enabled or not info:
+            return
+        key = self.make_key(url, variant)
+        entry = {
+            'created': time.time(),
+            'url': url,
+            'info': yt_dlp.YoutubeDL.sanitize_info(info),
+        }
+        with self._lock:
+            self._remember(key, entry)
+        self._write_to_disk(key, entry)
+
+    def invalidate(self, url, variant=''):
+        """Drop the entry for `url` from memory and disk."""
+        key = self.make_key(url, variant)
+        with self._lock:
+            self._memory.pop(key, None)
+        try:
+            os.remove(self._entry_path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        """Remove every cached entry."""
+        with self._lock:
+            self._memory.clear()
+        if os.path.isdir(self.cache_dir):
+            for entry in os.scandir(self.cache_dir):
+                if entry.name.endswith('.json'):
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _read_from_disk(self, key):
+        path = self._entry_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            os.utime(path)  # The file mtime doubles as the LRU timestamp on disk
+            return entry
+        except Exception as e:
+            logging.error(f"Error reading extraction cache entry {path}: {e}")
+            return None
+
+    def _write_to_disk(self, key, entry):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = self._entry_path(key) + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, self._entry_path(key))
+        except Exception as e:
+            logging.error(f"Error writing extraction cache entry: {e}")
+            return
+        self._writes_since_prune += 1
+        if self._writes_since_prune >= 20:
+            self._writes_since_prune = 0
+            self._prune_disk()
+
+    def _prune_disk(self):
+        """Delete expired entries and the least recently used ones above max_entries."""
+        try:
+            files = [entry for entry in os.scandir(self.cache_dir) if entry.name.endswith('.json')]
+        except OSError:
+            return
+        now = time.time()
+        files.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+        for index, entry in enumerate(files):
+            mtime = entry.stat().st_mtime
+            if index >= self.max_entries or now - mtime > self.ttl:
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+
+
+def cache_variant(format='best', noplaylist=False, flat=False):
+    """Describe the yt-dlp options that change the extraction result, used in cache keys."""
+    if flat:
+        return 'flat'
+    return f"format={format}|noplaylist={noplaylist}"
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_extraction_cache():
+    """Return the process-wide extraction cache shared by all yt-dlp entry points."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ExtractionCache()
+        return _cache
+
+
+def extract_info_cached(ydl, url, variant='', bypass=False):
+    """
+    Return the info dict for `url` without downloading, served from the
+    extraction cache when possible. `variant` must describe the options that
+    change the extractor result, see cache_variant().
+    """
+    cache = get_extraction_cache()
+    info = None if bypass else cache.get(url, variant)
+    if info is None:
+        info = ydl.extract_info(url, download=False)
+        cache.put(url, info, variant)
+    return info
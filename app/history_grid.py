@@ -0,0 +1,88 @@
+"""
+Grid view of the download history. A QListView in icon mode over the
+history model only paints the cells on screen; thumbnails come from the
+thumbnail cache, which decodes them in the background the first time a cell
+is painted, and the view repaints when they arrive.
+"""
+from PyQt5.QtCore import Qt, QSize, QRect
+from PyQt5.QtGui import QPainter
+from PyQt5.QtWidgets import QStyledItemDelegate, QStyle, QListView
+from app.thumbnail_cache import ThumbnailCache
+
+MAX_THUMB_WIDTH = 300
+MIN_THUMB_WIDTH = 150
+CELL_PADDING = 8
+
+
+class HistoryGridDelegate(QStyledItemDelegate):
+    """Paints a thumbnail with the elided title below it."""
+
+    def __init__(self, thumbnail_cache, parent=None):
+        super().__init__(parent)
+        self.thumbnail_cache = thumbnail_cache
+        self.thumb_width = MAX_THUMB_WIDTH
+
+    def set_thumb_width(self, width):
+        self.thumb_width = width
+
+    def sizeHint(self, option, index):
+        text_height = option.fontMetrics.height()
+        return QSize(self.thumb_width + CELL_PADDING, self.thumb_width + text_height + 2 * CELL_PADDING)
+
+    def paint(self, painter, option, index):
+        video = index.data(Qt.UserRole) or {}
+        painter.save()
+        if option.state & QStyle.State_Selected:
+            painter.fillRect(option.rect, option.palette.highlight())
+
+        thumb_rect = QRect(option.rect.x() + CELL_PADDING // 2, option.rect.y() + CELL_PADDING // 2,
+                           self.thumb_width, self.thumb_width)
+        thumbnail_path = video.get('thumbnail') or ''
+        pixmap = self.thumbnail_cache.pixmap(thumbnail_path, self.thumb_width) if thumbnail_path else None
+        if pixmap is not None:
+            scaled = pixmap.size().scaled(thumb_rect.size(), Qt.KeepAspectRatio)
+            target = QRect(0, 0, scaled.width(), scaled.height())
+            target.moveCenter(thumb_rect.center())
+            painter.setRenderHint(QPainter.SmoothPixmapTransform)
+            painter.drawPixmap(target, pixmap)
+        else:
+            loading = thumbnail_path and not self.thumbnail_cache.is_missing(thumbnail_path)
+            painter.drawText(thumb_rect, Qt.AlignCenter, "Loading..." if loading else "No Thumbnail")
+
+        title = video.get('title', 'Unknown Title')
+        text_rect = QRect(option.rect.x(), thumb_rect.bottom() + CELL_PADDING // 2,
+                          option.rect.width(), option.fontMetrics.height())
+        elided = option.fontMetrics.elidedText(title, Qt.ElideRight, self.thumb_width)
+        painter.drawText(text_rect, Qt.AlignCenter, elided)
+        painter.restore()
+
+
+class HistoryGridView(QListView):
+    """Icon-mode list over the history model; resizing only changes the cell size."""
+
+    def __init__(self, model, parent=None):
+        super().__init__(parent)
+        self.thumbnail_cache = ThumbnailCache(parent=self)
+        self.thumbnail_cache.thumbnail_ready.connect(lambda path: self.viewport().update())
+        self.delegate = HistoryGridDelegate(self.thumbnail_cache, self)
+        self.setModel(model)
+        self.setModelColumn(0)
+        self.setItemDelegate(self.delegate)
+        self.setViewMode(QListView.IconMode)
+        self.setResizeMode(QListView.Adjust)
+        self.setMovement(QListView.Static)
+        self.setUniformItemSizes(True)
+        self.setSelectionMode(QListView.SingleSelection)
+
+    def adjust_thumb_width(self, available_width):
+        """Pick a thumbnail width between MIN_THUMB_WIDTH and MAX_THUMB_WIDTH that fills the row."""
+        num_columns = max(1, available_width // (MIN_THUMB_WIDTH + CELL_PADDING))
+        thumb_width = min(max(MIN_THUMB_WIDTH, available_width // num_columns - CELL_PADDING), MAX_THUMB_WIDTH)
+        if thumb_width != self.delegate.thumb_width:
+            self.delegate.set_thumb_width(thumb_width)
+            # Uniform item sizes are cached by the view; relayout with the new size
+            self.scheduleDelayedItemsLayout()
+
+    def resizeEvent(self, event):
+        self.adjust_thumb_width(self.viewport().width())
+        super().resizeEvent(event)
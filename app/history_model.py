@@ -0,0 +1,349 @@
+"""
+Table model for the download history list view. Only the visible rows are
+ever asked for by the view, cell text is formatted lazily and cached, and the
+search filter is the set of matching entry ids returned by the history store.
+"""
+from datetime import datetime
+from PyQt5.QtCore import Qt, QObject, QAbstractTableModel, QModelIndex, pyqtSignal
+from PyQt5.QtGui import QBrush, QColor
+from app.history_stats import HistoryAggregates
+from app.history_store import FILE_MISSING, FILE_RESIZED
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mkv', '.flv', '.mov')
+COLUMNS = ['Name', 'Size', 'Duration', 'Source', 'Downloaded', 'Path']
+NAME_COLUMN, SIZE_COLUMN, DURATION_COLUMN, SOURCE_COLUMN, DATE_COLUMN, PATH_COLUMN = range(len(COLUMNS))
+NUMERIC_COLUMNS = {SIZE_COLUMN: 'size', DURATION_COLUMN: 'duration'}
+TEXT_COLUMNS = {NAME_COLUMN: 'title', SOURCE_COLUMN: 'source_site', DATE_COLUMN: 'download_date', PATH_COLUMN: 'path'}
+# Columns whose sort keys are numbers
+NUMBER_SORTED_COLUMNS = set(NUMERIC_COLUMNS) | {DATE_COLUMN}
+
+SORT_ROLE = Qt.UserRole + 1  # Typed sort key of a cell
+MAX_SORT_COLUMNS = 3  # Columns kept as tie-breakers when another column is sorted
+
+# Rows of entries the reconciliation scanner flagged
+FILE_STATE_TEXT = {FILE_MISSING: "File not found on disk", FILE_RESIZED: "File size changed on disk"}
+FILE_STATE_COLORS = {FILE_MISSING: QBrush(QColor('gray')), FILE_RESIZED: QBrush(QColor('darkorange'))}
+
+
+def is_video_entry(video):
+    return (video.get('path') or '').lower().endswith(VIDEO_EXTENSIONS)
+
+
+def format_size(size_value):
+    if size_value and isinstance(size_value, (int, float)):
+        return f"{size_value / (1024 * 1024):.2f} MB"
+    return "Unknown"
+
+
+def format_duration(duration_seconds):
+    if isinstance(duration_seconds, (int, float)):
+        minutes, seconds = divmod(int(duration_seconds), 60)
+        return f"{minutes} min {seconds} sec"
+    return "Unknown"
+
+
+def date_timestamp(text):
+    """Seconds since the epoch of a 'YYYY-MM-DD HH:MM:SS' download date, -1 if it is not one."""
+    try:
+        return datetime.fromisoformat(text).timestamp()
+    except (TypeError, ValueError, OverflowError, OSError):
+        return -1
+
+
+def sort_value(video, column):
+    """
+    Sort key of one cell: bytes and seconds for size and duration, the
+    timestamp for the download date (-1 when unknown), lowercase text otherwise.
+    """
+    if column in NUMERIC_COLUMNS:
+        value = video.get(NUMERIC_COLUMNS[column])
+        return value if isinstance(value, (int, float)) else -1
+    if column == DATE_COLUMN:
+        return date_timestamp(video.get('download_date'))
+    return (video.get(TEXT_COLUMNS[column]) or '').lower()
+
+
+class _Descending:
+    """Sort key wrapper that inverts the order of the wrapped value."""
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+def _bisect_left(ids, key, sort_keys):
+    """Position of `key` in a list of ids ordered by sort_keys (bisect.bisect_left with a key)."""
+    lo, hi = 0, len(ids)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if sort_keys[ids[mid]] < key:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+class HistoryChangeRelay(QObject):
+    """Delivers HistoryStore change notifications, which may come from any thread, on the GUI thread."""
+
+    changed = pyqtSignal(str, list)  # event, entries (or ids for 'removed')
+
+
+class HistoryTableModel(QAbstractTableModel):
+    """
+    Download history entries (video files only) as a flat table.
+
+    Everything is keyed by entry id: self._order lists every id in sort
+    order and self._visible the ids matching the filter, in the same order.
+    Sort keys are unique (the id breaks ties), so single entries can be
+    inserted, moved and removed by binary search without resetting the model.
+
+    Sorting by a column keeps the previously sorted columns as tie-breakers,
+    so sorting by Source and then Size lists each size group by source.
+    """
+
+    sort_columns_changed = pyqtSignal(list)  # [(column, order), ...], primary first
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._entries = {}  # entry id -> entry
+        self.aggregates = HistoryAggregates()  # counts and bytes per site, day and format
+        self._sort_keys = {}  # entry id -> sort key
+        self._order = []  # all ids in sort order
+        self._visible = []  # ids shown, in sort order
+        self._display_cache = {}  # entry id -> tuple of formatted cells
+        self._filter_ids = None  # ids of the entries matching the search, None shows everything
+        self._sort_columns = []  # (column, order) pairs, primary first; empty keeps history order
+
+    # Qt model interface
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._visible)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return COLUMNS[section]
+        if role == Qt.ToolTipRole and orientation == Qt.Horizontal:
+            return f"Sort by {COLUMNS[section]}; the previously sorted columns break ties"
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        entry_id = self._visible[index.row()]
+        if role == Qt.DisplayRole:
+            return self._display_row(entry_id)[index.column()]
+        if role == SORT_ROLE:
+            return sort_value(self._entries[entry_id], index.column())
+        if role == Qt.ToolTipRole and index.column() in (NAME_COLUMN, PATH_COLUMN):
+            state = FILE_STATE_TEXT.get(self._entries[entry_id].get('file_state'))
+            text = self._display_row(entry_id)[index.column()]
+            return f"{text}\n{state}" if state else text
+        if role == Qt.ForegroundRole and self._entries[entry_id].get('file_state') in FILE_STATE_COLORS:
+            return FILE_STATE_COLORS[self._entries[entry_id]['file_state']]
+        if role == Qt.UserRole:
+            return self._entries[entry_id]
+        return None
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        """Sort by column first, keeping the earlier sort columns as tie-breakers."""
+        if column < 0 or self._sort_columns[:1] == [(column, order)]:
+            return  # No sort column, or already sorted this way
+        previous = [(c, o) for c, o in self._sort_columns if c != column]
+        self.set_sort_columns([(column, order)] + previous)
+
+    def set_sort_columns(self, sort_columns):
+        """Sort by several (column, order) pairs, primary first."""
+        sort_columns = [(int(column), Qt.SortOrder(int(order))) for column, order in sort_columns
+                        if 0 <= int(column) < len(COLUMNS)][:MAX_SORT_COLUMNS]
+        self._sort_columns = sort_columns
+        self.beginResetModel()
+        self._apply_sort()
+        self._apply_filter()
+        self.endResetModel()
+        self.sort_columns_changed.emit(list(sort_columns))
+
+    def sort_columns(self):
+        return list(self._sort_columns)
+
+    # Data handling
+
+    def set_entries(self, entries):
+        """Replace all rows with the video entries of a history list."""
+        self.beginResetModel()
+        self._entries = {video['id']: video for video in entries if is_video_entry(video)}
+        self.aggregates.reset(self._entries.values())
+        self._display_cache = {}
+        self._apply_sort()
+        self._apply_filter()
+        self.endResetModel()
+
+    def set_filter_ids(self, ids):
+        """Show only the entries with these ids (e.g. HistoryStore.search results), or all for None."""
+        self._filter_ids = None if ids is None else set(ids)
+        self.beginResetModel()
+        self._apply_filter()
+        self.endResetModel()
+
+    def insert_entries(self, entries, matching_ids=None):
+        """
+        Add new entries in place. While a filter is active only the ids in
+        matching_ids are shown.
+        """
+        for video in entries:
+            if video['id'] in self._entries:
+                self.update_entries([video], matching_ids)
+            elif is_video_entry(video):
+                visible = self._filter_ids is None or (matching_ids is not None and video['id'] in matching_ids)
+                self._insert(video, visible)
+
+    def update_entries(self, entries, matching_ids=None):
+        """
+        Apply changed entries. Rows that keep their place are repainted, rows
+        whose sort key changed are moved. With an active filter, matching_ids
+        (if given) decides whether each entry is still shown.
+        """
+        for video in entries:
+            entry_id = video['id']
+            if entry_id not in self._entries:
+                self.insert_entries([video], matching_ids)
+                continue
+            if not is_video_entry(video):
+                self.remove_ids([entry_id])
+                continue
+            was_visible = self._find(self._visible, entry_id) is not None
+            if self._filter_ids is None:
+                visible = True
+            elif matching_ids is not None:
+                visible = entry_id in matching_ids
+            else:
+                visible = was_visible
+
+            old_key = self._sort_keys[entry_id]
+            self._display_cache.pop(entry_id, None)
+            if visible == was_visible and self._sort_key(video) == old_key:
+                self._entries[entry_id] = video
+                self.aggregates.add(video)
+                if visible:
+                    row = self._find(self._visible, entry_id)
+                    self.dataChanged.emit(self.index(row, 0), self.index(row, len(COLUMNS) - 1))
+            else:
+                self._remove(entry_id)
+                self._insert(video, visible)
+
+    def remove_ids(self, ids):
+        """Drop deleted entries."""
+        for entry_id in ids:
+            if entry_id in self._entries:
+                self._remove(entry_id)
+
+    def entry(self, index):
+        """The history entry shown at a view index, or None."""
+        if not index.isValid() or index.row() >= len(self._visible):
+            return None
+        return self._entries[self._visible[index.row()]]
+
+    def visible_entries(self):
+        return [self._entries[i] for i in self._visible]
+
+    def is_filtered(self):
+        return self._filter_ids is not None
+
+    def visible_count(self):
+        return len(self._visible)
+
+    def visible_size(self):
+        """Total size in bytes of the entries that match the filter."""
+        return self.aggregates.totals(self._filter_ids)[1]
+
+    def statistics(self):
+        """Totals and per site/day/format breakdowns of the entries that match the filter."""
+        return self.aggregates.summary(self._filter_ids)
+
+    @staticmethod
+    def _format_cells(video):
+        return (
+            video.get('title', 'Unknown Title'),
+            format_size(video.get('size')),
+            format_duration(video.get('duration', 0)),
+            video.get('source_site', 'Unknown Source'),
+            video.get('download_date', ''),
+            video.get('path', 'Unknown Path'),
+        )
+
+    def _display_row(self, entry_id):
+        cells = self._display_cache.get(entry_id)
+        if cells is None:
+            cells = self._display_cache[entry_id] = self._format_cells(self._entries[entry_id])
+        return cells
+
+    def _sort_key(self, video):
+        """Unique key of an entry in the current sort order; without sort columns, history order."""
+        key = []
+        for column, order in self._sort_columns:
+            value = sort_value(video, column)
+            if order == Qt.DescendingOrder:
+                # Numbers are negated so "largest first" compares plain numbers
+                value = -value if column in NUMBER_SORTED_COLUMNS else _Descending(value)
+            key.append(value)
+        key.append(video['id'])
+        return tuple(key)
+
+    def _find(self, ids, entry_id):
+        """Row of entry_id in a list of ids in sort order, or None."""
+        pos = _bisect_left(ids, self._sort_keys[entry_id], self._sort_keys)
+        if pos < len(ids) and ids[pos] == entry_id:
+            return pos
+        return None
+
+    def _insert(self, video, visible):
+        entry_id = video['id']
+        self._entries[entry_id] = video
+        self.aggregates.add(video)
+        self._sort_keys[entry_id] = key = self._sort_key(video)
+        self._order.insert(_bisect_left(self._order, key, self._sort_keys), entry_id)
+        if not visible:
+            return
+        if self._filter_ids is not None:
+            self._filter_ids.add(entry_id)
+        row = _bisect_left(self._visible, key, self._sort_keys)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._visible.insert(row, entry_id)
+        self.endInsertRows()
+
+    def _remove(self, entry_id):
+        row = self._find(self._visible, entry_id)
+        if row is not None:
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self._visible[row]
+            self.endRemoveRows()
+        if self._filter_ids is not None:
+            self._filter_ids.discard(entry_id)
+        position = self._find(self._order, entry_id)
+        if position is not None:
+            del self._order[position]
+        del self._entries[entry_id]
+        self.aggregates.remove(entry_id)
+        del self._sort_keys[entry_id]
+        self._display_cache.pop(entry_id, None)
+
+    def _apply_sort(self):
+        self._sort_keys = {entry_id: self._sort_key(video) for entry_id, video in self._entries.items()}
+        self._order = sorted(self._entries, key=self._sort_keys.__getitem__)
+
+    def _apply_filter(self):
+        if self._filter_ids is None:
+            self._visible = list(self._order)
+        else:
+            filter_ids = self._filter_ids
+            self._visible = [entry_id for entry_id in self._order if entry_id in filter_ids]
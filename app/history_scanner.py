@@ -0,0 +1,249 @@
+"""
+History reconciliation - keeps the download history in step with the files
+on disk. A worker thread walks the folders that hold downloaded files with
+os.scandir, marks entries whose file is missing or has changed size, and
+reports media files in those folders that are not in the history. Folder
+changes reported by QFileSystemWatcher (inotify on Linux) trigger a rescan
+of just that folder.
+"""
+import os
+import logging
+from datetime import datetime
+from PyQt5.QtCore import QObject, QThread, QTimer, QFileSystemWatcher, QCoreApplication, pyqtSignal
+from app.history_store import get_history_store, FILE_MISSING, FILE_RESIZED, EVENT_INSERTED, EVENT_UPDATED
+from app.history_model import VIDEO_EXTENSIONS, HistoryChangeRelay
+
+BATCH_SIZE = 500  # History updates written per transaction
+STARTUP_DELAY_MS = 5000  # Let the GUI settle before the first full scan
+RESCAN_DELAY_MS = 2000  # Folder change notifications are collected this long before rescanning
+MAX_WATCHED_FOLDERS = 1000  # Stay well below the inotify watch limit
+
+
+def folder_key(path):
+    return os.path.normcase(os.path.abspath(path))
+
+
+class ScanResult:
+    """Outcome of one scan: counts of changed entries and untracked media found, by folder."""
+
+    def __init__(self):
+        self.checked = 0
+        self.missing = 0
+        self.resized = 0
+        self.restored = 0
+        self.untracked = {}  # folder key -> list of (path, size, mtime)
+
+
+class ReconcileWorker(QObject):
+    """Runs scans on its own thread; each scan() call compares history entries with the files on disk."""
+
+    finished = pyqtSignal(object, object)  # scanned folder keys, ScanResult
+
+    def __init__(self, store):
+        super().__init__()
+        self.store = store
+        self.running = True
+
+    def scan(self, folders):
+        """Scan the given folders, or every folder holding a history entry for None."""
+        result = ScanResult()
+        scanned = set()
+        try:
+            by_folder = {}
+            for entry_id, path, file_size, file_state in self.store.file_index():
+                by_folder.setdefault(folder_key(os.path.dirname(path)), []).append(
+                    (entry_id, os.path.basename(path), file_size, file_state))
+            targets = by_folder.keys() if folders is None else folders
+
+            changes = []
+            for folder in sorted(targets):
+                if not self.running:
+                    break
+                changes.extend(self._scan_folder(folder, by_folder.get(folder, []), result))
+                scanned.add(folder)
+                if len(changes) >= BATCH_SIZE:
+                    self.store.update_many(changes)
+                    changes = []
+            if changes:
+                self.store.update_many(changes)
+        except Exception as e:
+            logging.error(f"Error reconciling download history: {e}")
+        self.finished.emit(scanned, result)
+
+    def _scan_folder(self, folder, entries, result):
+        """Compare one folder's listing with its history entries; returns the file_state (and file_size) changes."""
+        files = {}
+        untracked = []
+        try:
+            with os.scandir(folder) as listing:
+                for item in listing:
+                    if item.is_file():
+                        files[os.path.normcase(item.name)] = item
+        except OSError:
+            pass  # Folder gone or unreadable: every entry in it is missing
+
+        changes = []
+        tracked = set()
+        for entry_id, name, file_size, file_state in entries:
+            result.checked += 1
+            item = files.get(os.path.normcase(name))
+            tracked.add(os.path.normcase(name))
+            fields = {}
+            if item is None:
+                state = FILE_MISSING
+            else:
+                try:
+                    disk_size = item.stat().st_size
+                except OSError:
+                    disk_size = None
+                if file_size is None and disk_size is not None:
+                    # Recorded without a verified size (older entry): what is on disk now is the reference
+                    fields['file_size'] = file_size = disk_size
+                state = FILE_RESIZED if disk_size is not None and int(file_size) != disk_size else None
+            if state != file_state:
+                fields['file_state'] = state
+            if fields:
+                changes.append((entry_id, fields))
+            if state != file_state:
+                if state == FILE_MISSING:
+                    result.missing += 1
+                elif state == FILE_RESIZED:
+                    result.resized += 1
+                else:
+                    result.restored += 1
+
+        for name, item in files.items():
+            if name not in tracked and name.endswith(VIDEO_EXTENSIONS):
+                try:
+                    stat = item.stat()
+                    untracked.append((item.path, stat.st_size, stat.st_mtime))
+                except OSError:
+                    pass
+        result.untracked[folder] = untracked
+        return changes
+
+
+class HistoryReconciler(QObject):
+    """
+    Schedules reconciliation scans on a background thread: a full scan
+    shortly after start-up, then rescans of single folders when the file
+    system watcher reports a change. Lives on the GUI thread.
+    """
+
+    scan_started = pyqtSignal()
+    scan_finished = pyqtSignal(object)  # ScanResult
+    untracked_changed = pyqtSignal(int)  # number of untracked media files known
+
+    _request_scan = pyqtSignal(object)  # folder keys, or None for everything
+
+    def __init__(self, store=None, parent=None):
+        super().__init__(parent)
+        self.store = store or get_history_store()
+        self.untracked = {}  # folder key -> list of (path, size, mtime)
+        self._busy = False
+        self._full_scan_pending = False
+        self._pending_folders = set()
+
+        self.thread = QThread()
+        self.worker = ReconcileWorker(self.store)
+        self.worker.moveToThread(self.thread)
+        self._request_scan.connect(self.worker.scan)
+        self.worker.finished.connect(self._on_scan_finished)
+        self.thread.start()
+
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self._on_directory_changed)
+        self.rescan_timer = QTimer(self)
+        self.rescan_timer.setSingleShot(True)
+        self.rescan_timer.setInterval(RESCAN_DELAY_MS)
+        self.rescan_timer.timeout.connect(self._start_next_scan)
+
+        # New downloads may land in folders that are not watched yet
+        self.history_relay = HistoryChangeRelay(self)
+        self.history_relay.changed.connect(self._on_history_changed)
+        self.store.subscribe(self.history_relay.changed.emit)
+
+        QCoreApplication.instance().aboutToQuit.connect(self.stop)
+        QTimer.singleShot(STARTUP_DELAY_MS, self.scan_all)
+
+    def scan_all(self):
+        self._full_scan_pending = True
+        self._start_next_scan()
+
+    def scan_folder(self, folder):
+        self._pending_folders.add(folder_key(folder))
+        self.rescan_timer.start()
+
+    def untracked_files(self):
+        return [item for items in self.untracked.values() for item in items]
+
+    def import_untracked(self):
+        """Add the untracked media files found so far to the history. Returns how many were added."""
+        entries = []
+        for path, size, mtime in self.untracked_files():
+            entries.append({
+                "title": os.path.splitext(os.path.basename(path))[0],
+                "path": path,
+                "size": size,
+                "file_size": size,
+                "source_site": "Local",
+                "download_date": datetime.fromtimestamp(mtime).strftime("%Y-%m-%d %H:%M:%S"),
+                "status": "imported",
+                "thumbnail": "",
+            })
+        if entries:
+            self.store.add_many(entries)
+        self.untracked = {}
+        self.untracked_changed.emit(0)
+        return len(entries)
+
+    def stop(self):
+        if not self.thread.isRunning():
+            return
+        self.worker.running = False
+        self.store.unsubscribe(self.history_relay.changed.emit)
+        self.thread.quit()
+        self.thread.wait()
+
+    def _start_next_scan(self):
+        if self._busy:
+            return  # Picked up when the running scan finishes
+        if self._full_scan_pending:
+            folders = None
+        elif self._pending_folders:
+            folders = self._pending_folders
+        else:
+            return
+        self._full_scan_pending = False
+        self._pending_folders = set()
+        self._busy = True
+        self.scan_started.emit()
+        self._request_scan.emit(folders)
+
+    def _on_scan_finished(self, scanned, result):
+        self._busy = False
+        for folder in scanned:
+            self.untracked.pop(folder, None)
+        self.untracked.update({folder: items for folder, items in result.untracked.items() if items})
+        self._watch(scanned)
+        if result.missing or result.resized or result.restored:
+            logging.info(f"History reconciliation: {result.missing} missing, {result.resized} resized, "
+                         f"{result.restored} restored of {result.checked} checked")
+        self.scan_finished.emit(result)
+        self.untracked_changed.emit(len(self.untracked_files()))
+        self._start_next_scan()
+
+    def _watch(self, folders):
+        watched = set(self.watcher.directories())
+        new = [folder for folder in folders if folder not in watched and os.path.isdir(folder)]
+        room = MAX_WATCHED_FOLDERS - len(watched)
+        if new and room > 0:
+            self.watcher.addPaths(new[:room])
+
+    def _on_directory_changed(self, folder):
+        self.scan_folder(folder)
+
+    def _on_history_changed(self, event, payload):
+        if event in (EVENT_INSERTED, EVENT_UPDATED):
+            folders = {folder_key(os.path.dirname(video['path'])) for video in payload if video.get('path')}
+            self._watch(folders)
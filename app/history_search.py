@@ -0,0 +1,64 @@
+"""
+History search query parsing. A query is a list of words, optionally scoped
+to a field ("source:youtube", "title:cat", "path:D:/Videos", "url:playlist"),
+plus numeric filters on size and duration ("size>1GB", "duration<=10m").
+
+Words are prefix matched against the full-text index; numeric filters
+become SQL conditions.
+"""
+import re
+
+# Field names accepted in queries, mapped to the indexed column
+TEXT_FIELDS = {
+    'title': 'title',
+    'source': 'source_site',
+    'site': 'source_site',
+    'path': 'path',
+    'url': 'url',
+}
+
+SIZE_UNITS = {'': 1, 'b': 1, 'k': 1024, 'kb': 1024, 'm': 1024 ** 2, 'mb': 1024 ** 2,
+              'g': 1024 ** 3, 'gb': 1024 ** 3, 't': 1024 ** 4, 'tb': 1024 ** 4}
+DURATION_UNITS = {'': 1, 's': 1, 'sec': 1, 'm': 60, 'min': 60, 'h': 3600}
+
+NUMERIC_FILTER = re.compile(r'^(size|duration)(>=|<=|>|<|=)(\d+(?:\.\d+)?)([a-z]*)$', re.IGNORECASE)
+
+
+class SearchQuery:
+    """Parsed query: text terms as (column or None, word) and numeric filters as (column, operator, value)."""
+
+    def __init__(self, terms, filters):
+        self.terms = terms
+        self.filters = filters
+
+    def is_empty(self):
+        return not self.terms and not self.filters
+
+    def fts_expression(self):
+        """FTS5 MATCH expression with every term prefix matched, or None without text terms."""
+        parts = []
+        for column, word in self.terms:
+            phrase = '"' + word.replace('"', '""') + '"*'
+            parts.append(f"{column} : {phrase}" if column else phrase)
+        return ' AND '.join(parts) or None
+
+
+def parse_search_query(text):
+    """Split a search box string into a SearchQuery. Unknown prefixes are searched as plain words."""
+    terms = []
+    filters = []
+    for token in text.split():
+        match = NUMERIC_FILTER.match(token)
+        if match:
+            column, operator, number, unit = match.groups()
+            units = SIZE_UNITS if column.lower() == 'size' else DURATION_UNITS
+            if unit.lower() in units:
+                filters.append((column.lower(), operator, float(number) * units[unit.lower()]))
+                continue
+        field, sep, word = token.partition(':')
+        if sep and field.lower() in TEXT_FIELDS:
+            if word:
+                terms.append((TEXT_FIELDS[field.lower()], word))
+            continue
+        terms.append((None, token))
+    return SearchQuery(terms, filters)
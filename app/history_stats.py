@@ -0,0 +1,195 @@
+"""
+Download history aggregates - running totals and counts/bytes per source
+site, day and file format, updated entry by entry as the history changes.
+Breakdowns for a search result are recomputed with NumPy over columnar
+copies of the entries.
+"""
+import os
+import numpy as np
+
+UNKNOWN = 'Unknown'
+
+
+def entry_site(video):
+    return video.get('source_site') or UNKNOWN
+
+
+def entry_day(video):
+    """'YYYY-MM-DD' part of the download date."""
+    date = video.get('download_date') or ''
+    return date[:10] if len(date) >= 10 else UNKNOWN
+
+
+def entry_format(video):
+    extension = os.path.splitext(video.get('path') or '')[1].lower().lstrip('.')
+    return extension or UNKNOWN
+
+
+def entry_size(video):
+    size = video.get('size')
+    return int(size) if isinstance(size, (int, float)) else 0
+
+
+class HistoryAggregates:
+    """
+    Aggregates over a set of history entries.
+
+    The unfiltered totals and groupings are kept up to date in O(1) per
+    change. Entries are also kept as columns (id, size and integer codes for
+    site, day and format) so summary() for a filtered subset is a handful of
+    vectorized operations instead of a Python loop over every entry.
+    """
+
+    def __init__(self):
+        self.reset([])
+
+    def reset(self, entries):
+        self.total_count = 0
+        self.total_bytes = 0
+        self.by_site = {}  # site -> [count, bytes]
+        self.by_day = {}  # day -> [count, bytes]
+        self.by_format = {}  # format -> [count, bytes]
+        self.site_day = {}  # (site, day) -> [count, bytes]
+        # Columns; removed entries stay in place with alive = False
+        self._position = {}  # entry id -> column position
+        self._ids = []
+        self._sizes = []
+        self._alive = []
+        self._dead = 0
+        self._codes = {'site': [], 'day': [], 'format': []}
+        self._labels = {'site': [], 'day': [], 'format': []}
+        self._label_codes = {'site': {}, 'day': {}, 'format': {}}
+        self._arrays = None
+        for video in entries:
+            self.add(video)
+
+    def add(self, video):
+        """Count an entry; an entry already counted under the same id is replaced."""
+        self.remove(video['id'])
+        size = entry_size(video)
+        keys = {'site': entry_site(video), 'day': entry_day(video), 'format': entry_format(video)}
+        self._count(keys, size, 1)
+        self._position[video['id']] = len(self._ids)
+        self._ids.append(video['id'])
+        self._sizes.append(size)
+        self._alive.append(True)
+        for column, label in keys.items():
+            self._codes[column].append(self._code(column, label))
+        self._arrays = None
+
+    def remove(self, entry_id):
+        position = self._position.pop(entry_id, None)
+        if position is None:
+            return
+        keys = {column: self._labels[column][self._codes[column][position]] for column in self._codes}
+        self._count(keys, self._sizes[position], -1)
+        self._alive[position] = False
+        self._dead += 1
+        if self._dead > len(self._ids) // 2:
+            self._compact()
+        self._arrays = None
+
+    def _compact(self):
+        """Drop the columns of removed entries once they make up half of them."""
+        keep = [position for position, alive in enumerate(self._alive) if alive]
+        self._ids = [self._ids[position] for position in keep]
+        self._sizes = [self._sizes[position] for position in keep]
+        for column, codes in self._codes.items():
+            self._codes[column] = [codes[position] for position in keep]
+        self._alive = [True] * len(keep)
+        self._position = {entry_id: position for position, entry_id in enumerate(self._ids)}
+        self._dead = 0
+
+    def _count(self, keys, size, sign):
+        self.total_count += sign
+        self.total_bytes += sign * size
+        groups = (
+            (self.by_site, keys['site']),
+            (self.by_day, keys['day']),
+            (self.by_format, keys['format']),
+            (self.site_day, (keys['site'], keys['day'])),
+        )
+        for group, key in groups:
+            counts = group.setdefault(key, [0, 0])
+            counts[0] += sign
+            counts[1] += sign * size
+            if counts[0] <= 0:
+                del group[key]
+
+    def _code(self, column, label):
+        codes = self._label_codes[column]
+        code = codes.get(label)
+        if code is None:
+            code = codes[label] = len(self._labels[column])
+            self._labels[column].append(label)
+        return code
+
+    def _columns(self):
+        """NumPy copies of the columns, rebuilt only after a change."""
+        if self._arrays is None:
+            self._arrays = {
+                'id': np.array(self._ids, dtype=np.int64),
+                'size': np.array(self._sizes, dtype=np.int64),
+                'alive': np.array(self._alive, dtype=bool),
+            }
+            for column, codes in self._codes.items():
+                self._arrays[column] = np.array(codes, dtype=np.int64)
+        return self._arrays
+
+    def _mask(self, arrays, filter_ids):
+        wanted = np.fromiter(filter_ids, dtype=np.int64, count=len(filter_ids))
+        return arrays['alive'] & np.isin(arrays['id'], wanted)
+
+    def totals(self, filter_ids=None):
+        """(count, bytes) of all entries, or only those in filter_ids."""
+        if filter_ids is None:
+            return self.total_count, self.total_bytes
+        arrays = self._columns()
+        mask = self._mask(arrays, filter_ids)
+        return int(mask.sum()), int(arrays['size'][mask].sum())
+
+    def summary(self, filter_ids=None):
+        """
+        Totals and groupings for all entries, or only those in filter_ids.
+        Returns {'count', 'bytes', 'by_site', 'by_day', 'by_format', 'site_day'}
+        with the groupings as {key: (count, bytes)}.
+        """
+        if filter_ids is None:
+            return {
+                'count': self.total_count,
+                'bytes': self.total_bytes,
+                'by_site': {key: tuple(value) for key, value in self.by_site.items()},
+                'by_day': {key: tuple(value) for key, value in self.by_day.items()},
+                'by_format': {key: tuple(value) for key, value in self.by_format.items()},
+                'site_day': {key: tuple(value) for key, value in self.site_day.items()},
+            }
+
+        arrays = self._columns()
+        mask = self._mask(arrays, filter_ids)
+        sizes = arrays['size'][mask]
+        result = {'count': int(mask.sum()), 'bytes': int(sizes.sum())}
+        for column, name in (('site', 'by_site'), ('day', 'by_day'), ('format', 'by_format')):
+            result[name] = self._grouped(arrays[column][mask], sizes, self._labels[column])
+
+        # Site and day combined into one code so a single bincount covers the whole pivot
+        n_days = max(1, len(self._labels['day']))
+        combined = arrays['site'][mask] * n_days + arrays['day'][mask]
+        site_day = {}
+        for code, value in self._grouped(combined, sizes, None).items():
+            site, day = divmod(code, n_days)
+            site_day[(self._labels['site'][site], self._labels['day'][day])] = value
+        result['site_day'] = site_day
+        return result
+
+    @staticmethod
+    def _grouped(codes, sizes, labels):
+        """{label (or code): (count, bytes)} for the codes present."""
+        if not len(codes):
+            return {}
+        counts = np.bincount(codes)
+        totals = np.bincount(codes, weights=sizes)
+        present = np.nonzero(counts)[0]
+        return {
+            (labels[code] if labels is not None else int(code)): (int(counts[code]), int(totals[code]))
+            for code in present
+        }
@@ -0,0 +1,116 @@
+"""
+Download history statistics - totals and breakdowns per source site, day and
+file format of the entries shown in the history tab, including a table of
+GB downloaded per site per day.
+"""
+from PyQt5.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QTabWidget,
+    QTableWidget, QTableWidgetItem, QHeaderView, QApplication
+)
+from PyQt5.QtCore import Qt
+
+GB = 1024 ** 3
+
+
+def format_gb(size_bytes):
+    return f"{size_bytes / GB:.2f}"
+
+
+class HistoryStatsDialog(QDialog):
+    """Non-modal statistics window; refresh() re-reads the history model's aggregates."""
+
+    def __init__(self, history_model, parent=None):
+        super().__init__(parent)
+        self.history_model = history_model
+        self.setWindowTitle("Download Statistics")
+        self.resize(800, 500)
+        self.site_day_rows = []  # Pivot as plain rows, for Copy as CSV
+
+        layout = QVBoxLayout(self)
+        self.summary_label = QLabel()
+        layout.addWidget(self.summary_label)
+
+        self.tabs = QTabWidget()
+        self.site_day_table = self._create_table()
+        self.site_table = self._create_table()
+        self.day_table = self._create_table()
+        self.format_table = self._create_table()
+        self.tabs.addTab(self.site_day_table, "GB per Site per Day")
+        self.tabs.addTab(self.site_table, "By Site")
+        self.tabs.addTab(self.day_table, "By Day")
+        self.tabs.addTab(self.format_table, "By Format")
+        layout.addWidget(self.tabs)
+
+        button_layout = QHBoxLayout()
+        button_layout.addStretch()
+        copy_button = QPushButton("Copy as CSV")
+        copy_button.clicked.connect(self.copy_site_day_csv)
+        close_button = QPushButton("Close")
+        close_button.clicked.connect(self.close)
+        button_layout.addWidget(copy_button)
+        button_layout.addWidget(close_button)
+        layout.addLayout(button_layout)
+
+        self.refresh()
+
+    @staticmethod
+    def _create_table():
+        table = QTableWidget()
+        table.setEditTriggers(QTableWidget.NoEditTriggers)
+        table.verticalHeader().hide()
+        table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        table.horizontalHeader().setStretchLastSection(True)
+        return table
+
+    def refresh(self):
+        stats = self.history_model.statistics()
+        scope = "matching the search" if self.history_model.is_filtered() else "in history"
+        self.summary_label.setText(
+            f"{stats['count']} videos {scope}, {format_gb(stats['bytes'])} GB "
+            f"from {len(stats['by_site'])} sites over {len(stats['by_day'])} days"
+        )
+        self._fill_grouped(self.site_table, "Site", stats['by_site'], by_size=True)
+        self._fill_grouped(self.day_table, "Day", stats['by_day'], by_size=False)
+        self._fill_grouped(self.format_table, "Format", stats['by_format'], by_size=True)
+        self._fill_site_day(stats['site_day'], stats['by_site'])
+
+    @staticmethod
+    def _fill_grouped(table, label, groups, by_size):
+        """One row per group; sites and formats largest first, days newest first."""
+        if by_size:
+            keys = sorted(groups, key=lambda key: -groups[key][1])
+        else:
+            keys = sorted(groups, reverse=True)
+        table.setColumnCount(3)
+        table.setHorizontalHeaderLabels([label, "Videos", "GB"])
+        table.setRowCount(len(keys))
+        for row, key in enumerate(keys):
+            count, size = groups[key]
+            table.setItem(row, 0, QTableWidgetItem(str(key)))
+            for column, text in ((1, str(count)), (2, format_gb(size))):
+                item = QTableWidgetItem(text)
+                item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                table.setItem(row, column, item)
+
+    def _fill_site_day(self, site_day, by_site):
+        """Days as rows (newest first), sites as columns (largest first), GB in the cells."""
+        sites = sorted(by_site, key=lambda site: -by_site[site][1])
+        days = sorted({day for _, day in site_day}, reverse=True)
+        header = ["Day"] + sites + ["Total"]
+        self.site_day_rows = [header]
+        self.site_day_table.setColumnCount(len(header))
+        self.site_day_table.setHorizontalHeaderLabels(header)
+        self.site_day_table.setRowCount(len(days))
+        for row, day in enumerate(days):
+            sizes = [site_day.get((site, day), (0, 0))[1] for site in sites]
+            cells = [day] + [format_gb(size) if size else "" for size in sizes] + [format_gb(sum(sizes))]
+            self.site_day_rows.append(cells)
+            for column, text in enumerate(cells):
+                item = QTableWidgetItem(text)
+                if column:
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                self.site_day_table.setItem(row, column, item)
+
+    def copy_site_day_csv(self):
+        lines = [",".join('"' + cell.replace('"', '""') + '"' for cell in row) for row in self.site_day_rows]
+        QApplication.clipboard().setText("\n".join(lines))
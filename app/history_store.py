@@ -0,0 +1,434 @@
+"""
+Download history store - SQLite (WAL mode) replacement for rewriting the whole
+of data/downloads.json on every finished download.
+
+Appends, updates and deletes are single transactions, and lookups by URL,
+path and video id use indexes. The old JSON history is imported once.
+"""
+import os
+import json
+import sqlite3
+import logging
+import threading
+from app.history_search import parse_search_query
+from app.url_utils import normalize_url, NORMALIZE_VERSION
+
+HISTORY_DB_PATH = os.path.join('data', 'history.db')
+LEGACY_JSON_PATH = os.path.join('data', 'downloads.json')
+
+# Columns of the downloads table; any other keys of a history entry are kept in 'extra'
+COLUMNS = (
+    'title', 'path', 'size', 'url', 'video_id', 'extractor', 'duration',
+    'thumbnail', 'source_site', 'download_date', 'status', 'file_state', 'normalized_url',
+    'width', 'height', 'video_codec', 'audio_codec', 'bitrate', 'probe_key', 'file_size',
+)
+
+# Declared types of the columns added after the first release, for ALTER TABLE on older databases
+ADDED_COLUMN_TYPES = {
+    'file_state': 'TEXT',
+    'normalized_url': 'TEXT',
+    'width': 'INTEGER',
+    'height': 'INTEGER',
+    'video_codec': 'TEXT',
+    'audio_codec': 'TEXT',
+    'bitrate': 'INTEGER',
+    'probe_key': 'TEXT',
+    'file_size': 'INTEGER',
+}
+
+# Values of file_state, set by the reconciliation scanner; None while the file matches the history
+FILE_MISSING = 'missing'
+FILE_RESIZED = 'resized'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS downloads (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT,
+    path TEXT,
+    size INTEGER,
+    url TEXT,
+    video_id TEXT,
+    extractor TEXT,
+    duration REAL,
+    thumbnail TEXT,
+    source_site TEXT,
+    download_date TEXT,
+    status TEXT,
+    file_state TEXT,
+    normalized_url TEXT,
+    width INTEGER,
+    height INTEGER,
+    video_codec TEXT,
+    audio_codec TEXT,
+    bitrate INTEGER,
+    probe_key TEXT,
+    file_size INTEGER,  -- bytes on disk when the file was recorded; 'size' may be yt-dlp's estimate
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_downloads_url ON downloads(url);
+CREATE INDEX IF NOT EXISTS idx_downloads_path ON downloads(path);
+CREATE INDEX IF NOT EXISTS idx_downloads_video_id ON downloads(video_id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Full-text index over the searchable columns, kept in sync by triggers
+FTS_COLUMNS = ('title', 'source_site', 'path', 'url')
+FTS_SCHEMA = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS downloads_fts USING fts5(
+    {', '.join(FTS_COLUMNS)}, content='downloads', content_rowid='id', prefix='2 3'
+);
+CREATE TRIGGER IF NOT EXISTS downloads_fts_insert AFTER INSERT ON downloads BEGIN
+    INSERT INTO downloads_fts(rowid, {', '.join(FTS_COLUMNS)})
+    VALUES (new.id, {', '.join('new.' + c for c in FTS_COLUMNS)});
+END;
+CREATE TRIGGER IF NOT EXISTS downloads_fts_delete AFTER DELETE ON downloads BEGIN
+    INSERT INTO downloads_fts(downloads_fts, rowid, {', '.join(FTS_COLUMNS)})
+    VALUES ('delete', old.id, {', '.join('old.' + c for c in FTS_COLUMNS)});
+END;
+CREATE TRIGGER IF NOT EXISTS downloads_fts_update AFTER UPDATE OF {', '.join(FTS_COLUMNS)} ON downloads BEGIN
+    INSERT INTO downloads_fts(downloads_fts, rowid, {', '.join(FTS_COLUMNS)})
+    VALUES ('delete', old.id, {', '.join('old.' + c for c in FTS_COLUMNS)});
+    INSERT INTO downloads_fts(rowid, {', '.join(FTS_COLUMNS)})
+    VALUES (new.id, {', '.join('new.' + c for c in FTS_COLUMNS)});
+END;
+"""
+
+INSERT_SQL = (
+    f"INSERT INTO downloads ({', '.join(COLUMNS)}, extra) "
+    f"VALUES ({', '.join('?' for _ in range(len(COLUMNS) + 1))})"
+)
+
+
+# Change notifications passed to subscribers as (event, payload)
+EVENT_INSERTED = 'inserted'  # payload: list of new entries
+EVENT_UPDATED = 'updated'  # payload: list of changed entries
+EVENT_REMOVED = 'removed'  # payload: list of removed ids
+EVENT_RESET = 'reset'  # payload: empty list, reload everything
+
+
+class HistoryStore:
+    """
+    Download history backed by SQLite. Entries are plain dicts with the same
+    keys the JSON history used, plus 'id'. Safe to use from several threads;
+    each thread gets its own connection.
+
+    Subscribers are told about every committed change with row-level events,
+    called on the thread that made the change.
+    """
+
+    def __init__(self, db_path=HISTORY_DB_PATH, legacy_json_path=LEGACY_JSON_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._subscribers = []
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+            self._add_missing_columns(conn)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_downloads_normalized_url ON downloads(normalized_url)")
+            self._fill_normalized_urls(conn)
+        self.fts_enabled = self._create_fts_index()
+        if legacy_json_path:
+            self.migrate_from_json(legacy_json_path)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _add_missing_columns(conn):
+        """Add columns introduced after a database was created."""
+        existing = {row['name'] for row in conn.execute("PRAGMA table_info(downloads)")}
+        for column, column_type in ADDED_COLUMN_TYPES.items():
+            if column not in existing:
+                conn.execute(f"ALTER TABLE downloads ADD COLUMN {column} {column_type}")
+
+    @staticmethod
+    def _fill_normalized_urls(conn):
+        """Normalize the URLs of entries written before the column existed, or all of them after the rules changed."""
+        query = "SELECT id, url FROM downloads WHERE url IS NOT NULL AND url != ''"
+        outdated = conn.execute("PRAGMA user_version").fetchone()[0] < NORMALIZE_VERSION
+        rows = conn.execute(query if outdated else query + " AND normalized_url IS NULL").fetchall()
+        conn.executemany("UPDATE downloads SET normalized_url = ? WHERE id = ?",
+                         [(normalize_url(row['url']), row['id']) for row in rows])
+        if outdated:
+            conn.execute(f"PRAGMA user_version = {NORMALIZE_VERSION}")
+
+    def subscribe(self, callback):
+        """Call callback(event, payload) after every change."""
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def _notify(self, event, payload):
+        if not payload and event != EVENT_RESET:
+            return
+        for callback in list(self._subscribers):
+            try:
+                callback(event, payload)
+            except Exception as e:
+                logging.error(f"Error in history change subscriber: {e}")
+
+    def _create_fts_index(self):
+        """Create the full-text index, filling it from existing rows the first time. False if FTS5 is missing."""
+        conn = self._connection()
+        try:
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'downloads_fts'").fetchone()
+            with conn:
+                conn.executescript(FTS_SCHEMA)
+                if not exists:
+                    conn.execute("INSERT INTO downloads_fts(downloads_fts) VALUES ('rebuild')")
+            return True
+        except sqlite3.OperationalError as e:
+            logging.error(f"Full-text search unavailable, falling back to LIKE queries: {e}")
+            return False
+
+    @staticmethod
+    def _to_row(entry):
+        """Split an entry dict into column values and a JSON blob of the remaining keys."""
+        values = []
+        for column in COLUMNS:
+            value = entry.get(column)
+            if column == 'size' and not isinstance(value, (int, float)):
+                value = None
+            elif column == 'normalized_url' and not value:
+                value = normalize_url(entry.get('url')) or None
+            values.append(value)
+        extra = {key: value for key, value in entry.items() if key not in COLUMNS and key != 'id'}
+        values.append(json.dumps(extra, ensure_ascii=False) if extra else None)
+        return values
+
+    @staticmethod
+    def _to_entry(row):
+        entry = {'id': row['id']}
+        for column in COLUMNS:
+            value = row[column]
+            if value is not None or column in ('size', 'thumbnail'):
+                entry[column] = value
+        if entry.get('thumbnail') is None:
+            entry['thumbnail'] = ''
+        if row['extra']:
+            try:
+                entry.update(json.loads(row['extra']))
+            except ValueError:
+                pass
+        return entry
+
+    def add(self, entry):
+        """Append a history entry and return its id."""
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute(INSERT_SQL, self._to_row(entry))
+        entry_id = cursor.lastrowid
+        self._notify(EVENT_INSERTED, [self.get(entry_id)])
+        return entry_id
+
+    def add_many(self, entries):
+        """Append several entries in one transaction."""
+        conn = self._connection()
+        with conn:
+            conn.executemany(INSERT_SQL, [self._to_row(entry) for entry in entries])
+        self._notify(EVENT_RESET, [])
+
+    def update(self, entry_id, **fields):
+        """Change some columns of one entry. Returns True if the entry exists."""
+        fields = {key: value for key, value in fields.items() if key in COLUMNS}
+        if 'url' in fields:
+            fields['normalized_url'] = normalize_url(fields['url']) or None
+        if not fields:
+            return False
+        assignments = ', '.join(f"{key} = ?" for key in fields)
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute(f"UPDATE downloads SET {assignments} WHERE id = ?", (*fields.values(), entry_id))
+        if cursor.rowcount > 0:
+            self._notify(EVENT_UPDATED, [self.get(entry_id)])
+        return cursor.rowcount > 0
+
+    def update_many(self, changes):
+        """Apply several (entry_id, fields) updates in one transaction and notify once."""
+        changed = []
+        conn = self._connection()
+        with conn:
+            for entry_id, fields in changes:
+                fields = {key: value for key, value in fields.items() if key in COLUMNS}
+                if not fields:
+                    continue
+                assignments = ', '.join(f"{key} = ?" for key in fields)
+                cursor = conn.execute(f"UPDATE downloads SET {assignments} WHERE id = ?",
+                                      (*fields.values(), entry_id))
+                if cursor.rowcount > 0:
+                    changed.append(entry_id)
+        self._notify(EVENT_UPDATED, [self.get(entry_id) for entry_id in changed])
+        return len(changed)
+
+    def update_path(self, old_path, new_path, **fields):
+        """Point the entries of a renamed or moved file at its new path."""
+        fields = {key: value for key, value in fields.items() if key in COLUMNS and key != 'path'}
+        assignments = ', '.join(['path = ?'] + [f"{key} = ?" for key in fields])
+        conn = self._connection()
+        with conn:
+            ids = self._ids_with_path(conn, old_path)
+            conn.execute(f"UPDATE downloads SET {assignments} WHERE path = ?",
+                         (new_path, *fields.values(), old_path))
+        self._notify(EVENT_UPDATED, [self.get(entry_id) for entry_id in ids])
+        return len(ids)
+
+    def delete(self, entry_id):
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute("DELETE FROM downloads WHERE id = ?", (entry_id,))
+        if cursor.rowcount > 0:
+            self._notify(EVENT_REMOVED, [entry_id])
+        return cursor.rowcount > 0
+
+    def delete_by_path(self, path):
+        """Remove every entry of a file, returns the number of removed entries."""
+        conn = self._connection()
+        with conn:
+            ids = self._ids_with_path(conn, path)
+            conn.execute("DELETE FROM downloads WHERE path = ?", (path,))
+        self._notify(EVENT_REMOVED, ids)
+        return len(ids)
+
+    @staticmethod
+    def _ids_with_path(conn, path):
+        return [row[0] for row in conn.execute("SELECT id FROM downloads WHERE path = ?", (path,))]
+
+    def get(self, entry_id):
+        row = self._connection().execute("SELECT * FROM downloads WHERE id = ?", (entry_id,)).fetchone()
+        return self._to_entry(row) if row else None
+
+    def find_by_url(self, url):
+        rows = self._connection().execute("SELECT * FROM downloads WHERE url = ? ORDER BY id", (url,))
+        return [self._to_entry(row) for row in rows]
+
+    def find_by_normalized_url(self, url):
+        """Entries whose URL normalizes to the same as `url` (see app.url_utils)."""
+        normalized = normalize_url(url)
+        if not normalized:
+            return []
+        rows = self._connection().execute(
+            "SELECT * FROM downloads WHERE normalized_url = ? ORDER BY id", (normalized,))
+        return [self._to_entry(row) for row in rows]
+
+    def find_by_path(self, path):
+        rows = self._connection().execute("SELECT * FROM downloads WHERE path = ? ORDER BY id", (path,))
+        return [self._to_entry(row) for row in rows]
+
+    def find_by_video_id(self, video_id, extractor=None):
+        if extractor is None:
+            rows = self._connection().execute(
+                "SELECT * FROM downloads WHERE video_id = ? ORDER BY id", (video_id,))
+        else:
+            rows = self._connection().execute(
+                "SELECT * FROM downloads WHERE extractor = ? AND video_id = ? ORDER BY id", (extractor, video_id))
+        return [self._to_entry(row) for row in rows]
+
+    def all(self):
+        """Every entry, oldest first."""
+        rows = self._connection().execute("SELECT * FROM downloads ORDER BY id")
+        return [self._to_entry(row) for row in rows]
+
+    def file_index(self):
+        """(id, path, file_size, file_state) of every entry with a path, without decoding whole entries."""
+        rows = self._connection().execute(
+            "SELECT id, path, file_size, file_state FROM downloads WHERE path IS NOT NULL AND path != ''")
+        return [tuple(row) for row in rows]
+
+    def unprobed_files(self):
+        """(id, path) of the entries whose file has never been probed for media metadata."""
+        rows = self._connection().execute(
+            "SELECT id, path FROM downloads WHERE probe_key IS NULL AND path IS NOT NULL AND path != ''")
+        return [tuple(row) for row in rows]
+
+    def search(self, query, ids=None):
+        """Ids of the entries matching a search box query (see app.history_search), optionally among `ids`."""
+        if isinstance(query, str):
+            query = parse_search_query(query)
+        conditions = []
+        params = []
+        if ids is not None:
+            ids = list(ids)
+            if not ids:
+                return []
+            conditions.append(f"id IN ({', '.join('?' for _ in ids)})")
+            params.extend(ids)
+        expression = query.fts_expression()
+        if expression and self.fts_enabled:
+            conditions.append("id IN (SELECT rowid FROM downloads_fts WHERE downloads_fts MATCH ?)")
+            params.append(expression)
+        elif expression:
+            for column, word in query.terms:
+                columns = [column] if column else list(FTS_COLUMNS)
+                conditions.append('(' + ' OR '.join(f"{c} LIKE ?" for c in columns) + ')')
+                params.extend(f"%{word}%" for _ in columns)
+        for column, operator, value in query.filters:
+            conditions.append(f"{column} {operator} ?")
+            params.append(value)
+        sql = "SELECT id FROM downloads"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        try:
+            return [row[0] for row in self._connection().execute(sql, params)]
+        except sqlite3.OperationalError as e:
+            # An incomplete query (e.g. a lone quote while typing) matches nothing
+            logging.debug(f"History search failed for {expression!r}: {e}")
+            return []
+
+    def count(self):
+        return self._connection().execute("SELECT COUNT(*) FROM downloads").fetchone()[0]
+
+    def get_meta(self, key, default=None):
+        row = self._connection().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        conn = self._connection()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def migrate_from_json(self, json_path):
+        """Import the old downloads.json history once. The JSON file itself is left untouched."""
+        if self.get_meta('json_migrated') or not os.path.exists(json_path):
+            return 0
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+            entries = [entry for entry in entries if isinstance(entry, dict)]
+            conn = self._connection()
+            with conn:
+                # Import and the migration marker commit together, so a crash can't import twice
+                conn.executemany(INSERT_SQL, [self._to_row(entry) for entry in entries])
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('json_migrated', ?)", (json_path,))
+            logging.info(f"Migrated {len(entries)} history entries from {json_path}")
+            return len(entries)
+        except Exception as e:
+            logging.error(f"Error migrating download history from {json_path}: {e}")
+            return 0
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_history_store():
+    """Return the process-wide download history store."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = HistoryStore()
+        return _store
@@ -0,0 +1,119 @@
+"""
+Download job journal - an append-only JSON lines log of download state
+transitions, replayed at startup to resume downloads that were cut short by
+a crash or restart.
+"""
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+
+JOURNAL_PATH = os.path.join('data', 'download_journal.jsonl')
+
+# Events written to the journal
+EVENT_QUEUED = 'queued'
+EVENT_STARTED = 'started'
+EVENT_PART_FILE = 'part_file'
+EVENT_ENTRY_DONE = 'entry_done'
+EVENT_FINISHED = 'finished'
+EVENT_FAILED = 'failed'
+EVENT_CANCELLED = 'cancelled'
+
+TERMINAL_EVENTS = (EVENT_FINISHED, EVENT_FAILED, EVENT_CANCELLED)
+
+
+class DownloadJobJournal:
+    """Durable record of download jobs; every state change is one appended JSON line."""
+
+    def __init__(self, path=JOURNAL_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def new_job(self, url, output_folder):
+        """Record a newly queued job and return its journal id."""
+        journal_id = uuid.uuid4().hex
+        self.record(journal_id, EVENT_QUEUED, url=url, output_folder=output_folder)
+        return journal_id
+
+    def record(self, journal_id, event, **fields):
+        """Append one event for a job and flush it to disk."""
+        if not journal_id:
+            return
+        line = json.dumps(dict(fields, id=journal_id, event=event, time=time.time()), ensure_ascii=False)
+        with self._lock:
+            try:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(line + '\n')
+                    f.flush()
+                    os.fsync(f.fileno())
+            except Exception as e:
+                logging.error(f"Error writing download journal: {e}")
+
+    def replay(self):
+        """Fold the journal into one state dict per job, in the order the jobs were queued."""
+        jobs = {}
+        if not os.path.exists(self.path):
+            return jobs
+        with self._lock:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A crash can leave a truncated last line, skip it
+                        continue
+                    self._apply(jobs, entry)
+        return jobs
+
+    @staticmethod
+    def _apply(jobs, entry):
+        event = entry.get('event')
+        job = jobs.get(entry.get('id'))
+        if event == EVENT_QUEUED:
+            jobs[entry['id']] = {
+                'id': entry['id'],
+                'url': entry.get('url'),
+                'output_folder': entry.get('output_folder'),
+                'state': EVENT_QUEUED,
+                'done_entries': [],
+                'part_files': [],
+            }
+        elif job is None:
+            return
+        elif event == EVENT_PART_FILE:
+            if entry.get('filename') not in job['part_files']:
+                job['part_files'].append(entry.get('filename'))
+        elif event == EVENT_ENTRY_DONE:
+            if entry.get('playlist_index') is not None:
+                job['done_entries'].append(entry['playlist_index'])
+        else:
+            job['state'] = event
+
+    def unfinished_jobs(self):
+        """Jobs that were queued or running when the journal was last written."""
+        return [job for job in self.replay().values() if job['state'] not in TERMINAL_EVENTS]
+
+    def compact(self):
+        """Rewrite the journal keeping only the events of unfinished jobs."""
+        unfinished = {job['id'] for job in self.unfinished_jobs()}
+        if not os.path.exists(self.path):
+            return
+        with self._lock:
+            kept = []
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if entry.get('id') in unfinished:
+                        kept.append(line if line.endswith('\n') else line + '\n')
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.writelines(kept)
+            os.replace(tmp_path, self.path)
@@ -14,6 +14,7 @@ from app.editor import EditorTab
 from app.batch_downloader import BatchDownloader
 from app.about_tab import AboutTab
 from app.clipboard_monitor import ClipboardMonitor
+from app.duplicate_check import DuplicateChecker
 from app.themes import themes
 from app.my_playlists_tab import MyPlaylistsTab
 from app.license_dialog import show_license_dialog
@@ -36,7 +37,7 @@ class YTDLPApp(QMainWindow):
         self.history_tab = self.download_manager.history_tab  # Downloads history tab
         self.download_later_tab = self.download_manager.download_later_tab  # Download Later tab
         self.uploads_tab = self.download_manager.uploads_tab  # Uploads tab
-        self.batch_downloader_tab = BatchDownloader(self.settings_tab)  # Batch Downloader tab
+        self.batch_downloader_tab = BatchDownloader(self.settings_tab, scheduler=self.download_manager.scheduler)  # Batch Downloader tab
         self.editor_tab = EditorTab()  # Editor tab
         self.playlists_tab = MyPlaylistsTab() #  My Playlists tab
         self.pro_features_tab = ProFeaturesTab()  # Pro Features tab
@@ -194,12 +195,17 @@ class YTDLPApp(QMainWindow):
 
     def get_active_download_count(self):
         """Returns the number of active downloads."""
-        return len(self.download_manager.download_queue)
+        return self.download_manager.get_active_download_count()
 
     def handle_new_clipboard_url(self, url):
         """Handle new URL found in the clipboard."""
-        # Show a message box to ask the user
-        reply = QMessageBox.question(self, 'Download Video?', f'Do you want to download this video?\n{url}', QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel)
+        # Show a message box to ask the user, mentioning an earlier download of the same video
+        question = f'Do you want to download this video?\n{url}'
+        existing = DuplicateChecker().find(url=url)
+        if existing is not None:
+            question += (f"\n\nIt was already downloaded on {existing.get('download_date', 'an earlier date')}:"
+                         f"\n{existing['path']}")
+        reply = QMessageBox.question(self, 'Download Video?', question, QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel)
         if reply == QMessageBox.Yes:
             # Add a new download tab with the URL
             self.download_manager.add_new_download_tab_with_url(url)
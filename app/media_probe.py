@@ -0,0 +1,212 @@
+"""
+Media probe service - reads duration, codecs, resolution and bitrate of
+downloaded files with ffprobe, running at most MAX_PROCESSES probes at a
+time, and caches the results in the download history. The cache is keyed by the file's path, mtime and size, so a file
+is only probed again after it changed.
+"""
+import os
+import json
+import shutil
+import logging
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from app.history_store import get_history_store, EVENT_INSERTED, EVENT_RESET
+
+MAX_PROCESSES = 2
+PROBE_TIMEOUT = 30  # seconds per ffprobe run
+SWEEP_CHUNK = 64  # Existing files probed (and written to the history) per batch
+
+# History fields filled in from a probe; sizes are left to the download and the reconciliation scanner
+PROBE_FIELDS = ('duration', 'width', 'height', 'video_codec', 'audio_codec', 'bitrate')
+
+
+def probe_key(path):
+    """Cache key of a file's current contents; raises OSError if it is gone."""
+    stat = os.stat(path)
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def _number(value, cast):
+    try:
+        return cast(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_ffprobe(output):
+    """History fields from ffprobe's JSON output (-show_format -show_streams)."""
+    data = json.loads(output)
+    media_format = data.get('format') or {}
+    streams = data.get('streams') or []
+    # Cover art is reported as a video stream; skip it
+    video = next((stream for stream in streams if stream.get('codec_type') == 'video'
+                  and not (stream.get('disposition') or {}).get('attached_pic')), None) or {}
+    audio = next((stream for stream in streams if stream.get('codec_type') == 'audio'), None) or {}
+    return {
+        'duration': _number(media_format.get('duration'), float) or _number(video.get('duration'), float),
+        'width': _number(video.get('width'), int),
+        'height': _number(video.get('height'), int),
+        'video_codec': video.get('codec_name'),
+        'audio_codec': audio.get('codec_name'),
+        'bitrate': _number(media_format.get('bit_rate'), int),
+    }
+
+
+class MediaProbe:
+    """
+    Probes new history entries as they are added, and existing ones in
+    background batches with probe_unprobed(). metadata() answers from the
+    history when the cached probe still matches the file; cached_metadata()
+    does the same without ever waiting for ffprobe, for the GUI thread.
+    """
+
+    def __init__(self, store=None, max_processes=MAX_PROCESSES, timeout=PROBE_TIMEOUT):
+        self.store = store or get_history_store()
+        self.timeout = timeout
+        self.available = shutil.which('ffprobe') is not None
+        self.executor = ThreadPoolExecutor(max_workers=max_processes, thread_name_prefix='probe')
+        self._pending = set()  # entry ids queued or being probed
+        self._sweeping = False
+        self._lock = threading.Lock()
+        if not self.available:
+            logging.info("ffprobe not found, media metadata is limited to file sizes")
+        self.store.subscribe(self._on_history_changed)
+
+    def probe_file(self, path):
+        """Fields to store for a file, with its probe_key; None if the file is gone."""
+        try:
+            key = probe_key(path)
+        except OSError:
+            return None
+        if not self.available:
+            # probe_key stays unset so ffprobe runs once installed
+            return {}
+        fields = {}
+        try:
+            result = subprocess.run(
+                ['ffprobe', '-v', 'error', '-print_format', 'json', '-show_format', '-show_streams', path],
+                capture_output=True, text=True, encoding='utf-8', errors='replace', timeout=self.timeout,
+                creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0),  # No console window on Windows
+            )
+            if result.returncode == 0:
+                fields.update({field: value for field, value in parse_ffprobe(result.stdout).items()
+                               if value is not None})
+            else:
+                logging.info(f"ffprobe could not read {path}: {result.stderr.strip()}")
+        except (subprocess.TimeoutExpired, OSError, ValueError) as e:
+            logging.error(f"Error probing {path}: {e}")
+        # Stored even when ffprobe failed, so an unreadable file isn't probed again until it changes
+        fields['probe_key'] = key
+        return fields
+
+    def probe(self, entry_id, path):
+        """Probe one history entry's file in the background."""
+        with self._lock:
+            if entry_id in self._pending:
+                return
+            self._pending.add(entry_id)
+        self.executor.submit(self._probe_entry, entry_id, path)
+
+    def _probe_entry(self, entry_id, path):
+        try:
+            fields = self.probe_file(path)
+            if fields:
+                self.store.update(entry_id, **fields)
+        except Exception as e:
+            logging.error(f"Error saving media metadata for {path}: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(entry_id)
+
+    def probe_unprobed(self):
+        """Probe every history entry that has never been probed, in the background."""
+        if not self.available:
+            return
+        with self._lock:
+            if self._sweeping:
+                return
+            self._sweeping = True
+        threading.Thread(target=self._sweep, name='probe-sweep', daemon=True).start()
+
+    def _sweep(self):
+        try:
+            candidates = [(entry_id, path) for entry_id, path in self.store.unprobed_files()
+                          if entry_id not in self._pending]
+            for start in range(0, len(candidates), SWEEP_CHUNK):
+                chunk = candidates[start:start + SWEEP_CHUNK]
+                # The pool bounds the ffprobe processes; each chunk is written in one transaction
+                results = self.executor.map(self.probe_file, [path for _, path in chunk])
+                changes = [(entry_id, fields) for (entry_id, _), fields in zip(chunk, results) if fields]
+                if changes:
+                    self.store.update_many(changes)
+        except Exception as e:
+            logging.error(f"Error probing existing downloads: {e}")
+        finally:
+            with self._lock:
+                self._sweeping = False
+
+    def metadata(self, path, entry=None):
+        """
+        Probed fields for a file: from its history entry (looked up by path if
+        not given) while the file is unchanged, otherwise probed now and saved.
+        Returns {} if the file is gone.
+        """
+        try:
+            key = probe_key(path)
+        except OSError:
+            return {}
+        if entry is None:
+            entries = self.store.find_by_path(path)
+            entry = entries[0] if entries else None
+        if entry is not None and entry.get('probe_key') == key:
+            return {field: entry.get(field) for field in PROBE_FIELDS}
+        fields = self.probe_file(path) or {}
+        if entry is not None and fields:
+            try:
+                self.store.update(entry['id'], **fields)
+            except Exception as e:
+                logging.error(f"Error saving media metadata for {path}: {e}")
+        return fields
+
+    def cached_metadata(self, entry):
+        """
+        Probed fields of a history entry while its file is unchanged. Otherwise
+        the file is probed in the background, the entry is updated when the
+        result arrives, and None is returned.
+        """
+        path = entry.get('path')
+        try:
+            key = probe_key(path)
+        except (OSError, TypeError):
+            return None
+        if entry.get('probe_key') == key:
+            return {field: entry.get(field) for field in PROBE_FIELDS}
+        if self.available and entry.get('id') is not None:
+            self.probe(entry['id'], path)
+        return None
+
+    def duration(self, path, entry=None):
+        """Duration in seconds, or None if it can't be determined."""
+        return self.metadata(path, entry).get('duration')
+
+    def _on_history_changed(self, event, payload):
+        if event == EVENT_INSERTED:
+            for entry in payload:
+                if entry.get('path') and entry.get('probe_key') is None:
+                    self.probe(entry['id'], entry['path'])
+        elif event == EVENT_RESET:
+            self.probe_unprobed()
+
+
+_probe = None
+_probe_lock = threading.Lock()
+
+
+def get_media_probe():
+    """Return the process-wide media probe service."""
+    global _probe
+    with _probe_lock:
+        if _probe is None:
+            _probe = MediaProbe()
+        return _probe
@@ -1,3 +1,6 @@
+from app.extraction_cache import extract_info_cached, get_extraction_cache, cache_variant
+from app.bandwidth_governor import get_bandwidth_governor
+
 class PlaylistLoader(QWidget):
     def __init__(self):
         super().__init__()
@@ -47,7 +50,7 @@ class PlaylistLoader(QWidget):
             }
 
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                self.playlist_data = ydl.extract_info(playlist_url, download=False)
+                self.playlist_data = extract_info_cached(ydl, playlist_url, variant=cache_variant(flat=True))
 
             if 'entries' in self.playlist_data:
                 self.display_playlist_videos()
@@ -96,21 +99,41 @@ class PlaylistLoader(QWidget):
         progress_dialog.setLayout(progress_layout)
         progress_dialog.show()
 
+        governor = get_bandwidth_governor()
+        governor_key = f"playlist:{id(self)}"
+        accounted = {}
+
+        def throttle(d):
+            # Keep the playlist download within its share of the bandwidth limit
+            if d['status'] == 'downloading':
+                downloaded = d.get('downloaded_bytes') or 0
+                governor.throttle(governor_key, downloaded - accounted.get(d.get('filename'), 0))
+                accounted[d.get('filename')] = downloaded
+
         ydl_opts = {
             'format': 'best',
             'quiet': True,
-            'progress_hooks': [lambda d: self.update_progress(d, progress_bar)]
+            'progress_hooks': [lambda d: self.update_progress(d, progress_bar), throttle]
         }
 
+        governor.register(governor_key)
+        video = None
         try:
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
                 for video in selected_videos:
-                    ydl.download([video['url']])
+                    # The flat preview entries carry no formats, so each video is extracted here; a video
+                    # resolved by an earlier download of the same selection comes from the cache
+                    info = extract_info_cached(ydl, video['url'], variant=cache_variant('best'))
+                    ydl.process_ie_result(info, download=True)
 
             QMessageBox.information(self, "Download Complete", "Selected videos have been downloaded.")
         except Exception as e:
+            if video is not None:
+                # Cached media URLs may have expired, make a retry extract again
+                get_extraction_cache().invalidate(video['url'], cache_variant('best'))
             QMessageBox.critical(self, "Download Error", f"Failed to download videos: {str(e)}")
         finally:
+            governor.unregister(governor_key)
             progress_dialog.close()
 
     def update_progress(self, data, progress_bar):
@@ -0,0 +1,69 @@
+"""
+Progress bus - download threads write their latest progress into a shared
+table without blocking, and the GUI receives one coalesced snapshot of all
+changed jobs at a fixed rate instead of a Qt signal per yt-dlp callback.
+"""
+import threading
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+DEFAULT_INTERVAL_MS = 125  # 8 snapshots per second
+
+
+class ProgressBus(QObject):
+    """Collects per-job progress state and publishes changed jobs on a timer."""
+
+    snapshot_ready = pyqtSignal(dict)  # job_key -> progress dict
+
+    def __init__(self, interval_ms=DEFAULT_INTERVAL_MS, parent=None):
+        super().__init__(parent)
+        self._states = {}
+        self._dirty = set()
+        self._removed = set()  # finished jobs dropped after their last state is published
+        self._lock = threading.Lock()
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.publish)
+        self.timer.start(interval_ms)
+
+    def update(self, job_key, **fields):
+        """Merge new progress fields for a job; cheap and safe to call from any thread."""
+        with self._lock:
+            self._states.setdefault(job_key, {}).update(fields)
+            self._dirty.add(job_key)
+            self._removed.discard(job_key)
+
+    def get(self, job_key):
+        """Return a copy of the latest state of a job, or None."""
+        with self._lock:
+            state = self._states.get(job_key)
+            return dict(state) if state is not None else None
+
+    def remove(self, job_key):
+        """Forget a finished job once its final state (e.g. 100%) has gone out with the next snapshot."""
+        with self._lock:
+            if job_key in self._states:
+                self._removed.add(job_key)
+
+    def publish(self):
+        """Emit one snapshot with every job that changed since the last tick."""
+        with self._lock:
+            snapshot = {job_key: dict(self._states[job_key]) for job_key in self._dirty if job_key in self._states}
+            self._dirty.clear()
+            for job_key in self._removed:
+                self._states.pop(job_key, None)
+            self._removed.clear()
+        if snapshot:
+            self.snapshot_ready.emit(snapshot)
+
+
+_bus = None
+
+
+def get_progress_bus():
+    """
+    Return the application-wide progress bus. It is created on first use; the
+    first call must come from the GUI thread so its timer lives there.
+    """
+    global _bus
+    if _bus is None:
+        _bus = ProgressBus()
+    return _bus
@@ -0,0 +1,232 @@
+"""
+Segmented downloader - fetches a direct (progressive) media URL over several
+HTTP Range connections in parallel, writing into a preallocated file.
+
+Progress of every segment is kept in a small JSON sidecar next to the .part
+file, so an interrupted download continues each segment where it stopped.
+"""
+import os
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+DEFAULT_CONNECTIONS = 4
+DEFAULT_SEGMENT_SIZE = 8 * 1024 * 1024  # 8 MB
+MIN_SEGMENTED_SIZE = 16 * 1024 * 1024  # Smaller files are not worth splitting
+CHUNK_SIZE = 256 * 1024
+
+
+class SegmentedDownloadError(Exception):
+    """Raised when the server doesn't support ranges or a segment keeps failing."""
+
+
+class SegmentedDownloader:
+    """
+    Download `url` to `filename` using `connections` parallel Range requests.
+
+    progress_callback receives yt-dlp style progress dicts ({'status',
+    'downloaded_bytes', 'total_bytes', 'speed', 'eta', 'filename'}) so the
+    existing progress hooks can be reused unchanged. throttle, if given, is
+    called with the size of every received chunk and may sleep to limit the rate.
+    """
+
+    def __init__(self, url, filename, headers=None, connections=DEFAULT_CONNECTIONS,
+                 segment_size=DEFAULT_SEGMENT_SIZE, progress_callback=None, throttle=None, retries=3, timeout=30):
+        self.url = url
+        self.filename = filename
+        self.part_filename = filename + '.part'
+        self.state_filename = filename + '.segments.json'
+        self.headers = dict(headers or {})
+        self.connections = max(1, connections)
+        self.segment_size = max(CHUNK_SIZE, segment_size)
+        self.progress_callback = progress_callback
+        self.throttle = throttle
+        self.retries = retries
+        self.timeout = timeout
+        self.total_bytes = None
+        self.running = True
+        self._segments = []  # [{'start', 'end', 'done'}], end is inclusive
+        self._lock = threading.Lock()
+        self._session = requests.Session()
+        self._session.headers.update(self.headers)
+        self._start_time = None
+        self._resumed_bytes = 0
+        self._last_report = 0
+        self._report_lock = threading.Lock()  # segment threads report in turn
+
+    @staticmethod
+    def probe(url, headers=None, timeout=15):
+        """Return the content length if the server supports byte ranges, else None."""
+        try:
+            response = requests.get(url, headers=dict(headers or {}, Range='bytes=0-0'),
+                                    stream=True, timeout=timeout)
+            response.close()
+            if response.status_code != 206:
+                return None
+            content_range = response.headers.get('Content-Range', '')
+            total = content_range.rsplit('/', 1)[-1]
+            return int(total) if total.isdigit() else None
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logging.debug(f"Range probe failed for {url}: {e}")
+            return None
+
+    def download(self):
+        """Run the download; returns the final filename."""
+        self.total_bytes = self.probe(self.url, self.headers)
+        if not self.total_bytes:
+            raise SegmentedDownloadError("Server does not support HTTP range requests")
+
+        self._load_or_create_segments()
+        self._preallocate()
+        self._start_time = time.time()
+        self._resumed_bytes = self.downloaded_bytes()
+
+        pending = [segment for segment in self._segments if not self._segment_complete(segment)]
+        with ThreadPoolExecutor(max_workers=self.connections) as executor:
+            futures = [executor.submit(self._download_segment, segment) for segment in pending]
+            errors = []
+            for future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    errors.append(e)
+                    self.running = False
+        self._save_state()
+
+        if errors:
+            raise SegmentedDownloadError(f"Segmented download failed: {errors[0]}")
+        if not self.running:
+            raise SegmentedDownloadError("Segmented download was stopped")
+
+        os.replace(self.part_filename, self.filename)
+        try:
+            os.remove(self.state_filename)
+        except OSError:
+            pass
+        self._report('finished')
+        return self.filename
+
+    def stop(self):
+        """Stop all segments after their current chunk; the download can be resumed later."""
+        self.running = False
+
+    def downloaded_bytes(self):
+        with self._lock:
+            return sum(segment['done'] for segment in self._segments)
+
+    def _load_or_create_segments(self):
+        """Reuse the segment table of an interrupted download of the same size, else split anew."""
+        if os.path.exists(self.state_filename) and os.path.exists(self.part_filename):
+            try:
+                with open(self.state_filename, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+                if state.get('url') == self.url and state.get('total_bytes') == self.total_bytes:
+                    self._segments = state['segments']
+                    return
+            except Exception as e:
+                logging.error(f"Ignoring unreadable segment state {self.state_filename}: {e}")
+        self._segments = [
+            {'start': start, 'end': min(start + self.segment_size, self.total_bytes) - 1, 'done': 0}
+            for start in range(0, self.total_bytes, self.segment_size)
+        ]
+
+    def _preallocate(self):
+        """Create the .part file at its final size so segments can be written in place."""
+        directory = os.path.dirname(self.part_filename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        mode = 'r+b' if os.path.exists(self.part_filename) else 'wb'
+        with open(self.part_filename, mode) as f:
+            f.truncate(self.total_bytes)
+
+    def _save_state(self):
+        with self._lock:
+            state = {'url': self.url, 'total_bytes': self.total_bytes, 'segments': self._segments}
+            tmp_path = self.state_filename + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.state_filename)
+
+    @staticmethod
+    def _segment_complete(segment):
+        return segment['start'] + segment['done'] > segment['end']
+
+    def _download_segment(self, segment):
+        attempt = 0
+        while self.running and not self._segment_complete(segment):
+            offset = segment['start'] + segment['done']
+            received = segment['done']
+            try:
+                response = self._session.get(
+                    self.url, headers={'Range': f"bytes={offset}-{segment['end']}"},
+                    stream=True, timeout=self.timeout,
+                )
+                if response.status_code != 206:
+                    raise SegmentedDownloadError(f"Unexpected HTTP status {response.status_code} for range request")
+                with open(self.part_filename, 'r+b') as f:
+                    f.seek(offset)
+                    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                        if not self.running:
+                            break
+                        if not chunk:
+                            continue
+                        remaining = segment['end'] + 1 - (segment['start'] + segment['done'])
+                        chunk = chunk[:remaining]
+                        f.write(chunk)
+                        # Saved state must only count bytes that left this thread's buffer
+                        f.flush()
+                        with self._lock:
+                            segment['done'] += len(chunk)
+                        if self.throttle:
+                            self.throttle(len(chunk))
+                        self._report('downloading')
+                        if self._segment_complete(segment):
+                            break
+                response.close()
+                if self.running and not self._segment_complete(segment):
+                    raise SegmentedDownloadError("Connection closed before the end of the segment")
+            except (requests.exceptions.RequestException, SegmentedDownloadError) as e:
+                # Only attempts that made no progress count towards the retry limit
+                attempt = 1 if segment['done'] > received else attempt + 1
+                if attempt > self.retries:
+                    raise
+                logging.warning(f"Segment {segment['start']}-{segment['end']} failed ({e}), retrying")
+                time.sleep(min(2 ** attempt, 10))
+
+    def _report(self, status):
+        """Send a progress dict to the callback, rate limited while downloading. Called from every segment thread."""
+        if status != 'downloading':
+            self._report_lock.acquire()
+        elif not self._report_lock.acquire(blocking=False):
+            return  # Another segment is reporting right now
+        try:
+            now = time.time()
+            if status == 'downloading':
+                if now - self._last_report < 0.25:
+                    return
+                # Persist segment progress along with the UI update
+                self._save_state()
+            self._last_report = now
+            if self.progress_callback:
+                self._send_progress(status, now)
+        finally:
+            self._report_lock.release()
+
+    def _send_progress(self, status, now):
+        downloaded = self.downloaded_bytes()
+        elapsed = max(now - self._start_time, 0.001)
+        speed = (downloaded - self._resumed_bytes) / elapsed
+        eta = int((self.total_bytes - downloaded) / speed) if speed > 0 else None
+        self.progress_callback({
+            'status': status,
+            'filename': self.filename if status == 'finished' else self.part_filename,
+            'downloaded_bytes': downloaded,
+            'total_bytes': self.total_bytes,
+            'speed': speed,
+            'eta': eta,
+            '_percent_str': f"{downloaded / self.total_bytes * 100:.1f}%",
+        })
@@ -1,10 +1,14 @@
-import json
 import os
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QTabWidget, QLabel, QComboBox, QPushButton, QMessageBox,
-    QLineEdit, QHBoxLayout, QCheckBox, QFormLayout, QSlider, QFileDialog, QGroupBox
+    QLineEdit, QHBoxLayout, QCheckBox, QFormLayout, QSlider, QFileDialog, QGroupBox,
+    QSpinBox
 )
 from PyQt5.QtCore import Qt
+from app.extraction_cache import get_extraction_cache
+from app.bandwidth_governor import get_bandwidth_governor, parse_schedule
+from app.history_store import get_history_store
+from app.duplicate_check import POLICY_LABELS
 
 class SettingsTab(QWidget):
     def __init__(self):
@@ -130,6 +134,72 @@ class SettingsTab(QWidget):
         self.download_thumbnails_checkbox.setChecked(True)
         layout.addRow(self.download_thumbnails_checkbox)
 
+        # What to do with videos that are already in the download history
+        self.duplicate_policy_combo = QComboBox()
+        for policy, label in POLICY_LABELS:
+            self.duplicate_policy_combo.addItem(label, policy)
+        layout.addRow(QLabel("If Already Downloaded:"), self.duplicate_policy_combo)
+
+        # Concurrency limits used by the download scheduler
+        self.max_concurrent_spin = QSpinBox()
+        self.max_concurrent_spin.setRange(1, 32)
+        self.max_concurrent_spin.setValue(3)
+        layout.addRow(QLabel("Max Concurrent Downloads:"), self.max_concurrent_spin)
+
+        self.max_per_host_spin = QSpinBox()
+        self.max_per_host_spin.setRange(1, 16)
+        self.max_per_host_spin.setValue(2)
+        layout.addRow(QLabel("Max Downloads Per Site:"), self.max_per_host_spin)
+
+        # Download engine for direct media files and connections per download
+        self.download_engine_combo = QComboBox()
+        self.download_engine_combo.addItems(["yt-dlp (native)", "Segmented (multi-connection)"])
+        layout.addRow(QLabel("Download Engine:"), self.download_engine_combo)
+
+        self.connections_spin = QSpinBox()
+        self.connections_spin.setRange(1, 16)
+        self.connections_spin.setValue(4)
+        layout.addRow(QLabel("Connections Per Download:"), self.connections_spin)
+
+        self.segment_size_spin = QSpinBox()
+        self.segment_size_spin.setRange(1, 64)
+        self.segment_size_spin.setValue(8)
+        self.segment_size_spin.setSuffix(" MB")
+        layout.addRow(QLabel("Segment Size:"), self.segment_size_spin)
+
+        # Global bandwidth limit shared by all downloads and torrents
+        self.bandwidth_limit_spin = QSpinBox()
+        self.bandwidth_limit_spin.setRange(0, 10000000)
+        self.bandwidth_limit_spin.setSuffix(" KB/s")
+        self.bandwidth_limit_spin.setSpecialValueText("Unlimited")
+        self.bandwidth_limit_spin.valueChanged.connect(
+            lambda value: get_bandwidth_governor().set_total_limit(value * 1024))
+        layout.addRow(QLabel("Bandwidth Limit:"), self.bandwidth_limit_spin)
+
+        self.upload_limit_spin = QSpinBox()
+        self.upload_limit_spin.setRange(0, 10000000)
+        self.upload_limit_spin.setSuffix(" KB/s")
+        self.upload_limit_spin.setSpecialValueText("Unlimited")
+        self.upload_limit_spin.valueChanged.connect(
+            lambda value: get_bandwidth_governor().set_upload_limit(value * 1024))
+        layout.addRow(QLabel("Torrent Upload Limit:"), self.upload_limit_spin)
+
+        self.bandwidth_schedule_input = QLineEdit()
+        self.bandwidth_schedule_input.setPlaceholderText("e.g. 01:00-07:00=100, 09:00-17:00=20")
+        self.bandwidth_schedule_input.editingFinished.connect(self.update_bandwidth_schedule)
+        layout.addRow(QLabel("Bandwidth Schedule (% of limit):"), self.bandwidth_schedule_input)
+
+        # Extraction cache: reuse yt-dlp metadata for recently resolved URLs
+        self.extraction_cache_checkbox = QCheckBox("Cache Extracted Video Metadata")
+        self.extraction_cache_checkbox.setChecked(get_extraction_cache().enabled)
+        self.extraction_cache_checkbox.stateChanged.connect(self.update_extraction_cache_state)
+        clear_cache_button = QPushButton("Clear Metadata Cache")
+        clear_cache_button.clicked.connect(lambda: get_extraction_cache().clear())
+        cache_layout = QHBoxLayout()
+        cache_layout.addWidget(self.extraction_cache_checkbox)
+        cache_layout.addWidget(clear_cache_button)
+        layout.addRow(cache_layout)
+
         self.download_settings_tab.setLayout(layout)
 
     def setup_proxy_settings(self):
@@ -182,18 +252,38 @@ class SettingsTab(QWidget):
         return self.playlist_checkbox.isChecked()
 
 
+    def get_duplicate_policy(self):
+        return self.duplicate_policy_combo.currentData()
+
+    def get_segmented_download_enabled(self):
+        return self.download_engine_combo.currentIndex() == 1
+
+    def get_download_connections(self):
+        return self.connections_spin.value()
+
+    def get_segment_size(self):
+        return self.segment_size_spin.value() * 1024 * 1024
+
+    def update_bandwidth_schedule(self):
+        try:
+            rules = parse_schedule(self.bandwidth_schedule_input.text())
+        except ValueError as e:
+            QMessageBox.warning(self, "Bandwidth Schedule", str(e))
+            return
+        get_bandwidth_governor().set_schedule(rules)
+
+    def update_extraction_cache_state(self, state):
+        get_extraction_cache().enabled = state == Qt.Checked
+
+    def get_max_concurrent_downloads(self):
+        return self.max_concurrent_spin.value()
+
+    def get_max_downloads_per_host(self):
+        return self.max_per_host_spin.value()
+
     def save_download_info(self, data):
-        downloads_path = os.path.join(os.getcwd(), 'data', 'downloads.json')
         try:
-            if os.path.exists(downloads_path):
-                with open(downloads_path, 'r') as file:
-                    existing_data = json.load(file)
-            else:
-                existing_data = []
-
-            existing_data.append(data)
-            with open(downloads_path, 'w') as file:
-                json.dump(existing_data, file, indent=4)
+            get_history_store().add(data)
         except Exception as e:
             print(f"Error saving download information: {e}")
 
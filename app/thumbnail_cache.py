@@ -0,0 +1,156 @@
+"""
+Thumbnail cache - downscaled variants of the thumbnails in data/thumbnails
+are generated once on disk, decoded off the GUI thread at their target size
+with QImageReader.setScaledSize, and kept in a bounded in-memory LRU so
+scrolling back over the grid paints from memory.
+"""
+import os
+import hashlib
+import logging
+from collections import OrderedDict
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, QSize, pyqtSignal
+from PyQt5.QtGui import QImage, QImageReader, QPixmap
+
+CACHE_DIR = os.path.join('data', 'thumbnails', 'cache')
+VARIANT_WIDTHS = (160, 320)  # Cells ask for the smallest variant at least as wide as they are
+MEMORY_BUDGET = 96 * 1024 * 1024  # Bytes of decoded pixmaps kept in memory
+JPEG_QUALITY = 85
+
+
+def variant_width(width):
+    """The variant used for a cell `width` pixels wide."""
+    for candidate in VARIANT_WIDTHS:
+        if width <= candidate:
+            return candidate
+    return VARIANT_WIDTHS[-1]
+
+
+def variant_path(cache_dir, source_key, width):
+    """On-disk name of a variant; changes whenever the source's mtime or size change."""
+    digest = hashlib.sha1('|'.join(str(part) for part in source_key).encode('utf-8')).hexdigest()[:20]
+    return os.path.join(cache_dir, f"{digest}_{width}.jpg")
+
+
+class _DecodeSignals(QObject):
+    decoded = pyqtSignal(str, int, object, QImage)  # path, variant width, source key, image
+
+
+class _DecodeTask(QRunnable):
+    """Load (or first create) one downscaled variant of a thumbnail."""
+
+    def __init__(self, path, width, cache_dir, signals):
+        super().__init__()
+        self.path = path
+        self.width = width
+        self.cache_dir = cache_dir
+        self.signals = signals
+
+    def run(self):
+        image = QImage()
+        source_key = None
+        try:
+            stat = os.stat(self.path)
+            source_key = (self.path, stat.st_mtime_ns, stat.st_size)
+            cached_path = variant_path(self.cache_dir, source_key, self.width)
+            if os.path.exists(cached_path):
+                image = QImageReader(cached_path).read()
+            if image.isNull():
+                image = self._decode_scaled()
+                if not image.isNull():
+                    os.makedirs(self.cache_dir, exist_ok=True)
+                    image.save(cached_path, 'JPG', JPEG_QUALITY)
+        except OSError:
+            pass  # Missing thumbnail, painted as "No Thumbnail"
+        except Exception as e:
+            logging.error(f"Error decoding thumbnail {self.path}: {e}")
+        self.signals.decoded.emit(self.path, self.width, source_key, image)
+
+    def _decode_scaled(self):
+        """Decode the source straight to the variant size; JPEGs are never decoded at full resolution."""
+        reader = QImageReader(self.path)
+        reader.setAutoTransform(True)
+        size = reader.size()
+        if size.isValid() and size.width() > self.width:
+            reader.setScaledSize(QSize(self.width, max(1, size.height() * self.width // size.width())))
+        return reader.read()
+
+
+class ThumbnailCache(QObject):
+    """
+    pixmap(path, width) returns a decoded thumbnail from memory, or None and
+    starts decoding it in the background; thumbnail_ready is emitted when it
+    arrives. Pixmaps are evicted least recently used first once MEMORY_BUDGET
+    is exceeded.
+    """
+
+    thumbnail_ready = pyqtSignal(str)
+
+    def __init__(self, cache_dir=CACHE_DIR, memory_budget=MEMORY_BUDGET, max_threads=2, parent=None):
+        super().__init__(parent)
+        self.cache_dir = cache_dir
+        self.memory_budget = memory_budget
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+        self._pixmaps = OrderedDict()  # (source key, variant width) -> QPixmap
+        self._memory = 0
+        self._source_keys = {}  # path -> (path, mtime, size), learned when a variant is decoded
+        self._missing = set()  # paths that could not be decoded
+        self._pending = set()  # (path, variant width)
+        self._signals = _DecodeSignals()
+        self._signals.decoded.connect(self._on_decoded)
+
+    def pixmap(self, path, width):
+        width = variant_width(width)
+        source_key = self._source_keys.get(path)
+        if source_key is not None:
+            pixmap = self._pixmaps.get((source_key, width))
+            if pixmap is not None:
+                self._pixmaps.move_to_end((source_key, width))
+                return pixmap
+        if path in self._missing:
+            return None
+        if (path, width) not in self._pending:
+            self._pending.add((path, width))
+            self.pool.start(_DecodeTask(path, width, self.cache_dir, self._signals))
+        return None
+
+    def is_missing(self, path):
+        return path in self._missing
+
+    def invalidate(self, path):
+        """Forget a thumbnail that changed on disk; it is decoded again on next use."""
+        source_key = self._source_keys.pop(path, None)
+        self._missing.discard(path)
+        for key in [key for key in self._pixmaps if key[0] == source_key]:
+            self._memory -= self._pixmap_bytes(self._pixmaps.pop(key))
+
+    def clear(self):
+        self._pixmaps.clear()
+        self._memory = 0
+        self._source_keys.clear()
+        self._missing.clear()
+
+    @staticmethod
+    def _pixmap_bytes(pixmap):
+        return pixmap.width() * pixmap.height() * max(1, pixmap.depth() // 8)
+
+    def _on_decoded(self, path, width, source_key, image):
+        self._pending.discard((path, width))
+        if image.isNull() or source_key is None:
+            self._missing.add(path)
+        else:
+            previous_key = self._source_keys.get(path)
+            if previous_key is not None and previous_key != source_key:
+                # The file changed on disk; drop the pixmaps of the old version
+                self.invalidate(path)
+            self._source_keys[path] = source_key
+            pixmap = QPixmap.fromImage(image)
+            old = self._pixmaps.pop((source_key, width), None)
+            if old is not None:
+                self._memory -= self._pixmap_bytes(old)
+            self._pixmaps[(source_key, width)] = pixmap
+            self._memory += self._pixmap_bytes(pixmap)
+            while self._memory > self.memory_budget and len(self._pixmaps) > 1:
+                _, evicted = self._pixmaps.popitem(last=False)
+                self._memory -= self._pixmap_bytes(evicted)
+        self.thumbnail_ready.emit(path)
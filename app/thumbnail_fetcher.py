@@ -0,0 +1,118 @@
+"""
+Thumbnail fetcher - downloads video thumbnails on a small background pool so
+the download thread (and yt-dlp's progress hook) never waits for an image CDN.
+"""
+import os
+import re
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+THUMBNAIL_DIR = os.path.join('data', 'thumbnails')
+MAX_WORKERS = 4
+TIMEOUT = (5, 15)  # (connect, read) seconds
+RETRIES = 3
+
+
+def thumbnail_key(info):
+    """Dedupe key for a video: extractor and video id, falling back to the title."""
+    video_id = info.get('id')
+    if video_id:
+        extractor = info.get('extractor_key') or info.get('extractor') or 'video'
+        key = f"{extractor}_{video_id}"
+    else:
+        key = info.get('title') or 'unknown'
+    return re.sub(r'[\\/*?:"<>|\s]', "_", key)
+
+
+class ThumbnailFetcher:
+    """
+    Bounded pool that fetches thumbnails through one pooled HTTP session.
+
+    fetch() returns immediately; on_done(thumbnail_path) is called from a pool
+    thread once the image is on disk. Requests for a video that is already
+    being fetched share the running download, and images already on disk are
+    not fetched again.
+    """
+
+    def __init__(self, thumbnail_dir=THUMBNAIL_DIR, max_workers=MAX_WORKERS, timeout=TIMEOUT, retries=RETRIES):
+        self.thumbnail_dir = thumbnail_dir
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='thumbnail')
+        self.session = requests.Session()
+        retry = Retry(total=retries, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=frozenset(['GET']))
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._pending = {}  # key -> list of callbacks waiting for that thumbnail
+        self._lock = threading.Lock()
+
+    def path_for(self, info):
+        return os.path.join(self.thumbnail_dir, f"{thumbnail_key(info)}.jpg")
+
+    def fetch(self, info, on_done=None):
+        """Queue the thumbnail of a yt-dlp info dict; returns False when there is none."""
+        url = info.get('thumbnail')
+        if not url:
+            return False
+        key = thumbnail_key(info)
+        path = self.path_for(info)
+        if os.path.exists(path):
+            if on_done:
+                on_done(path)
+            return True
+        with self._lock:
+            if key in self._pending:
+                if on_done:
+                    self._pending[key].append(on_done)
+                return True
+            self._pending[key] = [on_done] if on_done else []
+        self.executor.submit(self._download, key, url, path)
+        return True
+
+    def _download(self, key, url, path):
+        ok = False
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with self.session.get(url, stream=True, timeout=self.timeout) as response:
+                response.raise_for_status()
+                tmp_path = path + '.tmp'
+                with open(tmp_path, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=64 * 1024):
+                        f.write(chunk)
+            os.replace(tmp_path, path)
+            ok = True
+        except (requests.exceptions.RequestException, OSError) as e:
+            logging.error(f"Error downloading thumbnail: {e}")
+        finally:
+            with self._lock:
+                callbacks = self._pending.pop(key, [])
+        if not ok:
+            return
+        for callback in callbacks:
+            try:
+                callback(path)
+            except Exception as e:
+                logging.error(f"Error in thumbnail callback: {e}")
+
+    def shutdown(self, wait=False):
+        self.executor.shutdown(wait=wait)
+        self.session.close()
+
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+
+
+def get_thumbnail_fetcher():
+    """Return the process-wide thumbnail fetcher."""
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is None:
+            _fetcher = ThumbnailFetcher()
+        return _fetcher
@@ -0,0 +1,86 @@
+"""
+Torrent fast-resume store - libtorrent resume data, one file per info hash.
+A torrent that is added again starts from the pieces already verified and
+the peers it knew, instead of hash-checking everything on disk. The list
+of torrents in the session is kept next to it, so they can be added again
+when the application starts.
+"""
+import os
+import json
+import logging
+
+RESUME_FOLDER = os.path.join('data', 'torrents')
+RESUME_SUFFIX = '.fastresume'
+TORRENT_LIST_FILE = 'torrents.json'
+
+
+class ResumeStore:
+    """Reads and writes bencoded resume data under `folder`, keyed by hex info hash."""
+
+    def __init__(self, folder=RESUME_FOLDER):
+        self.folder = folder
+
+    def path(self, info_hash):
+        return os.path.join(self.folder, info_hash + RESUME_SUFFIX)
+
+    def load(self, info_hash):
+        """Resume data of a torrent, or None if none was saved."""
+        try:
+            with open(self.path(info_hash), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logging.error(f"Error reading resume data of torrent {info_hash}: {e}")
+            return None
+
+    def save(self, info_hash, data):
+        """Write resume data; the previous file stays intact if writing fails."""
+        path = self.path(info_hash)
+        temp_path = path + '.tmp'
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logging.error(f"Error saving resume data of torrent {info_hash}: {e}")
+
+    def delete(self, info_hash):
+        try:
+            os.remove(self.path(info_hash))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logging.error(f"Error deleting resume data of torrent {info_hash}: {e}")
+
+    def load_torrent_list(self):
+        """Torrents recorded with save_torrent_list(), [] if there are none."""
+        try:
+            with open(os.path.join(self.folder, TORRENT_LIST_FILE), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError) as e:
+            logging.error(f"Error reading the torrent list: {e}")
+            return []
+
+    def save_torrent_list(self, torrents):
+        """Record the torrents to add at the next start, [{'info_hash', 'source', 'save_path', 'options'}] in queue order."""
+        path = os.path.join(self.folder, TORRENT_LIST_FILE)
+        temp_path = path + '.tmp'
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(torrents, f, indent=2)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logging.error(f"Error saving the torrent list: {e}")
+
+    def info_hashes(self):
+        """Info hashes with saved resume data."""
+        try:
+            names = os.listdir(self.folder)
+        except OSError:
+            return []
+        return [name[:-len(RESUME_SUFFIX)] for name in names if name.endswith(RESUME_SUFFIX)]
@@ -0,0 +1,546 @@
+"""
+Torrent session manager - one long-lived libtorrent session per process. It
+owns the listen socket, the DHT and the session settings, and hosts any
+number of torrents keyed by their info hash. It has no GUI dependencies, so
+TorrentWorker, TorrentTab and headless callers all share the same session.
+
+A single thread drives everything from libtorrent alerts: it sleeps in
+wait_for_alert() until something happens, and asks for the status of all
+torrents that changed with one post_torrent_updates() call per second.
+Subscribers get metadata, completion and errors as soon as the alert arrives.
+
+Resume data is saved every few minutes, when a torrent finishes or is
+removed, and on shutdown, and is loaded when the same torrent is added again.
+restore() adds the torrents that were in the session when it last closed.
+
+Torrents are auto-managed: libtorrent's queue runs at most active_downloads
+downloads and active_seeds seeds (active_limit in total) in queue order, and
+the rest wait queued. Seeding stops once a torrent reaches its share ratio
+or seed time limit.
+"""
+import os
+import time
+import logging
+import threading
+from datetime import datetime
+import libtorrent as lt
+from app.bandwidth_governor import get_bandwidth_governor, JOB_TORRENT
+from app.torrent_resume import ResumeStore
+
+LISTEN_INTERFACES = '0.0.0.0:6881,[::]:6881'
+UPDATE_INTERVAL = 1.0  # seconds between batched status updates
+RESUME_INTERVAL = 300.0  # seconds between saves of changed resume data
+RESUME_SHUTDOWN_TIMEOUT = 10.0  # longest wait for resume data on shutdown
+SEED_CHECK_INTERVAL = 60.0  # seconds between seed limit checks of idle seeds
+
+# libtorrent's queue limits; -1 = unlimited
+QUEUE_DEFAULTS = {'active_downloads': 3, 'active_seeds': 5, 'active_limit': 500}
+
+# Per-torrent options: rate caps in bytes/s (0 = none); seed limits of None follow the session's
+TORRENT_OPTION_DEFAULTS = {'download_limit': 0, 'upload_limit': 0, 'ratio_limit': None, 'seed_time_limit': None}
+
+QUEUE_MOVES = {
+    'top': lt.torrent_handle.queue_position_top,
+    'up': lt.torrent_handle.queue_position_up,
+    'down': lt.torrent_handle.queue_position_down,
+    'bottom': lt.torrent_handle.queue_position_bottom,
+}
+ALERT_MASK = lt.alert_category.error | lt.alert_category.status | lt.alert_category.storage
+
+# Events passed to subscribers as callback(event, info_hash, payload)
+EVENT_ADDED = 'added'  # payload: status dict
+EVENT_METADATA = 'metadata'  # payload: torrent metadata dict
+EVENT_STATUS = 'status'  # payload: status dict, only for torrents that changed
+EVENT_FINISHED = 'finished'  # payload: save path
+EVENT_ERROR = 'error'  # payload: error message
+EVENT_REMOVED = 'removed'  # payload: None
+EVENT_PIECE = 'piece'  # payload: (piece index, data or None on error), for pieces read back with read_piece() or set_piece_deadline(..., alert_when_available)
+
+
+def info_hash_key(item):
+    """Hex info hash of a torrent handle, torrent_info or add_torrent_params (v1 when both exist)."""
+    if isinstance(item, lt.add_torrent_params):
+        if item.ti is None:
+            return str(item.info_hashes.get_best())
+        item = item.ti
+    return str(item.info_hashes().get_best())
+
+
+def format_size(size_bytes):
+    """Format bytes to human readable string."""
+    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
+        if size_bytes < 1024.0:
+            return f"{size_bytes:.2f} {unit}"
+        size_bytes /= 1024.0
+    return f"{size_bytes:.2f} PB"
+
+
+def status_dict(status):
+    """Progress fields of a torrent_status, in the form TorrentWorker.progress_updated emits."""
+    return {
+        'info_hash': info_hash_key(status.handle),
+        'name': status.name,
+        'percent': status.progress * 100,
+        'download_rate': status.download_rate / 1000,  # KB/s
+        'upload_rate': status.upload_rate / 1000,  # KB/s
+        'peers': status.num_peers,
+        'seeds': status.num_seeds,
+        'state': str(status.state),
+        'paused': bool(status.flags & lt.torrent_flags.paused),
+        'auto_managed': bool(status.flags & lt.torrent_flags.auto_managed),
+        'queue_position': status.queue_position,  # -1 once finished
+        'ratio': status.all_time_upload / status.total_done if status.total_done else 0.0,
+        'seeding_time': status.seeding_duration.total_seconds(),
+        'is_seeding': status.is_seeding,
+        'has_metadata': status.has_metadata,
+        'error': str(status.errc.message()) if status.errc.value() else '',
+        'total_download': status.total_download,
+        'total_upload': status.total_upload,
+    }
+
+
+def torrent_info_dict(handle):
+    """Metadata of a torrent (name, sizes, file list, creator...); {} until the metadata is known."""
+    torrent_file = handle.torrent_file() if handle.status().has_metadata else None
+    if not torrent_file:
+        return {}
+    file_storage = torrent_file.files()
+    files = []
+    for i in range(file_storage.num_files()):
+        file_size = file_storage.file_size(i)
+        files.append({'path': file_storage.file_path(i), 'size': file_size, 'size_str': format_size(file_size)})
+    creation_date = torrent_file.creation_date()
+    return {
+        'info_hash': info_hash_key(handle),
+        'name': handle.name(),
+        'total_size': torrent_file.total_size(),
+        'total_size_str': format_size(torrent_file.total_size()),
+        'num_files': len(files),
+        'files': files,
+        'num_pieces': torrent_file.num_pieces(),
+        'piece_length': torrent_file.piece_length(),
+        'creator': torrent_file.creator(),
+        'comment': torrent_file.comment(),
+        'creation_date': datetime.fromtimestamp(creation_date).strftime('%Y-%m-%d %H:%M:%S') if creation_date > 0 else 'Unknown',
+    }
+
+
+def _capped(share, cap):
+    """libtorrent rate limit from a bandwidth share and a cap, both bytes/s with 0 = none (-1 = unlimited)."""
+    limits = [int(value) for value in (share, cap) if value]
+    return min(limits) if limits else -1
+
+
+class TorrentSessionManager:
+    """
+    Hosts every torrent of the process in one libtorrent session, created on
+    first use. Torrents are added from a magnet link or .torrent file and
+    addressed by their hex info hash afterwards. Thread safe; subscriber
+    callbacks run on the alert thread.
+    """
+
+    def __init__(self, listen_interfaces=LISTEN_INTERFACES, settings=None, resume_store=None):
+        self.listen_interfaces = listen_interfaces
+        self.extra_settings = settings or {}
+        self.resume_store = resume_store or ResumeStore()
+        self.ratio_limit = 0.0  # share ratio at which seeding stops, 0 = none
+        self.seed_time_limit = 0  # seconds of seeding after which it stops, 0 = none
+        self._session = None
+        self._torrents = {}  # info hash -> {'handle', 'source', 'save_path', 'governor_key', 'limits', 'options'}
+        self._subscribers = {}  # info hash (None for every torrent) -> callbacks
+        self._alert_thread = None
+        self._running = False
+        self._lock = threading.RLock()
+        self._resume_pending = 0  # save_resume_data requests without an answer yet
+        self._resume_done = threading.Condition(self._lock)
+        self._restored = False
+
+    @property
+    def session(self):
+        with self._lock:
+            if self._session is None:
+                settings = {
+                    'listen_interfaces': self.listen_interfaces,
+                    'user_agent': 'UVDM/1.0 libtorrent/' + lt.__version__,
+                    'enable_dht': True,
+                    'enable_lsd': True,
+                    'enable_upnp': True,
+                    'enable_natpmp': True,
+                    'alert_mask': ALERT_MASK,
+                }
+                settings.update(QUEUE_DEFAULTS)
+                settings.update(self.extra_settings)
+                self._session = lt.session(settings)
+                self._running = True
+                self._alert_thread = threading.Thread(
+                    target=self._alert_loop, args=(self._session,), name='torrent-alerts', daemon=True)
+                self._alert_thread.start()
+            return self._session
+
+    def subscribe(self, callback, info_hash=None):
+        """Call callback(event, info_hash, payload) for events of one torrent, or of all for None."""
+        with self._lock:
+            self._subscribers.setdefault(info_hash, []).append(callback)
+
+    def unsubscribe(self, callback, info_hash=None):
+        with self._lock:
+            callbacks = self._subscribers.get(info_hash, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+            if not callbacks:
+                self._subscribers.pop(info_hash, None)
+
+    def _notify(self, event, info_hash, payload):
+        with self._lock:
+            callbacks = self._subscribers.get(info_hash, []) + self._subscribers.get(None, [])
+        for callback in callbacks:
+            try:
+                callback(event, info_hash, payload)
+            except Exception as e:
+                logging.error(f"Error in torrent event subscriber: {e}")
+
+    def _alert_loop(self, session):
+        """Wait for alerts and dispatch them; post a batched status update every UPDATE_INTERVAL."""
+        next_update = time.monotonic()
+        next_resume = next_update + RESUME_INTERVAL
+        next_seed_check = next_update + SEED_CHECK_INTERVAL
+        while self._running:
+            timeout = max(0.0, next_update - time.monotonic())
+            session.wait_for_alert(int(timeout * 1000))
+            for alert in session.pop_alerts():
+                try:
+                    self._handle_alert(alert)
+                except Exception as e:
+                    logging.error(f"Error handling torrent alert {alert.what()}: {e}")
+            if time.monotonic() >= next_update:
+                self.apply_rate_limits()
+                # Answered with one state_update_alert listing only the torrents that changed
+                session.post_torrent_updates()
+                next_update = time.monotonic() + UPDATE_INTERVAL
+            if time.monotonic() >= next_resume:
+                self.save_resume_data()
+                next_resume = time.monotonic() + RESUME_INTERVAL
+            if time.monotonic() >= next_seed_check:
+                # Seeds without traffic are missing from the state updates
+                for progress_info in self.statuses():
+                    self._check_seed_limits(progress_info)
+                next_seed_check = time.monotonic() + SEED_CHECK_INTERVAL
+
+    def _handle_alert(self, alert):
+        if isinstance(alert, lt.save_resume_data_alert):
+            try:
+                # Also answers requests for torrents that were removed meanwhile
+                self.resume_store.save(info_hash_key(alert.params), lt.write_resume_data_buf(alert.params))
+            finally:
+                self._resume_answered()
+            return
+        if isinstance(alert, lt.save_resume_data_failed_alert):
+            logging.info(f"Resume data not saved: {alert.message()}")
+            self._resume_answered()
+            return
+        if isinstance(alert, lt.state_update_alert):
+            for status in alert.status:
+                info_hash = info_hash_key(status.handle)
+                if self.handle(info_hash):
+                    progress_info = status_dict(status)
+                    self._notify(EVENT_STATUS, info_hash, progress_info)
+                    self._check_seed_limits(progress_info)
+            return
+        if not isinstance(alert, (lt.metadata_received_alert, lt.torrent_finished_alert, lt.torrent_error_alert,
+                                  lt.read_piece_alert)):
+            return
+        info_hash = info_hash_key(alert.handle)
+        if not self.handle(info_hash):
+            return  # Removed meanwhile
+        if isinstance(alert, lt.read_piece_alert):
+            failed = alert.error.value() != 0
+            self._notify(EVENT_PIECE, info_hash, (alert.piece, None if failed else bytes(alert.buffer)))
+        elif isinstance(alert, lt.metadata_received_alert):
+            self._notify(EVENT_METADATA, info_hash, torrent_info_dict(alert.handle))
+        elif isinstance(alert, lt.torrent_finished_alert):
+            # A finished torrent restarts straight into seeding
+            self.save_resume_data([info_hash])
+            self._notify(EVENT_FINISHED, info_hash, self.save_path(info_hash))
+        else:
+            logging.error(f"Torrent error: {alert.message()}")
+            self._notify(EVENT_ERROR, info_hash, alert.message())
+
+    def apply_settings(self, settings):
+        """Change session settings; applied now if the session is running, else when it starts."""
+        with self._lock:
+            self.extra_settings.update(settings)
+            if self._session is not None:
+                self._session.apply_settings(settings)
+
+    def add_torrent(self, source, save_path):
+        """
+        Add a magnet link or .torrent file and return its info hash. A torrent
+        that is already in the session is not added twice.
+        """
+        if source.startswith('magnet:'):
+            params = lt.parse_magnet_uri(source)
+        else:
+            params = lt.add_torrent_params()
+            params.ti = lt.torrent_info(source)
+        info_hash = info_hash_key(params)
+        with self._lock:
+            if info_hash in self._torrents:
+                return info_hash
+            params = self._resumed_params(info_hash, params)
+            params.save_path = save_path
+            params.storage_mode = lt.storage_mode_t.storage_mode_sparse
+            # Queued behind the torrents added earlier, including ones stopped before
+            params.flags |= lt.torrent_flags.auto_managed
+            handle = self.session.add_torrent(params)
+            governor_key = f"torrent:{info_hash}"
+            get_bandwidth_governor().register(governor_key, kind=JOB_TORRENT)
+            self._torrents[info_hash] = {
+                'handle': handle, 'source': source, 'save_path': save_path, 'governor_key': governor_key,
+                'limits': None, 'options': dict(TORRENT_OPTION_DEFAULTS),
+            }
+        self.apply_rate_limits(info_hash)
+        self._save_torrent_list()
+        self._notify(EVENT_ADDED, info_hash, status_dict(handle.status()))
+        return info_hash
+
+    def restore(self):
+        """Add the torrents that were in the session when it was last closed, once per process."""
+        with self._lock:
+            if self._restored:
+                return
+            self._restored = True
+        for entry in self.resume_store.load_torrent_list():
+            info_hash, source = entry['info_hash'], entry['source']
+            if not source.startswith('magnet:') and not os.path.exists(source):
+                # The .torrent file is gone; the saved resume data carries its metadata
+                source = 'magnet:?xt=urn:' + (f"btih:{info_hash}" if len(info_hash) == 40 else f"btmh:1220{info_hash}")
+            try:
+                info_hash = self.add_torrent(source, entry['save_path'])
+            except Exception as e:
+                logging.error(f"Could not restore torrent {info_hash}: {e}")
+                continue
+            self.set_torrent_options(info_hash, **entry.get('options', {}))
+
+    def _save_torrent_list(self):
+        """Record the hosted torrents in queue order for restore(), finished ones last."""
+        with self._lock:
+            torrents = []
+            for info_hash, torrent in self._torrents.items():
+                handle = torrent['handle']
+                position = int(handle.queue_position()) if handle.is_valid() else -1
+                torrents.append((position < 0, position, {
+                    'info_hash': info_hash, 'source': torrent['source'],
+                    'save_path': torrent['save_path'], 'options': torrent['options'],
+                }))
+            torrents.sort(key=lambda item: item[:2])
+            self.resume_store.save_torrent_list([entry for _, _, entry in torrents])
+
+    def _resumed_params(self, info_hash, params):
+        """Saved resume data for a torrent (pieces, peers, metadata) if any, else `params`."""
+        data = self.resume_store.load(info_hash)
+        if not data:
+            return params
+        try:
+            resumed = lt.read_resume_data(data)
+        except Exception as e:
+            logging.error(f"Ignoring unreadable resume data of torrent {info_hash}: {e}")
+            return params
+        if resumed.ti is None and params.ti is not None:
+            resumed.ti = params.ti
+        return resumed
+
+    def remove_torrent(self, info_hash, delete_files=False, forget=True):
+        """
+        Remove a torrent from the session, optionally deleting its downloaded
+        files. Otherwise its resume data is saved, so adding it again is quick.
+        Unless `forget` is False, it is not restored at the next start either.
+        """
+        with self._lock:
+            torrent = self._torrents.get(info_hash)
+            if torrent is None:
+                return False
+            if delete_files:
+                self.resume_store.delete(info_hash)
+            else:
+                # Answered after the removal; the alert carries the data
+                self.save_resume_data([info_hash])
+            del self._torrents[info_hash]
+            if forget:
+                self._save_torrent_list()
+            get_bandwidth_governor().unregister(torrent['governor_key'])
+            try:
+                flags = lt.session.delete_files if delete_files else 0
+                self.session.remove_torrent(torrent['handle'], flags)
+            except Exception as e:
+                logging.error(f"Error removing torrent {info_hash}: {e}")
+        self._notify(EVENT_REMOVED, info_hash, None)
+        return True
+
+    def handle(self, info_hash):
+        """The torrent_handle of a hosted torrent, or None."""
+        with self._lock:
+            torrent = self._torrents.get(info_hash)
+            return torrent['handle'] if torrent else None
+
+    def info_hashes(self):
+        with self._lock:
+            return list(self._torrents)
+
+    def save_path(self, info_hash):
+        """Where a torrent's content is (or will be) saved: its folder or single file."""
+        with self._lock:
+            torrent = self._torrents.get(info_hash)
+            if torrent is None:
+                return None
+            return os.path.join(torrent['save_path'], torrent['handle'].name())
+
+    def status(self, info_hash):
+        """Progress of one torrent as a dict, or None if it is not hosted."""
+        handle = self.handle(info_hash)
+        return status_dict(handle.status()) if handle else None
+
+    def statuses(self):
+        """Progress of every hosted torrent."""
+        with self._lock:
+            handles = [torrent['handle'] for torrent in self._torrents.values()]
+        return [status_dict(handle.status()) for handle in handles]
+
+    def torrent_info(self, info_hash):
+        handle = self.handle(info_hash)
+        return torrent_info_dict(handle) if handle else {}
+
+    def apply_rate_limits(self, info_hash=None):
+        """Apply each torrent's share of the global bandwidth limit (-1 = unlimited)."""
+        governor = get_bandwidth_governor()
+        with self._lock:
+            torrents = [self._torrents[info_hash]] if info_hash in self._torrents else (
+                list(self._torrents.values()) if info_hash is None else [])
+        for torrent in torrents:
+            options = torrent['options']
+            limits = (_capped(governor.rate_for(torrent['governor_key']), options['download_limit']),
+                      _capped(governor.upload_rate_for(torrent['governor_key']), options['upload_limit']))
+            if limits != torrent['limits']:
+                torrent['handle'].set_download_limit(limits[0])
+                torrent['handle'].set_upload_limit(limits[1])
+                torrent['limits'] = limits
+
+    def pause(self, info_hash):
+        """Pause a torrent and take it out of the queue, so it stays paused."""
+        handle = self.handle(info_hash)
+        if handle:
+            handle.unset_flags(lt.torrent_flags.auto_managed)
+            handle.pause()
+
+    def resume(self, info_hash):
+        """
+        Put a paused torrent back in the queue; it starts when it gets a slot.
+        A seed past its ratio or seed time limit stops again unless its limits are raised.
+        """
+        handle = self.handle(info_hash)
+        if handle:
+            handle.set_flags(lt.torrent_flags.auto_managed)
+
+    def move_queue(self, info_hash, direction):
+        """Move a torrent 'top', 'up', 'down' or 'bottom' in the download queue."""
+        handle = self.handle(info_hash)
+        if handle:
+            QUEUE_MOVES[direction](handle)
+            self.session.post_torrent_updates()
+
+    def queue_limits(self):
+        """Current active_downloads, active_seeds and active_limit."""
+        with self._lock:
+            return {key: self.extra_settings.get(key, default) for key, default in QUEUE_DEFAULTS.items()}
+
+    def set_queue_limits(self, **limits):
+        """Change active_downloads, active_seeds and/or active_limit (-1 = unlimited)."""
+        self.apply_settings({key: int(value) for key, value in limits.items() if key in QUEUE_DEFAULTS})
+
+    def set_seed_limits(self, ratio_limit=None, seed_time_limit=None):
+        """Session-wide seed limits: share ratio and seconds of seeding (0 = none)."""
+        with self._lock:
+            if ratio_limit is not None:
+                self.ratio_limit = max(0.0, float(ratio_limit))
+            if seed_time_limit is not None:
+                self.seed_time_limit = max(0, int(seed_time_limit))
+
+    def torrent_options(self, info_hash):
+        """Rate caps and seed limits of one torrent (see TORRENT_OPTION_DEFAULTS), or None."""
+        with self._lock:
+            torrent = self._torrents.get(info_hash)
+            return dict(torrent['options']) if torrent else None
+
+    def set_torrent_options(self, info_hash, **options):
+        """Change a torrent's download_limit/upload_limit (bytes/s) or ratio_limit/seed_time_limit."""
+        with self._lock:
+            torrent = self._torrents.get(info_hash)
+            if torrent is None:
+                return
+            torrent['options'].update((key, value) for key, value in options.items() if key in TORRENT_OPTION_DEFAULTS)
+            self._save_torrent_list()
+        self.apply_rate_limits(info_hash)
+
+    def _check_seed_limits(self, progress_info):
+        """Stop seeding a torrent that reached its ratio or seed time limit."""
+        if not progress_info['is_seeding'] or not progress_info['auto_managed']:
+            return
+        options = self.torrent_options(progress_info['info_hash'])
+        if options is None:
+            return
+        ratio_limit = self.ratio_limit if options['ratio_limit'] is None else options['ratio_limit']
+        seed_time_limit = self.seed_time_limit if options['seed_time_limit'] is None else options['seed_time_limit']
+        if ((ratio_limit and progress_info['ratio'] >= ratio_limit)
+                or (seed_time_limit and progress_info['seeding_time'] >= seed_time_limit)):
+            logging.info(f"Stopped seeding {progress_info['name']}: ratio {progress_info['ratio']:.2f}, "
+                         f"seeded {int(progress_info['seeding_time'] // 60)} min")
+            self.pause(progress_info['info_hash'])
+
+    def save_resume_data(self, info_hashes=None, wait=0):
+        """
+        Ask libtorrent for the resume data of torrents that changed since it
+        was last saved (all torrents for None); it is written when the alert
+        arrives. With `wait`, block up to that many seconds for the answers.
+        """
+        with self._lock:
+            handles = [torrent['handle'] for key, torrent in self._torrents.items()
+                       if info_hashes is None or key in info_hashes]
+            for handle in handles:
+                if handle.is_valid() and handle.need_save_resume_data():
+                    self._resume_pending += 1
+                    handle.save_resume_data(lt.torrent_handle.save_info_dict)
+            if wait and self._running:
+                self._resume_done.wait_for(lambda: self._resume_pending <= 0, wait)
+
+    def _resume_answered(self):
+        with self._resume_done:
+            self._resume_pending -= 1
+            self._resume_done.notify_all()
+
+    def shutdown(self):
+        """Save resume data, remove every torrent (keeping their files) and close the session."""
+        self.save_resume_data(wait=RESUME_SHUTDOWN_TIMEOUT)
+        # Recorded once more for the queue order; the torrents are restored at the next start
+        self._save_torrent_list()
+        for info_hash in self.info_hashes():
+            self.remove_torrent(info_hash, forget=False)
+        with self._lock:
+            self._running = False
+            thread, self._alert_thread = self._alert_thread, None
+            session, self._session = self._session, None
+        if thread:
+            thread.join(UPDATE_INTERVAL * 2)
+        if session is not None:
+            session.pause()
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_torrent_session():
+    """Return the process-wide torrent session manager."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = TorrentSessionManager()
+        return _manager
@@ -0,0 +1,280 @@
+"""
+Torrent streaming - plays a video file of a torrent while it downloads. The
+file is downloaded sequentially, and the pieces just ahead of what the player
+is reading get deadlines so libtorrent requests them first. A local HTTP
+server with Range support hands the file to a media player (or the preview
+dialog). Pieces are read back through libtorrent (read_piece alerts) as the
+player gets to them, so only verified data is served.
+"""
+import re
+import logging
+import mimetypes
+import threading
+from collections import OrderedDict
+from urllib.parse import quote
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import libtorrent as lt
+from app.torrent_session import get_torrent_session, EVENT_PIECE, EVENT_REMOVED
+
+STREAM_HOST = '127.0.0.1'
+READ_AHEAD = 16 * 1024 * 1024  # bytes past the playhead whose pieces get deadlines
+DEADLINE_STEP_MS = 250  # deadline added per piece further from the playhead
+TAIL_BYTES = 2 * 1024 * 1024  # end of the file fetched early; players read indexes (e.g. MP4 moov) there
+PIECE_TIMEOUT = 120  # seconds a request waits for a piece before giving up
+CACHE_BYTES = 64 * 1024 * 1024  # piece data kept for readers
+CHUNK_SIZE = 256 * 1024
+
+FILE_PRIORITY_STREAMED = 7
+FILE_PRIORITY_OTHERS = 1
+FILE_PRIORITY_DEFAULT = 4
+
+
+class TorrentStream:
+    """
+    One streamed file of a torrent in the shared session. read() blocks
+    until the data at a position has been downloaded and moves the playhead
+    there.
+    """
+
+    def __init__(self, manager, info_hash, file_index):
+        self.manager = manager
+        self.info_hash = info_hash
+        self.file_index = file_index
+        self.handle = manager.handle(info_hash)
+        torrent_file = self.handle.torrent_file() if self.handle else None
+        if torrent_file is None:
+            raise ValueError("The torrent's metadata is not known yet")
+        files = torrent_file.files()
+        if not 0 <= file_index < files.num_files():
+            raise ValueError(f"The torrent has no file {file_index}")
+        self.name = files.file_name(file_index)
+        self.size = files.file_size(file_index)
+        self.offset = files.file_offset(file_index)
+        self.piece_length = torrent_file.piece_length()
+        self.closed = False
+        self._playhead_piece = None
+        self._pieces = OrderedDict()  # piece index -> data, least recently used first
+        self._requested = set()  # pieces asked to be read back
+        self._deadlines = set()  # pieces given a deadline by set_playhead()
+        self._failed = set()
+        self._piece_ready = threading.Condition()
+
+        # Only the streamed file at full speed, front to back
+        priorities = [FILE_PRIORITY_OTHERS] * files.num_files()
+        priorities[file_index] = FILE_PRIORITY_STREAMED
+        self.handle.prioritize_files(priorities)
+        self.handle.set_flags(lt.torrent_flags.sequential_download)
+        manager.subscribe(self._on_event, info_hash)
+        self.set_playhead(0)
+
+    def piece_at(self, position):
+        """Index of the piece holding a byte of the file."""
+        return (self.offset + position) // self.piece_length
+
+    def set_playhead(self, position):
+        """Give the pieces from `position` on (and the file's tail) deadlines, nearest first."""
+        first = self.piece_at(position)
+        last = self.piece_at(min(self.size - 1, position + READ_AHEAD))
+        tail = range(self.piece_at(max(0, self.size - TAIL_BYTES)), self.piece_at(self.size - 1) + 1)
+        with self._piece_ready:
+            if first == self._playhead_piece:
+                return
+            self._playhead_piece = first
+            deadlines = {piece: DEADLINE_STEP_MS for piece in tail}
+            deadlines.update((piece, step * DEADLINE_STEP_MS) for step, piece in enumerate(range(first, last + 1)))
+            # Pieces being read keep their read request; resetting it would abort the read
+            for piece in self._deadlines - deadlines.keys() - self._requested:
+                self.handle.reset_piece_deadline(piece)
+            for piece, deadline in deadlines.items():
+                if piece not in self._requested and not self.handle.have_piece(piece):
+                    self.handle.set_piece_deadline(piece, deadline)
+            self._deadlines = set(deadlines)
+
+    def read(self, position, length, timeout=PIECE_TIMEOUT):
+        """
+        Up to `length` bytes of the file from `position`, once downloaded;
+        b'' if the stream was closed or the piece did not arrive in time.
+        """
+        self.set_playhead(position)
+        piece = self.piece_at(position)
+        with self._piece_ready:
+            self._failed.discard(piece)
+            if piece not in self._pieces and piece not in self._requested:
+                self._requested.add(piece)
+                # Read back now if downloaded, otherwise as soon as it is
+                self.handle.set_piece_deadline(piece, 0, lt.torrent_handle.alert_when_available)
+            self._piece_ready.wait_for(
+                lambda: self.closed or piece in self._pieces or piece in self._failed, timeout)
+            data = self._pieces.get(piece)
+            if data is None:
+                self._requested.discard(piece)
+                return b''
+            self._pieces.move_to_end(piece)
+        start = self.offset + position - piece * self.piece_length
+        return data[start:start + min(length, self.size - position)]
+
+    def close(self):
+        """Stop streaming; the rest of the torrent downloads in the normal order."""
+        if self.closed:
+            return
+        self.closed = True
+        self.manager.unsubscribe(self._on_event, self.info_hash)
+        with self._piece_ready:
+            self._pieces.clear()
+            self._piece_ready.notify_all()
+        if self.handle.is_valid():
+            self.handle.clear_piece_deadlines()
+            self.handle.unset_flags(lt.torrent_flags.sequential_download)
+            self.handle.prioritize_files([FILE_PRIORITY_DEFAULT] * self.handle.torrent_file().num_files())
+
+    def _on_event(self, event, info_hash, payload):
+        if event == EVENT_REMOVED:
+            self.close()
+        elif event == EVENT_PIECE:
+            piece, data = payload
+            with self._piece_ready:
+                if piece not in self._requested:
+                    return
+                self._requested.discard(piece)
+                if data is None:
+                    self._failed.add(piece)
+                else:
+                    self._pieces[piece] = data
+                    while len(self._pieces) * self.piece_length > CACHE_BYTES:
+                        self._pieces.popitem(last=False)
+                self._piece_ready.notify_all()
+
+
+def parse_range(header, size):
+    """(start, end) byte positions, inclusive, of an HTTP Range header; None if it can't be served."""
+    match = re.match(r'^bytes=(\d*)-(\d*)$', (header or '').strip())
+    if not match or not (match.group(1) or match.group(2)):
+        return None
+    if not match.group(1):
+        # Suffix range: the last N bytes
+        start, end = max(0, size - int(match.group(2))), size - 1
+    else:
+        start = int(match.group(1))
+        end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+    if start > end or start >= size:
+        return None
+    return start, end
+
+
+class StreamRequestHandler(BaseHTTPRequestHandler):
+    """Serves /<info hash>/<file index>/<name> from the server's streams."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_HEAD(self):
+        self.serve(send_body=False)
+
+    def do_GET(self):
+        self.serve(send_body=True)
+
+    def serve(self, send_body):
+        parts = self.path.split('?')[0].strip('/').split('/')
+        stream = self.server.streams.get((parts[0], int(parts[1]))) if len(parts) >= 2 and parts[1].isdigit() else None
+        if stream is None or stream.closed:
+            self.send_error(404, "No such stream")
+            return
+
+        if self.headers.get('Range'):
+            byte_range = parse_range(self.headers['Range'], stream.size)
+            if byte_range is None:
+                self.send_response(416)
+                self.send_header('Content-Range', f"bytes */{stream.size}")
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            start, end = byte_range
+            self.send_response(206)
+            self.send_header('Content-Range', f"bytes {start}-{end}/{stream.size}")
+        else:
+            start, end = 0, stream.size - 1
+            self.send_response(200)
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Type', mimetypes.guess_type(stream.name)[0] or 'application/octet-stream')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        if send_body:
+            self.send_body(stream, start, end)
+
+    def send_body(self, stream, start, end):
+        position = start
+        try:
+            while position <= end:
+                data = stream.read(position, min(end + 1 - position, CHUNK_SIZE))
+                if not data:
+                    break  # Timed out or closed; the player sees a short response and retries
+                self.wfile.write(data)
+                position += len(data)
+        except (ConnectionError, OSError):
+            pass  # Player closed the connection, usually to seek
+        if position <= end:
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        logging.debug(f"Torrent stream: {format % args}")
+
+
+class StreamServer:
+    """
+    Local HTTP server for torrent streams, started on first use on a free
+    port of 127.0.0.1. url() starts streaming a file and returns its address.
+    """
+
+    def __init__(self, manager=None, host=STREAM_HOST, port=0):
+        self.manager = manager or get_torrent_session()
+        self.host = host
+        self.port = port
+        self._server = None
+        self._lock = threading.Lock()
+
+    def url(self, info_hash, file_index):
+        """Stream a file of a torrent; returns the URL a player can open."""
+        with self._lock:
+            if self._server is None:
+                self._server = ThreadingHTTPServer((self.host, self.port), StreamRequestHandler)
+                self._server.daemon_threads = True
+                self._server.streams = {}
+                threading.Thread(target=self._server.serve_forever, name='torrent-stream', daemon=True).start()
+            streams = self._server.streams
+            key = (info_hash, file_index)
+            if key not in streams or streams[key].closed:
+                # One streamed file per torrent
+                for other_key in [other for other in streams if other[0] == info_hash]:
+                    streams.pop(other_key).close()
+                streams[key] = TorrentStream(self.manager, info_hash, file_index)
+            stream = streams[key]
+            host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/{info_hash}/{file_index}/{quote(stream.name)}"
+
+    def stop_stream(self, info_hash):
+        with self._lock:
+            if self._server is None:
+                return
+            for key in [key for key in self._server.streams if key[0] == info_hash]:
+                self._server.streams.pop(key).close()
+
+    def shutdown(self):
+        with self._lock:
+            server, self._server = self._server, None
+        if server is not None:
+            for stream in server.streams.values():
+                stream.close()
+            server.shutdown()
+            server.server_close()
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def get_stream_server():
+    """Return the process-wide torrent stream server."""
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = StreamServer()
+        return _server
@@ -2,20 +2,45 @@ import os
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton, 
     QFileDialog, QProgressBar, QMessageBox, QTextEdit, QGroupBox,
-    QTableWidget, QTableWidgetItem, QHeaderView, QSplitter
+    QTableWidget, QTableWidgetItem, QHeaderView, QSplitter, QApplication, QAbstractItemView,
+    QSpinBox, QDoubleSpinBox, QFormLayout
 )
-from PyQt5.QtCore import QThread, Qt
+from PyQt5.QtCore import QObject, QThread, Qt, pyqtSignal
 from app.torrent_worker import TorrentWorker
+from app.torrent_stream import get_stream_server
+from app.history_model import VIDEO_EXTENSIONS
+from app.video_preview_dialog import VideoPreviewDialog
+from app.torrent_session import (
+    get_torrent_session, EVENT_ADDED, EVENT_METADATA, EVENT_STATUS, EVENT_REMOVED
+)
+
+TORRENT_COLUMNS = ["Name", "Queue", "Progress", "Down", "Up", "Peers", "Ratio", "State"]
+
+
+def display_state(progress_info):
+    """State shown for a torrent: waiting in the queue, paused by the user or a seed limit, or libtorrent's state."""
+    if progress_info['paused']:
+        return "queued" if progress_info['auto_managed'] else "paused"
+    return progress_info['state']
+
+
+class TorrentEventRelay(QObject):
+    """Delivers torrent session events, which come from the alert thread, on the GUI thread."""
+
+    changed = pyqtSignal(str, str, object)  # event, info hash, payload
 
 
 class TorrentTab(QWidget):
-    """Tab for downloading and managing torrents."""
+    """Tab for downloading and managing torrents; any number run at once in the shared session."""
     
     def __init__(self):
         super().__init__()
         self.layout = QVBoxLayout()
-        self.worker = None
-        self.thread = None
+        self.manager = get_torrent_session()
+        self.jobs = {}  # TorrentWorker -> QThread, while the worker follows its download
+        self.rows = {}  # info hash -> row in torrents_table
+        self.infos = {}  # info hash -> torrent metadata
+        self.selected_hash = None
         
         # Set default download folder
         self.output_folder = os.path.join(os.getcwd(), "Downloads", "Torrents")
@@ -23,11 +48,19 @@ class TorrentTab(QWidget):
         
         # Create UI
         self.create_input_section()
+        self.create_torrents_section()
         self.create_info_section()
         self.create_progress_section()
         self.create_output_section()
         
         self.setLayout(self.layout)
+        
+        # Rows follow every torrent in the session, including ones that keep seeding after their worker is done
+        self.event_relay = TorrentEventRelay(self)
+        self.event_relay.changed.connect(self.on_torrent_event)
+        self.manager.subscribe(self.event_relay.changed.emit)
+        self.manager.restore()
+        QApplication.instance().aboutToQuit.connect(self.shutdown)
     
     def create_input_section(self):
         """Create the input section for magnet links or torrent files."""
@@ -70,7 +103,7 @@ class TorrentTab(QWidget):
         button_layout = QHBoxLayout()
         self.download_button = QPushButton("Start Download")
         self.download_button.clicked.connect(self.start_download)
-        self.stop_button = QPushButton("Stop")
+        self.stop_button = QPushButton("Stop Selected")
         self.stop_button.setEnabled(False)
         self.stop_button.clicked.connect(self.stop_download)
         button_layout.addWidget(self.download_button)
@@ -84,6 +117,138 @@ class TorrentTab(QWidget):
         input_group.setLayout(input_layout)
         self.layout.addWidget(input_group)
     
+    def create_torrents_section(self):
+        """Create the table of all torrents in the session."""
+        torrents_group = QGroupBox("Torrents")
+        torrents_layout = QVBoxLayout()
+        
+        self.torrents_table = QTableWidget()
+        self.torrents_table.setColumnCount(len(TORRENT_COLUMNS))
+        self.torrents_table.setHorizontalHeaderLabels(TORRENT_COLUMNS)
+        self.torrents_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        for column in range(1, len(TORRENT_COLUMNS)):
+            self.torrents_table.horizontalHeader().setSectionResizeMode(column, QHeaderView.ResizeToContents)
+        self.torrents_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.torrents_table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.torrents_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.torrents_table.verticalHeader().hide()
+        self.torrents_table.setMaximumHeight(180)
+        self.torrents_table.itemSelectionChanged.connect(self.on_selection_changed)
+        
+        # Queue order, pausing and rate caps of the selected torrent
+        selected_layout = QHBoxLayout()
+        self.selected_buttons = []
+        for text, direction in (("Top", 'top'), ("Up", 'up'), ("Down", 'down'), ("Bottom", 'bottom')):
+            button = QPushButton(text)
+            button.setToolTip(f"Move the selected torrent {direction} in the queue")
+            button.clicked.connect(lambda _, direction=direction: self.move_selected(direction))
+            selected_layout.addWidget(button)
+            self.selected_buttons.append(button)
+        self.pause_button = QPushButton("Pause")
+        self.pause_button.clicked.connect(self.pause_selected)
+        self.resume_button = QPushButton("Resume")
+        self.resume_button.clicked.connect(self.resume_selected)
+        selected_layout.addWidget(self.pause_button)
+        selected_layout.addWidget(self.resume_button)
+        self.stream_button = QPushButton("Stream")
+        self.stream_button.setToolTip("Play the selected file (or the largest video) while it downloads")
+        self.stream_button.clicked.connect(self.stream_selected)
+        selected_layout.addWidget(self.stream_button)
+        self.selected_buttons += [self.pause_button, self.resume_button, self.stream_button]
+        selected_layout.addStretch()
+        self.download_cap_spin = self.create_rate_spin()
+        self.upload_cap_spin = self.create_rate_spin()
+        self.download_cap_spin.valueChanged.connect(self.update_selected_caps)
+        self.upload_cap_spin.valueChanged.connect(self.update_selected_caps)
+        selected_layout.addWidget(QLabel("Max ↓"))
+        selected_layout.addWidget(self.download_cap_spin)
+        selected_layout.addWidget(QLabel("Max ↑"))
+        selected_layout.addWidget(self.upload_cap_spin)
+        self.selected_buttons += [self.download_cap_spin, self.upload_cap_spin]
+        # Seed limits of the selected torrent, "Session default" falls back to the limits below
+        self.torrent_ratio_spin = self.create_ratio_spin("Session default")
+        self.torrent_seed_time_spin = self.create_seed_time_spin("Session default")
+        self.torrent_ratio_spin.valueChanged.connect(self.update_selected_seed_limits)
+        self.torrent_seed_time_spin.valueChanged.connect(self.update_selected_seed_limits)
+        self.selected_buttons += [self.torrent_ratio_spin, self.torrent_seed_time_spin]
+        for widget in self.selected_buttons:
+            widget.setEnabled(False)
+        
+        # Queue limits and seeding policy for the whole session
+        queue_layout = QFormLayout()
+        limits = self.manager.queue_limits()
+        limits_layout = QHBoxLayout()
+        self.active_downloads_spin = self.create_count_spin(limits['active_downloads'])
+        self.active_seeds_spin = self.create_count_spin(limits['active_seeds'])
+        self.active_limit_spin = self.create_count_spin(limits['active_limit'])
+        for label, spin in (("Downloading:", self.active_downloads_spin), ("Seeding:", self.active_seeds_spin),
+                            ("Total:", self.active_limit_spin)):
+            spin.valueChanged.connect(self.update_queue_limits)
+            limits_layout.addWidget(QLabel(label))
+            limits_layout.addWidget(spin)
+        limits_layout.addStretch()
+        queue_layout.addRow(QLabel("Active Torrents:"), limits_layout)
+        
+        seed_layout = QHBoxLayout()
+        self.ratio_limit_spin = self.create_ratio_spin("No limit")
+        self.ratio_limit_spin.setValue(self.manager.ratio_limit)
+        self.seed_time_spin = self.create_seed_time_spin("No limit")
+        self.seed_time_spin.setValue(self.manager.seed_time_limit // 60)
+        self.ratio_limit_spin.valueChanged.connect(self.update_seed_limits)
+        self.seed_time_spin.valueChanged.connect(self.update_seed_limits)
+        seed_layout.addWidget(QLabel("Ratio:"))
+        seed_layout.addWidget(self.ratio_limit_spin)
+        seed_layout.addWidget(QLabel("Time:"))
+        seed_layout.addWidget(self.seed_time_spin)
+        seed_layout.addStretch()
+        queue_layout.addRow(QLabel("Stop Seeding At:"), seed_layout)
+        
+        torrent_seed_layout = QHBoxLayout()
+        torrent_seed_layout.addWidget(QLabel("Ratio:"))
+        torrent_seed_layout.addWidget(self.torrent_ratio_spin)
+        torrent_seed_layout.addWidget(QLabel("Time:"))
+        torrent_seed_layout.addWidget(self.torrent_seed_time_spin)
+        torrent_seed_layout.addStretch()
+        queue_layout.addRow(QLabel("Selected Torrent:"), torrent_seed_layout)
+        
+        torrents_layout.addWidget(self.torrents_table)
+        torrents_layout.addLayout(selected_layout)
+        torrents_layout.addLayout(queue_layout)
+        torrents_group.setLayout(torrents_layout)
+        self.layout.addWidget(torrents_group)
+    
+    @staticmethod
+    def create_rate_spin():
+        spin = QSpinBox()
+        spin.setRange(0, 10000000)
+        spin.setSuffix(" KB/s")
+        spin.setSpecialValueText("Unlimited")
+        return spin
+    
+    @staticmethod
+    def create_ratio_spin(zero_text):
+        spin = QDoubleSpinBox()
+        spin.setRange(0, 100)
+        spin.setSingleStep(0.5)
+        spin.setSpecialValueText(zero_text)
+        return spin
+    
+    @staticmethod
+    def create_seed_time_spin(zero_text):
+        spin = QSpinBox()
+        spin.setRange(0, 100000)
+        spin.setSuffix(" min")
+        spin.setSpecialValueText(zero_text)
+        return spin
+    
+    @staticmethod
+    def create_count_spin(value):
+        spin = QSpinBox()
+        spin.setRange(-1, 10000)
+        spin.setSpecialValueText("Unlimited")
+        spin.setValue(value)
+        return spin
+    
     def create_info_section(self):
         """Create the torrent information display section."""
         info_group = QGroupBox("Torrent Information")
@@ -186,49 +351,199 @@ class TorrentTab(QWidget):
             QMessageBox.warning(self, "Input Error", "Invalid magnet link or torrent file path.")
             return
         
-        # Reset UI
-        self.progress_bar.setValue(0)
-        self.output_text.clear()
-        self.clear_torrent_info()
-        
         # Create worker and thread
-        self.thread = QThread()
-        self.worker = TorrentWorker(torrent_source, self.output_folder)
-        self.worker.moveToThread(self.thread)
+        thread = QThread(self)
+        worker = TorrentWorker(torrent_source, self.output_folder, manager=self.manager)
+        worker.moveToThread(thread)
+        self.jobs[worker] = thread
         
-        # Connect signals
-        self.worker.progress_updated.connect(self.update_progress)
-        self.worker.torrent_info_received.connect(self.display_torrent_info)
-        self.worker.torrent_finished.connect(self.on_download_complete)
-        self.worker.torrent_failed.connect(self.on_download_failed)
-        self.worker.output_received.connect(self.append_output)
+        # Connect signals; progress and metadata arrive through the session events
+        worker.torrent_finished.connect(self.on_download_complete)
+        worker.torrent_failed.connect(self.on_download_failed)
+        worker.output_received.connect(self.append_output)
         
-        self.thread.started.connect(self.worker.run)
-        self.thread.finished.connect(self.thread.deleteLater)
+        thread.started.connect(worker.run)
+        thread.finished.connect(self.on_job_finished)
+        thread.finished.connect(thread.deleteLater)
         
-        # Update button states
-        self.download_button.setEnabled(False)
-        self.stop_button.setEnabled(True)
+        # Clear the inputs for the next torrent
+        self.magnet_input.clear()
+        self.file_path_input.clear()
         
         # Start download
-        self.thread.start()
+        thread.start()
         self.append_output("Starting torrent download...")
     
     def stop_download(self):
-        """Stop the current torrent download."""
-        if self.worker:
-            self.worker.stop()
-            self.append_output("Stopping download...")
-        
-        if self.thread and self.thread.isRunning():
-            self.thread.quit()
-            self.thread.wait()
-        
-        self.download_button.setEnabled(True)
-        self.stop_button.setEnabled(False)
+        """Stop the selected torrent and remove it from the session; its files are kept."""
+        info_hash = self.selected_hash
+        if not info_hash:
+            return
+        for worker in [worker for worker in self.jobs if worker.info_hash == info_hash]:
+            worker.stop()
+            self.finish_job(worker, wait=True)
+        self.manager.remove_torrent(info_hash)
+        self.append_output("Stopped download.")
+        self.remove_row(info_hash)
+    
+    def move_selected(self, direction):
+        if self.selected_hash:
+            self.manager.move_queue(self.selected_hash, direction)
+    
+    def pause_selected(self):
+        if self.selected_hash:
+            self.manager.pause(self.selected_hash)
+    
+    def resume_selected(self):
+        if self.selected_hash:
+            self.manager.resume(self.selected_hash)
+    
+    def stream_selected(self):
+        """Stream a video of the selected torrent from the local server and open it in the preview dialog."""
+        if not self.selected_hash:
+            return
+        info = self.infos.get(self.selected_hash) or self.manager.torrent_info(self.selected_hash)
+        if not info:
+            QMessageBox.information(self, "Stream", "The torrent's file list is not known yet, try again in a moment.")
+            return
+        files = info['files']
+        selected = self.files_table.selectedItems()
+        if selected:
+            file_index = selected[0].row()
+        else:
+            videos = [i for i, file_info in enumerate(files) if file_info['path'].lower().endswith(VIDEO_EXTENSIONS)]
+            if not videos:
+                QMessageBox.information(self, "Stream", "The torrent has no video file; select a file to stream it.")
+                return
+            file_index = max(videos, key=lambda i: files[i]['size'])
+        try:
+            url = get_stream_server().url(self.selected_hash, file_index)
+        except (ValueError, OSError) as e:
+            QMessageBox.warning(self, "Stream", f"Could not stream the file: {e}")
+            return
+        self.append_output(f"Streaming {files[file_index]['path']} at {url}")
+        dialog = VideoPreviewDialog(stream_url=url, parent=self)
+        dialog.setAttribute(Qt.WA_DeleteOnClose)
+        dialog.show()
+    
+    def update_selected_caps(self):
+        """Apply the rate caps of the selected torrent (0 = only the global limit applies)."""
+        if self.selected_hash:
+            self.manager.set_torrent_options(
+                self.selected_hash,
+                download_limit=self.download_cap_spin.value() * 1024,
+                upload_limit=self.upload_cap_spin.value() * 1024,
+            )
+    
+    def update_selected_seed_limits(self):
+        """Apply the seed limits of the selected torrent (0 = the session-wide limit applies)."""
+        if self.selected_hash:
+            ratio_limit = self.torrent_ratio_spin.value()
+            seed_time_limit = self.torrent_seed_time_spin.value() * 60
+            self.manager.set_torrent_options(
+                self.selected_hash,
+                ratio_limit=ratio_limit or None,
+                seed_time_limit=seed_time_limit or None,
+            )
+    
+    def update_queue_limits(self):
+        self.manager.set_queue_limits(
+            active_downloads=self.active_downloads_spin.value(),
+            active_seeds=self.active_seeds_spin.value(),
+            active_limit=self.active_limit_spin.value(),
+        )
+    
+    def update_seed_limits(self):
+        self.manager.set_seed_limits(
+            ratio_limit=self.ratio_limit_spin.value(),
+            seed_time_limit=self.seed_time_spin.value() * 60,
+        )
+    
+    def on_torrent_event(self, event, info_hash, payload):
+        """Apply a session event to the torrents table and the selected torrent's details."""
+        if event in (EVENT_ADDED, EVENT_STATUS):
+            self.update_progress(payload)
+        elif event == EVENT_METADATA:
+            self.display_torrent_info(payload)
+        elif event == EVENT_REMOVED:
+            self.remove_row(info_hash)
+    
+    def update_row(self, progress_info):
+        """Create or update a torrent's row in the torrents table."""
+        info_hash = progress_info['info_hash']
+        row = self.rows.get(info_hash)
+        if row is None:
+            row = self.torrents_table.rowCount()
+            self.torrents_table.insertRow(row)
+            self.rows[info_hash] = row
+            for column in range(len(TORRENT_COLUMNS)):
+                item = QTableWidgetItem()
+                if column:
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                self.torrents_table.setItem(row, column, item)
+            self.torrents_table.item(row, 0).setData(Qt.UserRole, info_hash)
+        queue_position = progress_info['queue_position']
+        cells = [
+            progress_info.get('name') or info_hash,
+            str(queue_position + 1) if queue_position >= 0 else "-",
+            f"{progress_info['percent']:.1f}%",
+            f"{progress_info['download_rate']:.1f} KB/s",
+            f"{progress_info['upload_rate']:.1f} KB/s",
+            f"{progress_info['peers']} ({progress_info['seeds']})",
+            f"{progress_info['ratio']:.2f}",
+            display_state(progress_info),
+        ]
+        for column, text in enumerate(cells):
+            self.torrents_table.item(row, column).setText(text)
+    
+    def remove_row(self, info_hash):
+        row = self.rows.pop(info_hash, None)
+        self.infos.pop(info_hash, None)
+        if row is None:
+            return
+        self.torrents_table.removeRow(row)
+        self.rows = {key: (index - 1 if index > row else index) for key, index in self.rows.items()}
+        if info_hash == self.selected_hash:
+            self.selected_hash = None
+            self.clear_torrent_info()
+    
+    def on_selection_changed(self):
+        """Show the selected torrent in the information and progress sections."""
+        items = self.torrents_table.selectedItems()
+        row = items[0].row() if items else None
+        self.selected_hash = self.torrents_table.item(row, 0).data(Qt.UserRole) if row is not None else None
+        self.stop_button.setEnabled(self.selected_hash is not None)
+        for widget in self.selected_buttons:
+            widget.setEnabled(self.selected_hash is not None)
+        self.clear_torrent_info()
+        options = self.manager.torrent_options(self.selected_hash) if self.selected_hash else None
+        values = {
+            self.download_cap_spin: options['download_limit'] // 1024 if options else 0,
+            self.upload_cap_spin: options['upload_limit'] // 1024 if options else 0,
+            self.torrent_ratio_spin: (options['ratio_limit'] or 0) if options else 0,
+            self.torrent_seed_time_spin: (options['seed_time_limit'] or 0) // 60 if options else 0,
+        }
+        for spin, value in values.items():
+            spin.blockSignals(True)
+            spin.setValue(value)
+            spin.blockSignals(False)
+        if self.selected_hash:
+            info = self.infos.get(self.selected_hash) or self.manager.torrent_info(self.selected_hash)
+            if info:
+                self.display_torrent_info(info)
+            progress_info = self.manager.status(self.selected_hash)
+            if progress_info:
+                self.update_progress(progress_info)
     
     def update_progress(self, progress_info):
-        """Update progress bar and status labels."""
+        """Update the torrent's row, and the progress bar and status labels if it is selected."""
+        if progress_info['info_hash'] not in self.manager.info_hashes():
+            return  # Stopped meanwhile
+        self.update_row(progress_info)
+        if self.selected_hash is None:
+            self.torrents_table.selectRow(self.rows[progress_info['info_hash']])
+        if progress_info['info_hash'] != self.selected_hash:
+            return
         self.progress_bar.setValue(int(progress_info['percent']))
         
         download_speed = progress_info['download_rate']
@@ -239,11 +554,15 @@ class TorrentTab(QWidget):
         seeds = progress_info['seeds']
         self.peers_label.setText(f"Peers: {peers} | Seeds: {seeds}")
         
-        state = progress_info['state']
+        state = display_state(progress_info)
         self.state_label.setText(f"State: {state}")
     
     def display_torrent_info(self, info):
         """Display torrent information in the UI."""
+        if info.get('info_hash'):
+            self.infos[info['info_hash']] = info
+            if info['info_hash'] != self.selected_hash:
+                return
         self.name_label.setText(f"Name: {info.get('name', 'Unknown')}")
         self.size_label.setText(f"Total Size: {info.get('total_size_str', '0 B')}")
         self.files_label.setText(f"Files: {info.get('num_files', 0)}")
@@ -265,6 +584,10 @@ class TorrentTab(QWidget):
         self.creator_label.setText("Creator: -")
         self.creation_date_label.setText("Created: -")
         self.files_table.setRowCount(0)
+        self.progress_bar.setValue(0)
+        self.speed_label.setText("↓ 0 KB/s | ↑ 0 KB/s")
+        self.peers_label.setText("Peers: 0 | Seeds: 0")
+        self.state_label.setText("State: Idle")
     
     def append_output(self, text):
         """Append text to the output log."""
@@ -272,22 +595,38 @@ class TorrentTab(QWidget):
     
     def on_download_complete(self, save_path):
         """Handle download completion."""
+        worker = self.sender()
         self.append_output(f"Download complete! Saved to: {save_path}")
         QMessageBox.information(self, "Download Complete", f"Torrent downloaded successfully!\n\nSaved to:\n{save_path}")
-        
-        self.download_button.setEnabled(True)
-        self.stop_button.setEnabled(False)
-        
-        if self.thread:
-            self.thread.quit()
+        self.finish_job(worker)
     
     def on_download_failed(self, error_message):
         """Handle download failure."""
+        worker = self.sender()
         self.append_output(f"Error: {error_message}")
         QMessageBox.critical(self, "Download Failed", error_message)
-        
-        self.download_button.setEnabled(True)
-        self.stop_button.setEnabled(False)
-        
-        if self.thread:
-            self.thread.quit()
+        self.finish_job(worker)
+    
+    def finish_job(self, worker, wait=False):
+        """End the thread of a worker that is done following its download."""
+        thread = self.jobs.get(worker)
+        if thread:
+            thread.quit()
+            if wait:
+                thread.wait()
+    
+    def on_job_finished(self):
+        """Forget a worker once its thread has ended."""
+        thread = self.sender()
+        for worker in [worker for worker, job_thread in self.jobs.items() if job_thread is thread]:
+            del self.jobs[worker]
+    
+    def shutdown(self):
+        """Stop following downloads and close the torrent session."""
+        self.manager.unsubscribe(self.event_relay.changed.emit)
+        for worker in list(self.jobs):
+            # The session saves resume data before it removes the torrents
+            worker.stop(remove=False)
+            self.finish_job(worker, wait=True)
+        get_stream_server().shutdown()
+        self.manager.shutdown()
@@ -1,21 +1,27 @@
-import os
-import time
+import queue
 import logging
-from datetime import datetime
 from PyQt5.QtCore import QObject, pyqtSignal
-import libtorrent as lt
+from app.torrent_session import (
+    get_torrent_session, format_size, EVENT_METADATA, EVENT_STATUS, EVENT_FINISHED, EVENT_ERROR, EVENT_REMOVED
+)
+
+_STOP = 'stop'
 
 
 class TorrentWorker(QObject):
-    """Worker class to handle torrent downloads using libtorrent."""
+    """
+    Worker class to follow one torrent download in the shared libtorrent
+    session. It sleeps until the session's alert thread reports an event for
+    its torrent, so it costs nothing while nothing changes.
+    """
     
-    progress_updated = pyqtSignal(dict)  # {percent, download_rate, upload_rate, peers, seeds}
+    progress_updated = pyqtSignal(dict)  # {info_hash, percent, download_rate, upload_rate, peers, seeds, state...}
     torrent_info_received = pyqtSignal(dict)  # Torrent metadata
     torrent_finished = pyqtSignal(str)  # Download path
     torrent_failed = pyqtSignal(str)  # Error message
     output_received = pyqtSignal(str)  # Status messages
     
-    def __init__(self, torrent_source, output_folder, parent=None):
+    def __init__(self, torrent_source, output_folder, parent=None, manager=None):
         """
         Initialize torrent worker.
         
@@ -23,154 +29,96 @@ class TorrentWorker(QObject):
             torrent_source: Either a magnet link or path to .torrent file
             output_folder: Directory to save downloaded files
             parent: Parent QObject
+            manager: Session manager hosting the torrent (the process-wide one by default)
         """
         super().__init__(parent)
         self.torrent_source = torrent_source
         self.output_folder = output_folder
-        self.session = None
+        self.manager = manager or get_torrent_session()
+        self.info_hash = None
         self.handle = None
         self.running = True
+        self.events = queue.Queue()
         
     def run(self):
-        """Main download loop."""
+        """Follow the torrent's events until it finishes, fails, is removed or stop() is called."""
         try:
-            # Create libtorrent session
-            self.session = lt.session({'listen_interfaces': '0.0.0.0:6881'})
-            
-            # Set session settings for better performance
-            settings = {
-                'user_agent': 'UVDM/1.0 libtorrent/' + lt.__version__,
-                'enable_dht': True,
-                'enable_lsd': True,
-                'enable_upnp': True,
-                'enable_natpmp': True,
-            }
-            self.session.apply_settings(settings)
-            
-            self.output_received.emit("Starting torrent session...")
-            
-            # Add torrent
-            params = {
-                'save_path': self.output_folder,
-                'storage_mode': lt.storage_mode_t.storage_mode_sparse,
-            }
-            
+            self.output_received.emit("Adding torrent to the session...")
             if self.torrent_source.startswith('magnet:'):
-                # Magnet link
                 self.output_received.emit("Adding magnet link...")
-                self.handle = lt.add_magnet_uri(self.session, self.torrent_source, params)
             else:
-                # Torrent file
                 self.output_received.emit(f"Loading torrent file: {self.torrent_source}")
-                info = lt.torrent_info(self.torrent_source)
-                params['ti'] = info
-                self.handle = self.session.add_torrent(params)
-            
-            self.output_received.emit("Waiting for metadata...")
-            
-            # Wait for metadata (important for magnet links)
-            while not self.handle.has_metadata():
-                time.sleep(0.1)
-                if not self.running:
-                    return
-            
-            self.output_received.emit("Metadata received, starting download...")
-            
-            # Get torrent info
-            torrent_info = self.get_torrent_info()
-            self.torrent_info_received.emit(torrent_info)
-            
-            # Main download loop
-            while self.running:
-                status = self.handle.status()
-                
-                # Update progress
-                progress_info = {
-                    'percent': status.progress * 100,
-                    'download_rate': status.download_rate / 1000,  # KB/s
-                    'upload_rate': status.upload_rate / 1000,  # KB/s
-                    'peers': status.num_peers,
-                    'seeds': status.num_seeds,
-                    'state': str(status.state),
-                    'total_download': status.total_download,
-                    'total_upload': status.total_upload,
-                }
-                self.progress_updated.emit(progress_info)
-                
-                # Check if finished
-                if status.is_seeding:
-                    self.output_received.emit("Download complete! Seeding...")
-                    save_path = os.path.join(self.output_folder, self.handle.name())
-                    self.torrent_finished.emit(save_path)
-                    break
-                
-                # Check for errors
-                if status.error:
-                    raise Exception(f"Torrent error: {status.error}")
-                
-                time.sleep(1)
+            self.info_hash = self.manager.add_torrent(self.torrent_source, self.output_folder)
+            self.handle = self.manager.handle(self.info_hash)
+            self.manager.subscribe(self.on_event, self.info_hash)
+            try:
+                if self.running:
+                    self.follow()
+                else:
+                    # Stopped before stop() knew the info hash
+                    self.manager.remove_torrent(self.info_hash)
+            finally:
+                self.manager.unsubscribe(self.on_event, self.info_hash)
                 
         except Exception as e:
             error_msg = f"Torrent download failed: {str(e)}"
             logging.error(error_msg)
             self.torrent_failed.emit(error_msg)
-        finally:
-            if self.session and self.handle:
-                try:
-                    # Pause the torrent to allow cleanup
-                    self.handle.pause()
-                except:
-                    pass
     
+    def follow(self):
+        """Handle the torrent's events as they arrive."""
+        # Events that happened before subscribing are covered by the current status
+        progress_info = self.manager.status(self.info_hash)
+        if progress_info is None:
+            return
+        self.events.put((EVENT_STATUS, progress_info))
+        if not progress_info['has_metadata']:
+            self.output_received.emit("Waiting for metadata...")
+        
+        have_metadata = False
+        while self.running:
+            event, payload = self.events.get()
+            if event in (_STOP, EVENT_REMOVED):
+                break
+            if event == EVENT_ERROR:
+                raise Exception(f"Torrent error: {payload}")
+            if event == EVENT_STATUS:
+                self.progress_updated.emit(payload)
+                if payload['error']:
+                    raise Exception(f"Torrent error: {payload['error']}")
+            
+            if not have_metadata and (event == EVENT_METADATA or (event == EVENT_STATUS and payload['has_metadata'])):
+                have_metadata = True
+                self.output_received.emit("Metadata received, starting download...")
+                self.torrent_info_received.emit(self.get_torrent_info())
+            
+            # The torrent keeps seeding in the session
+            if event == EVENT_FINISHED or (event == EVENT_STATUS and payload['is_seeding']):
+                self.output_received.emit("Download complete! Seeding...")
+                self.torrent_finished.emit(self.manager.save_path(self.info_hash))
+                break
+    
+    def on_event(self, event, info_hash, payload):
+        """Called on the session's alert thread."""
+        self.events.put((event, payload))
+    
+    def apply_rate_limits(self):
+        """Apply this torrent's share of the global bandwidth limit (-1 = unlimited)."""
+        self.manager.apply_rate_limits(self.info_hash)
+
     def get_torrent_info(self):
         """Extract and return torrent information."""
-        if not self.handle or not self.handle.has_metadata():
+        if not self.info_hash:
             return {}
-        
-        status = self.handle.status()
-        torrent_file = self.handle.torrent_file()
-        
-        # Get file list
-        files = []
-        if torrent_file:
-            file_storage = torrent_file.files()
-            for i in range(file_storage.num_files()):
-                file_path = file_storage.file_path(i)
-                file_size = file_storage.file_size(i)
-                files.append({
-                    'path': file_path,
-                    'size': file_size,
-                    'size_str': self.format_size(file_size)
-                })
-        
-        info = {
-            'name': self.handle.name(),
-            'total_size': torrent_file.total_size() if torrent_file else 0,
-            'total_size_str': self.format_size(torrent_file.total_size() if torrent_file else 0),
-            'num_files': len(files),
-            'files': files,
-            'num_pieces': torrent_file.num_pieces() if torrent_file else 0,
-            'piece_length': torrent_file.piece_length() if torrent_file else 0,
-            'creator': torrent_file.creator() if torrent_file else '',
-            'comment': torrent_file.comment() if torrent_file else '',
-            'creation_date': datetime.fromtimestamp(torrent_file.creation_date()).strftime('%Y-%m-%d %H:%M:%S') if torrent_file and torrent_file.creation_date() > 0 else 'Unknown',
-        }
-        
-        return info
+        return self.manager.torrent_info(self.info_hash)
     
     def format_size(self, size_bytes):
         """Format bytes to human readable string."""
-        for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
-            if size_bytes < 1024.0:
-                return f"{size_bytes:.2f} {unit}"
-            size_bytes /= 1024.0
-        return f"{size_bytes:.2f} PB"
+        return format_size(size_bytes)
     
-    def stop(self):
-        """Stop the torrent download."""
+    def stop(self, remove=True):
+        """Stop the torrent download and remove it from the session (downloaded files are kept)."""
         self.running = False
-        if self.handle:
-            try:
-                self.handle.pause()
-            except:
-                pass
+        self.events.put((_STOP, None))
+        if remove and self.info_hash:
+            self.manager.remove_torrent(self.info_hash)
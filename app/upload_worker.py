@@ -2,6 +2,7 @@ import os
 import time
 import json
 from PyQt5.QtCore import QObject, pyqtSignal
+from app.media_probe import get_media_probe
 
 class UploadWorker(QObject):
     upload_finished = pyqtSignal(dict)
@@ -35,8 +36,9 @@ class UploadWorker(QObject):
             self.upload_failed.emit(f"Error during upload: {str(e)}")
 
     def get_video_duration(self):
-        # Placeholder for getting video duration
-        return 'Unknown'
+        # Probed once and cached in the download history
+        duration = get_media_probe().duration(self.file_path)
+        return duration if duration is not None else 'Unknown'
 
     def save_upload_info(self, upload_info):
         json_file_path = os.path.join('data', 'uploads.json')
@@ -0,0 +1,89 @@
+"""
+URL normalization used to recognise the same video behind different links:
+scheme and "www."/"m." host prefixes, tracking parameters, parameter order,
+fragments and trailing slashes are ignored, and YouTube short links are
+rewritten to their watch URL.
+"""
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# Query parameters that are click tracking on any site
+TRACKING_PARAMS = {'fbclid', 'gclid', 'dclid', 'msclkid', 'yclid', 'igshid', 'mc_cid', 'mc_eid'}
+TRACKING_PREFIXES = ('utm_',)
+# Sharing and tracking parameters of known sites; on other hosts these names may select the content
+HOST_TRACKING_PARAMS = {
+    'youtube.com': {'si', 'feature', 'pp', 'ab_channel', 'app', 'source_ve_path'},
+    'twitter.com': {'s', 't', 'ref_src', 'ref_url'},
+    'x.com': {'s', 't', 'ref_src', 'ref_url'},
+    'instagram.com': {'igsh'},
+    'tiktok.com': {'is_from_webapp', 'sender_device', 'sender_web_id', 'is_copy_url', 'web_id', '_r', '_t'},
+    'vimeo.com': {'share', 'fl', 'fe'},
+    'facebook.com': {'mibextid', 'rdid', 'sfnsn', 'ref'},
+    'reddit.com': {'share_id', 'ref', 'ref_source', 'rdt'},
+    'soundcloud.com': {'si', 'ref', 'in'},
+}
+HOST_PREFIXES = ('www.', 'm.', 'mobile.')
+# Raise when normalize_url() changes, so stored normalized URLs are computed again
+NORMALIZE_VERSION = 2
+
+
+def site_host(url):
+    """Lowercase host of a URL without a leading "www."; '' if it has none."""
+    host = urlsplit((url or '').strip()).hostname or ''
+    return host[len('www.'):] if host.startswith('www.') else host
+
+
+def _tracking_params(host):
+    for site, params in HOST_TRACKING_PARAMS.items():
+        if host == site or host.endswith('.' + site):
+            return TRACKING_PARAMS | params
+    return TRACKING_PARAMS
+
+
+def is_playlist_url(url):
+    """True for YouTube links that name a playlist (a `list` parameter or a /playlist page)."""
+    parts = urlsplit((url or '').strip())
+    host = parts.hostname or ''
+    if not (host == 'youtube.com' or host.endswith('.youtube.com')):
+        return False
+    return parts.path.rstrip('/') == '/playlist' or any(key == 'list' for key, _ in parse_qsl(parts.query))
+
+
+def normalize_url(url, keep_playlist=False):
+    """
+    Canonical form of a URL for duplicate lookups; '' for empty input. A
+    YouTube watch link is reduced to its video id, plus its playlist if
+    `keep_playlist` is set (when the link should stand for the playlist).
+    """
+    url = (url or '').strip()
+    if not url:
+        return ''
+    if '://' not in url:
+        url = 'https://' + url
+    parts = urlsplit(url)
+    host = parts.hostname or ''
+    for prefix in HOST_PREFIXES:
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+            break
+    path = parts.path.rstrip('/')
+    params = parse_qsl(parts.query, keep_blank_values=True)
+
+    if host == 'youtu.be' and path:
+        params.append(('v', path.lstrip('/')))
+        host, path = 'youtube.com', '/watch'
+    elif host in ('youtube.com', 'music.youtube.com') and path.startswith(('/shorts/', '/embed/', '/live/')):
+        params.append(('v', path.split('/')[2]))
+        host, path = 'youtube.com', '/watch'
+    if host == 'youtube.com' and path == '/watch':
+        # Only the video (and playlist) id matter; start times and playlist positions don't
+        kept = ('v', 'list') if keep_playlist else ('v',)
+        params = [(key, value) for key, value in params if key in kept]
+
+    tracking = _tracking_params(host)
+    params = [
+        (key, value) for key, value in params
+        if key.lower() not in tracking and not key.lower().startswith(TRACKING_PREFIXES)
+    ]
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+    return urlunsplit(('https', host, path, urlencode(sorted(params)), ''))
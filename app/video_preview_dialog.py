@@ -6,13 +6,17 @@ from PyQt5.QtWidgets import (
     QSlider, QSpinBox, QProgressBar, QMessageBox, QFileDialog,
     QGroupBox, QRadioButton, QButtonGroup
 )
-from PyQt5.QtCore import Qt, QThread, pyqtSignal, QProcess
-from PyQt5.QtGui import QFont
+from PyQt5.QtCore import Qt, QThread, pyqtSignal, QProcess, QUrl
+from PyQt5.QtGui import QFont, QDesktopServices
 import os
+import shutil
 import subprocess
 import json
 import requests
 
+# Players that start playing an HTTP stream before it is complete, tried in order
+STREAM_PLAYERS = ('mpv', 'vlc')
+
 
 class TrimWorker(QThread):
     """Worker thread for video trimming operations."""
@@ -73,10 +77,11 @@ class TrimWorker(QThread):
 class VideoPreviewDialog(QDialog):
     """Dialog for previewing and trimming videos."""
     
-    def __init__(self, video_path=None, video_url=None, video_duration=None, parent=None):
+    def __init__(self, video_path=None, video_url=None, video_duration=None, stream_url=None, parent=None):
         super().__init__(parent)
         self.video_path = video_path
         self.video_url = video_url
+        self.stream_url = stream_url  # Local HTTP stream of a downloading torrent
         self.video_duration = video_duration or 0
         self.trim_worker = None
         
@@ -101,6 +106,8 @@ class VideoPreviewDialog(QDialog):
         
         if self.video_path:
             self.video_info_label = QLabel(f"<b>File:</b> {os.path.basename(self.video_path)}")
+        elif self.stream_url:
+            self.video_info_label = QLabel(f"<b>Stream:</b> {self.stream_url}")
         elif self.video_url:
             self.video_info_label = QLabel(f"<b>URL:</b> {self.video_url}")
         else:
@@ -195,7 +202,6 @@ class VideoPreviewDialog(QDialog):
         # Trim duration preview
         self.trim_duration_label = QLabel()
         self.trim_duration_label.setStyleSheet("font-weight: bold; color: #4CAF50;")
-        self.update_duration_preview()
         trim_layout.addWidget(self.trim_duration_label)
         
         trim_group.setLayout(trim_layout)
@@ -262,6 +268,9 @@ class VideoPreviewDialog(QDialog):
         
         main_layout.addLayout(buttons_layout)
         
+        # Needs trim_button, which it enables
+        self.update_duration_preview()
+        
         self.setLayout(main_layout)
     
     def format_time(self, seconds):
@@ -295,7 +304,9 @@ class VideoPreviewDialog(QDialog):
     
     def play_video(self):
         """Play the video in system player."""
-        if self.video_path and os.path.exists(self.video_path):
+        if self.stream_url:
+            self.play_stream()
+        elif self.video_path and os.path.exists(self.video_path):
             # Open in default player
             import platform
             system = platform.system()
@@ -318,6 +329,26 @@ class VideoPreviewDialog(QDialog):
                 "Video preview requires a downloaded file. Download the video first to preview it."
             )
     
+    def play_stream(self):
+        """Open the stream in mpv or VLC if installed, otherwise in the default handler of http URLs."""
+        for player in STREAM_PLAYERS:
+            executable = shutil.which(player)
+            if executable:
+                try:
+                    subprocess.Popen([executable, self.stream_url])
+                    self.status_label.setText(f"✓ Stream opened in {player}")
+                    return
+                except OSError:
+                    continue
+        if QDesktopServices.openUrl(QUrl(self.stream_url)):
+            self.status_label.setText("✓ Stream opened in system player")
+        else:
+            QMessageBox.warning(
+                self,
+                "Error",
+                f"Could not open the stream. Open this address in a media player:\n\n{self.stream_url}"
+            )
+    
     def trim_video(self):
         """Trim the video based on selected times."""
         start = self.start_time_spin.value()
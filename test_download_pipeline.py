@@ -0,0 +1,512 @@
+#!/usr/bin/env python3
+"""
+Test script for the download pipeline in UVDM.
+Tests single-pass extraction through the extraction cache, the end of a
+download whose file is already on disk, segmented downloads and their
+resume, the download job journal, the bandwidth governor, the progress
+bus and the thumbnail fetcher.
+"""
+
+import sys
+import os
+import re
+import time
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def serve_bytes(data, ranges=True, delay=0.0):
+    """Serve `data` on a local HTTP server; returns (server, url, request log)."""
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            requests_seen.append(self.headers.get('Range'))
+            time.sleep(delay)
+            match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range') or '')
+            if ranges and match:
+                start, end = int(match.group(1)), int(match.group(2) or len(data) - 1)
+                self.send_response(206)
+                self.send_header('Content-Range', f"bytes {start}-{end}/{len(data)}")
+            else:
+                start, end = 0, len(data) - 1
+                self.send_response(200)
+            self.send_header('Content-Length', str(end - start + 1))
+            self.end_headers()
+            self.wfile.write(data[start:end + 1])
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/file.bin", requests_seen
+
+
+def test_single_pass_extraction():
+    """Test that a URL is extracted once and shared by equivalent links."""
+    print("Testing single-pass extraction...")
+
+    try:
+        from app import extraction_cache
+        from app.extraction_cache import ExtractionCache, extract_info_cached, cache_variant
+        from app.download_worker import history_entry
+
+        class CountingYDL:
+            calls = 0
+
+            def extract_info(self, url, download=False):
+                self.calls += 1
+                return {'id': 'dQw4w9WgXcQ', 'title': 'Video', 'formats': []}
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            previous_cache = extraction_cache._cache
+            extraction_cache._cache = ExtractionCache(os.path.join(tmp_dir, 'cache'))
+            try:
+                ydl = CountingYDL()
+                variant = cache_variant('best')
+                extract_info_cached(ydl, 'https://www.youtube.com/watch?v=dQw4w9WgXcQ', variant=variant)
+                info = extract_info_cached(ydl, 'https://youtu.be/dQw4w9WgXcQ?si=share', variant=variant)
+                info['title'] = 'Changed by the caller'
+                info = extract_info_cached(ydl, 'https://youtu.be/dQw4w9WgXcQ', variant=variant)
+                if ydl.calls == 1 and info['title'] == 'Video':
+                    print("  ✓ Equivalent links were extracted once and served as copies")
+                else:
+                    print(f"  ✗ Extracted {ydl.calls} times, title {info['title']!r}")
+                    return False
+
+                extract_info_cached(ydl, 'https://youtu.be/dQw4w9WgXcQ', variant=cache_variant('flat', flat=True))
+                extract_info_cached(ydl, 'https://youtu.be/dQw4w9WgXcQ', variant=variant, bypass=True)
+                if ydl.calls == 3:
+                    print("  ✓ Other option variants and bypass extract again")
+                else:
+                    print(f"  ✗ Expected 3 extractions, got {ydl.calls}")
+                    return False
+            finally:
+                extraction_cache._cache = previous_cache
+
+            cache = ExtractionCache(os.path.join(tmp_dir, 'cache'))
+            playlist_key = cache.make_key('https://www.youtube.com/playlist?list=PL123', variant)
+            if cache.get('https://youtu.be/dQw4w9WgXcQ', variant) is not None \
+                    and playlist_key != cache.make_key('https://www.youtube.com/watch?v=dQw4w9WgXcQ', variant):
+                print("  ✓ Entries survive on disk and playlists get their own key")
+            else:
+                print("  ✗ Disk entry missing or playlist key collides with the video")
+                return False
+
+            expired = ExtractionCache(os.path.join(tmp_dir, 'cache'), ttl=-1)
+            if expired.get('https://youtu.be/dQw4w9WgXcQ', variant) is None:
+                print("  ✓ Expired entries are not served")
+            else:
+                print("  ✗ Expired entry was served")
+                return False
+
+            video_path = os.path.join(tmp_dir, 'video.mp4')
+            with open(video_path, 'wb') as f:
+                f.write(b'abc')
+            entry = history_entry({'title': 'Video', 'filesize_approx': 9,
+                                   'webpage_url': 'https://www.youtube.com/watch?v=x'}, video_path)
+            if entry['size'] == 3 and entry['file_size'] == 3 and entry['source_site'] == 'youtube.com':
+                print("  ✓ History entries record the size on disk")
+            else:
+                print(f"  ✗ Unexpected history entry: {entry}")
+                return False
+
+    except Exception as e:
+        print(f"  ✗ Single-pass extraction test failed: {e}")
+        return False
+
+    print()
+    return True
+
+
+class WorkerSettings:
+    """The settings a DownloadWorker reads, without the settings tab."""
+
+    def get_playlist_setting(self):
+        return False
+
+    def get_duplicate_policy(self):
+        return 'redownload'
+
+    def get_segmented_download_enabled(self):
+        return False
+
+    def get_download_connections(self):
+        return 1
+
+
+def test_file_already_downloaded():
+    """Test that a download yt-dlp skips because the file exists still ends the job."""
+    print("Testing a download whose file is already on disk...")
+
+    try:
+        from PyQt5.QtCore import QCoreApplication
+        from app import extraction_cache, history_store
+        from app.extraction_cache import ExtractionCache
+        from app.history_store import HistoryStore
+        from app.download_worker import DownloadWorker
+        from app.job_journal import DownloadJobJournal
+
+        app = QCoreApplication.instance() or QCoreApplication([])
+        server, url, _ = serve_bytes(b'video data')
+        url = url.replace('file.bin', 'video.mp4')
+        previous_cache, previous_store = extraction_cache._cache, history_store._store
+        try:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                extraction_cache._cache = ExtractionCache(os.path.join(tmp_dir, 'cache'))
+                history_store._store = HistoryStore(os.path.join(tmp_dir, 'history.db'), os.path.join(tmp_dir, 'none.json'))
+                target = os.path.join(tmp_dir, 'video.mp4')
+                with open(target, 'wb') as f:
+                    f.write(b'video data')
+
+                journal = DownloadJobJournal(os.path.join(tmp_dir, 'journal.jsonl'))
+                journal_id = journal.new_job(url, tmp_dir)
+                worker = DownloadWorker(url, tmp_dir, WorkerSettings(), journal=journal, journal_id=journal_id)
+                signals = []
+                worker.download_finished.connect(lambda title, path: signals.append(('finished', path)))
+                worker.download_failed.connect(lambda failed_url, error: signals.append(('failed', error)))
+                worker.download_cancelled.connect(lambda cancelled_url: signals.append('cancelled'))
+                worker.run()
+                if signals == [('finished', target)] and worker.done:
+                    print("  ✓ The job finished once without a 'finished' progress hook")
+                else:
+                    print(f"  ✗ Unexpected signals: {signals}")
+                    return False
+
+                if journal.unfinished_jobs() == [] and journal.replay()[journal_id]['state'] == 'finished':
+                    print("  ✓ The job was journaled as finished, so it is not resumed at startup")
+                else:
+                    print(f"  ✗ Job is still unfinished in the journal: {journal.unfinished_jobs()}")
+                    return False
+        finally:
+            extraction_cache._cache, history_store._store = previous_cache, previous_store
+            server.shutdown()
+
+    except Exception as e:
+        print(f"  ✗ Already downloaded file test failed: {e}")
+        return False
+
+    print()
+    return True
+
+
+def test_segmented_resume():
+    """Test that a stopped segmented download resumes from its saved segments."""
+    print("Testing segmented download resume...")
+
+    try:
+        from app.segmented_downloader import SegmentedDownloader, SegmentedDownloadError
+
+        data = os.urandom(3 * 1024 * 1024 + 123)
+        server, url, _ = serve_bytes(data)
+        try:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                target = os.path.join(tmp_dir, 'video.mp4')
+                received = []
+
+                def stop_after_a_megabyte(nbytes):
+                    received.append(nbytes)
+                    if sum(received) >= 1024 * 1024:
+                        downloader.stop()
+
+                downloader = SegmentedDownloader(url, target, connections=3, segment_size=512 * 1024,
+                                                 throttle=stop_after_a_megabyte)
+                try:
+                    downloader.download()
+                    print("  ✗ Stopped download finished anyway")
+                    return False
+                except SegmentedDownloadError:
+                    pass
+                if os.path.exists(downloader.state_filename) and not os.path.exists(target):
+                    print("  ✓ Stopped download kept its .part file and segment state")
+                else:
+                    print("  ✗ Segment state was not kept")
+                    return False
+
+                progress = []
+                resumed = SegmentedDownloader(url, target, connections=3, segment_size=512 * 1024,
+                                              progress_callback=progress.append)
+                resumed.download()
+                with open(target, 'rb') as f:
+                    content = f.read()
+                if resumed._resumed_bytes >= 1024 * 1024 and content == data \
+                        and progress[-1]['status'] == 'finished' and not os.path.exists(resumed.state_filename):
+                    print(f"  ✓ Resumed at {resumed._resumed_bytes} bytes and finished with identical content")
+                else:
+                    print(f"  ✗ Resume failed (resumed at {resumed._resumed_bytes}, content equal: {content == data})")
+                    return False
+        finally:
+            server.shutdown()
+
+        server, url, _ = serve_bytes(data, ranges=False)
+        try:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                SegmentedDownloader(url, os.path.join(tmp_dir, 'video.mp4')).download()
+            print("  ✗ Server without range support was accepted")
+            return False
+        except SegmentedDownloadError:
+            print("  ✓ Servers without range support are refused")
+        finally:
+            server.shutdown()
+
+    except Exception as e:
+        print(f"  ✗ Segmented download test failed: {e}")
+        return False
+
+    print()
+    return True
+
+
+def test_journal_replay():
+    """Test that the job journal replays unfinished jobs after a crash."""
+    print("Testing job journal replay...")
+
+    try:
+        from app.job_journal import DownloadJobJournal
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            journal = DownloadJobJournal(os.path.join(tmp_dir, 'journal.jsonl'))
+            done_id = journal.new_job('https://a.com/1', '/downloads')
+            running_id = journal.new_job('https://a.com/2', '/downloads')
+            journal.record(done_id, 'started')
+            journal.record(done_id, 'finished')
+            journal.record(running_id, 'started')
+            journal.record(running_id, 'part_file', filename='/downloads/a.mp4.part')
+            journal.record(running_id, 'part_file', filename='/downloads/a.mp4.part')
+            journal.record(running_id, 'entry_done', playlist_index=1)
+            with open(journal.path, 'a', encoding='utf-8') as f:
+                f.write('{"id": "' + running_id + '", "event": "fini')  # Crash in the middle of a line
+
+            unfinished = journal.unfinished_jobs()
+            if [job['id'] for job in unfinished] == [running_id] and unfinished[0]['state'] == 'started' \
+                    and unfinished[0]['part_files'] == ['/downloads/a.mp4.part'] \
+                    and unfinished[0]['done_entries'] == [1]:
+                print("  ✓ Unfinished job was replayed with its part files and finished entries")
+            else:
+                print(f"  ✗ Unexpected unfinished jobs: {unfinished}")
+                return False
+
+            journal.compact()
+            if list(journal.replay()) == [running_id] and journal.unfinished_jobs()[0]['done_entries'] == [1]:
+                print("  ✓ Compaction kept only the unfinished job")
+            else:
+                print(f"  ✗ Unexpected jobs after compaction: {journal.replay()}")
+                return False
+
+    except Exception as e:
+        print(f"  ✗ Job journal test failed: {e}")
+        return False
+
+    print()
+    return True
+
+
+def test_bandwidth_governor():
+    """Test schedule parsing, weighted shares and the token bucket."""
+    print("Testing bandwidth governor...")
+
+    try:
+        from datetime import datetime
+        from app.bandwidth_governor import BandwidthGovernor, parse_schedule, JOB_TORRENT
+
+        rules = parse_schedule("01:00-07:00=100, 22:00-02:00=50%, 09:00-17:00=0")
+        if rules == [(60, 420, 100), (1320, 120, 50), (540, 1020, 1)]:
+            print("  ✓ Schedule was parsed, percentages clamped to 1-100")
+        else:
+            print(f"  ✗ Unexpected rules: {rules}")
+            return False
+
+        for invalid in ("25:00-07:00=10", "01:00-07:00", "1-7=10"):
+            try:
+                parse_schedule(invalid)
+                print(f"  ✗ Invalid rule accepted: {invalid}")
+                return False
+            except ValueError:
+                pass
+        print("  ✓ Invalid rules were rejected")
+
+        governor = BandwidthGovernor(total_limit=1000, upload_limit=600, schedule=rules)
+        percents = [governor.schedule_percent(datetime(2024, 1, 1, hour, 30)) for hour in (23, 0, 3, 12, 18)]
+        if percents == [50, 50, 100, 1, 100]:
+            print("  ✓ Rules apply by time of day, including across midnight")
+        else:
+            print(f"  ✗ Unexpected percentages: {percents}")
+            return False
+
+        governor.set_schedule([])
+        governor.register('http:1', weight=1.0)
+        governor.register('http:2', weight=3.0)
+        governor.register('torrent:1', weight=1.0, kind=JOB_TORRENT)
+        shares = [governor.rate_for('http:1'), governor.rate_for('http:2'), governor.upload_rate_for('torrent:1')]
+        if shares == [200.0, 600.0, 600.0] and governor.rate_for('unknown') == 0:
+            print("  ✓ Download shares follow the weights, uploads go to torrents only")
+        else:
+            print(f"  ✗ Unexpected shares: {shares}")
+            return False
+
+        governor = BandwidthGovernor(total_limit=1000 * 1000)
+        governor.register('http:1')
+        start = time.monotonic()
+        for _ in range(4):
+            governor.throttle('http:1', 100 * 1000)
+        elapsed = time.monotonic() - start
+        if 0.3 <= elapsed < 1.0:
+            print(f"  ✓ 400 KB at 1 MB/s took {elapsed:.2f} s")
+        else:
+            print(f"  ✗ Token bucket took {elapsed:.2f} s for 400 KB at 1 MB/s")
+            return False
+
+    except Exception as e:
+        print(f"  ✗ Bandwidth governor test failed: {e}")
+        return False
+
+    print()
+    return True
+
+
+def test_progress_bus():
+    """Test that progress updates are coalesced into one snapshot per tick."""
+    print("Testing progress bus...")
+
+    try:
+        from PyQt5.QtCore import QCoreApplication
+        from app.progress_bus import ProgressBus
+
+        app = QCoreApplication.instance() or QCoreApplication([])
+        bus = ProgressBus(interval_ms=60 * 60 * 1000)
+        snapshots = []
+        bus.snapshot_ready.connect(snapshots.append)
+
+        bus.update('job:1', percent=10.0, speed=100)
+        bus.update('job:1', percent=20.0)
+        bus.update('job:2', percent=5.0)
+        bus.publish()
+        if snapshots == [{'job:1': {'percent': 20.0, 'speed': 100}, 'job:2': {'percent': 5.0}}]:
+            print("  ✓ Updates between ticks were merged into one snapshot")
+        else:
+            print(f"  ✗ Unexpected snapshots: {snapshots}")
+            return False
+
+        bus.update('job:1', percent=100.0)
+        bus.remove('job:1')
+        bus.publish()
+        bus.publish()
+        if snapshots[1:] == [{'job:1': {'percent': 100.0, 'speed': 100}}] and bus.get('job:1') is None \
+                and bus.get('job:2') == {'percent': 5.0}:
+            print("  ✓ A removed job's final state was published once, unchanged jobs were not")
+        else:
+            print(f"  ✗ Unexpected snapshots after removal: {snapshots[1:]}")
+            return False
+
+    except Exception as e:
+        print(f"  ✗ Progress bus test failed: {e}")
+        return False
+
+    print()
+    return True
+
+
+def test_thumbnail_fetcher():
+    """Test that thumbnails are fetched once per video in the background."""
+    print("Testing thumbnail fetcher...")
+
+    try:
+        from app.thumbnail_fetcher import ThumbnailFetcher, thumbnail_key
+
+        if thumbnail_key({'id': 'a/b', 'extractor_key': 'Youtube'}) == 'Youtube_a_b' \
+                and thumbnail_key({'title': 'My: video?'}) == 'My__video_':
+            print("  ✓ Thumbnail keys are safe file names")
+        else:
+            print("  ✗ Unexpected thumbnail keys")
+            return False
+
+        server, url, requests_seen = serve_bytes(b'\xff\xd8 image', delay=0.2)
+        try:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                fetcher = ThumbnailFetcher(thumbnail_dir=tmp_dir)
+                info = {'id': 'abc', 'extractor_key': 'Youtube', 'thumbnail': url}
+                done = []
+                finished = threading.Event()
+
+                def on_done(path):
+                    done.append(path)
+                    if len(done) == 2:
+                        finished.set()
+
+                fetcher.fetch(info, on_done)
+                fetcher.fetch(dict(info), on_done)
+                finished.wait(10)
+                if len(requests_seen) == 1 and done == [fetcher.path_for(info)] * 2:
+                    print("  ✓ Concurrent requests for one video shared a single download")
+                else:
+                    print(f"  ✗ {len(requests_seen)} requests, callbacks: {done}")
+                    return False
+
+                fetcher.fetch(info, done.append)
+                if len(requests_seen) == 1 and len(done) == 3 and not fetcher.fetch({'id': 'x'}):
+                    print("  ✓ Images on disk are not fetched again, entries without a thumbnail are skipped")
+                else:
+                    print("  ✗ Thumbnail was fetched again")
+                    return False
+                fetcher.shutdown(wait=True)
+        finally:
+            server.shutdown()
+
+    except Exception as e:
+        print(f"  ✗ Thumbnail fetcher test failed: {e}")
+        return False
+
+    print()
+    return True
+
+
+def main():
+    """Run all tests."""
+    print("="*60)
+    print("UVDM Download Pipeline Test Suite")
+    print("="*60)
+    print()
+
+    results = []
+
+    # Run tests
+    results.append(("Single-Pass Extraction", test_single_pass_extraction()))
+    results.append(("File Already Downloaded", test_file_already_downloaded()))
+    results.append(("Segmented Resume", test_segmented_resume()))
+    results.append(("Job Journal Replay", test_journal_replay()))
+    results.append(("Bandwidth Governor", test_bandwidth_governor()))
+    results.append(("Progress Bus", test_progress_bus()))
+    results.append(("Thumbnail Fetcher", test_thumbnail_fetcher()))
+
+    # Summary
+    print("="*60)
+    print("Test Summary")
+    print("="*60)
+
+    passed = sum(1 for _, result in results if result)
+    total = len(results)
+
+    for test_name, result in results:
+        status = "✓ PASS" if result else "✗ FAIL"
+        print(f"{test_name:30s} {status}")
+
+    print()
+    print(f"Total: {passed}/{total} tests passed")
+    print()
+
+    if passed == total:
+        print("🎉 All tests passed!")
+        return 0
+    else:
+        print("⚠️  Some tests failed. Please review the output above.")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Test script for the download scheduler in UVDM.
+Tests global and per-host concurrency limits, priority ordering and
+starting jobs on the scheduler's thread when slots are freed elsewhere.
+"""
+
+import sys
+import os
+import time
+import threading
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def test_global_and_host_limits():
+    """Test that the scheduler never exceeds its concurrency limits."""
+    print("Testing concurrency limits...")
+
+    try:
+        from app.download_manager import DownloadScheduler
+
+        scheduler = DownloadScheduler(max_concurrent=2, max_per_host=1)
+        started = []
+        urls = ['https://a.com/1', 'https://a.com/2', 'https://b.com/1', 'https://c.com/1']
+        for url in urls:
+            scheduler.submit(url, started.append)
+
+        if started == [1, 3]:
+            print("  ✓ Only one job per host and two jobs in total were started")
+        else:
+            print(f"  ✗ Unexpected started jobs: {started}")
+            return False
+
+        if scheduler.active_count() == 2 and scheduler.queued_count() == 2:
+            print("  ✓ Active and queued counts are correct")
+        else:
+            print("  ✗ Active or queued count is wrong")
+            return False
+
+        scheduler.job_done(1)
+        if started == [1, 3, 2]:
+            print("  ✓ Freed host slot was given to the next job of that host")
+        else:
+            print(f"  ✗ Unexpected started jobs after completion: {started}")
+            return False
+
+    except Exception as e:
+        print(f"  ✗ Concurrency limit test failed: {e}")
+        return False
+
+    print()
+    return True
+
+
+def test_priority_ordering():
+    """Test that higher priority jobs are started before older ones."""
+    print("Testing priority ordering...")
+
+    try:
+        from app.download_manager import DownloadScheduler, PRIORITY_HIGH
+
+        scheduler = DownloadScheduler(max_concurrent=1, max_per_host=1)
+        started = []
+        scheduler.submit('https://a.com/1', started.append)
+        scheduler.submit('https://b.com/1', started.append)
+        high_job = scheduler.submit('https://c.com/1', started.append, priority=PRIORITY_HIGH)
+        scheduler.job_done(1)
+
+        if started == [1, high_job]:
+            print("  ✓ High priority job jumped the queue")
+        else:
+            print(f"  ✗ Unexpected start order: {started}")
+            return False
+
+        if scheduler.cancel(2) and scheduler.get_job(2) is None and scheduler.queued_count() == 0:
+            print("  ✓ Queued job was cancelled and dropped from the registry")
+        else:
+            print("  ✗ Queued job could not be cancelled")
+            return False
+
+        scheduler.job_done(1)
+        scheduler.job_done(high_job)
+        if not scheduler.jobs and scheduler.active_count() == 0 and not scheduler.cancel(2):
+            print("  ✓ Finished jobs were dropped from the registry")
+        else:
+            print(f"  ✗ Registry still holds jobs: {sorted(scheduler.jobs)}")
+            return False
+
+    except Exception as e:
+        print(f"  ✗ Priority ordering test failed: {e}")
+        return False
+
+    print()
+    return True
+
+
+def test_start_on_scheduler_thread():
+    """Test that a slot freed on a worker thread starts the next job on the scheduler's thread."""
+    print("Testing start callbacks across threads...")
+
+    try:
+        from PyQt5.QtCore import QCoreApplication
+        from app.download_manager import DownloadScheduler
+
+        app = QCoreApplication.instance() or QCoreApplication([])
+        scheduler = DownloadScheduler(max_concurrent=1, max_per_host=1)
+        started = []
+        scheduler.submit('https://a.com/1', lambda job_id: started.append((job_id, threading.current_thread())))
+        scheduler.submit('https://b.com/1', lambda job_id: started.append((job_id, threading.current_thread())))
+
+        worker = threading.Thread(target=scheduler.job_done, args=(1,))
+        worker.start()
+        worker.join()
+        if len(started) == 1 and scheduler.active_count() == 0:
+            print("  ✓ The freed slot was not used from the worker thread")
+        else:
+            print(f"  ✗ Unexpected start callbacks: {started}")
+            return False
+
+        deadline = time.monotonic() + 5
+        while len(started) < 2 and time.monotonic() < deadline:
+            app.processEvents()
+            time.sleep(0.01)
+        if started[1:] == [(2, threading.main_thread())] and scheduler.active_count() == 1:
+            print("  ✓ The next job was started on the scheduler's thread")
+        else:
+            print(f"  ✗ Unexpected start callbacks: {started}")
+            return False
+
+    except Exception as e:
+        print(f"  ✗ Cross-thread start test failed: {e}")
+        return False
+
+    print()
+    return True
+
+
+def main():
+    """Run all tests."""
+    print("="*60)
+    print("UVDM Download Scheduler Test Suite")
+    print("="*60)
+    print()
+
+    results = []
+
+    # Run tests
+    results.append(("Concurrency Limits", test_global_and_host_limits()))
+    results.append(("Priority Ordering", test_priority_ordering()))
+    results.append(("Cross-Thread Start", test_start_on_scheduler_thread()))
+
+    # Summary
+    print("="*60)
+    print("Test Summary")
+    print("="*60)
+
+    passed = sum(1 for _, result in results if result)
+    total = len(results)
+
+    for test_name, result in results:
+        status = "✓ PASS" if result else "✗ FAIL"
+        print(f"{test_name:30s} {status}")
+
+    print()
+    print(f"Total: {passed}/{total} tests passed")
+    print()
+
+    if passed == total:
+        print("🎉 All tests passed!")
+        return 0
+    else:
+        print("⚠️  Some tests failed. Please review the output above.")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,494 @@
+#!/usr/bin/env python3
+"""
+Test script for the download history store in UVDM.
+Tests appends, indexed lookups, updates, search, the one-time JSON migration,
+the history statistics aggregates, reconciliation with the files on disk,
+duplicate detection, cached media metadata and history sorting.
+"""
+
+import sys
+import os
+import json
+import tempfile
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def test_add_update_delete():
+    """Test appending, looking up, updating and deleting history entries."""
+    print("Testing history entries...")
+
+    try:
+        from app.history_store import HistoryStore
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = HistoryStore(os.path.join(tmp_dir, 'history.db'), legacy_json_path=None)
+            entry_id = store.add({
+                "title": "Video", "path": "/videos/a.mp4", "size": 1024, "url": "https://a.com/v",
+                "video_id": "abc", "extractor": "Generic", "thumbnail": "", "custom": "kept",
+            })
+            store.add({"title": "Other", "path": "/videos/b.mp4", "size": None, "url": "https://a.com/w"})
+
+            entry = store.get(entry_id)
+            if store.count() == 2 and entry['custom'] == "kept" and entry['size'] == 1024:
+                print("  ✓ Entries were stored with their extra fields")
+            else:
+                print(f"  ✗ Unexpected stored entry: {entry}")
+                return False
+
+            if [e['id'] for e in store.find_by_video_id("abc", "Generic")] == [entry_id] \
+                    and len(store.find_by_url("https://a.com/w")) == 1:
+                print("  ✓ Lookups by video id and URL work")
+            else:
+                print("  ✗ Lookup returned the wrong entries")
+                return False
+
+            store.update(entry_id, thumbnail="/thumbs/abc.jpg")
+            store.update_path("/videos/a.mp4", "/videos/renamed.mp4", title="Renamed")
+            entry = store.get(entry_id)
+            if entry['thumbnail'] == "/thumbs/abc.jpg" and entry['path'] == "/videos/renamed.mp4" \
+                    and entry['title'] == "Renamed":
+                print("  ✓ Entries were updated in place")
+            else:
+                print(f"  ✗ Unexpected updated entry: {entry}")
+                return False
+
+            if store.delete_by_path("/videos/b.mp4") == 1 and store.count() == 1:
+                print("  ✓ Entry was deleted by path")
+            else:
+                print("  ✗ Entry could not be deleted")
+                return False
+
+    except Exception as e:
+        print(f"  ✗ History entry test failed: {e}")
+        return False
+
+    print()
+    return True
+
+
+def test_json_migration():
+    """Test that downloads.json is imported exactly once."""
+    print("Testing JSON migration...")
+
+    try:
+        from app.history_store import HistoryStore
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            json_path = os.path.join(tmp_dir, 'downloads.json')
+            db_path = os.path.join(tmp_dir, 'history.db')
+            with open(json_path, 'w', encoding='utf-8') as f:
+                json.dump([{"title": f"Video {i}", "path": f"/videos/{i}.mp4", "size": i} for i in range(3)], f)
+
+            store = HistoryStore(db_path, legacy_json_path=json_path)
+            if store.count() == 3:
+                print("  ✓ Existing history was imported")
+            else:
+                print(f"  ✗ Expected 3 imported entries, found {store.count()}")
+                return False
+
+            store = HistoryStore(db_path, legacy_json_path=json_path)
+            if store.count() == 3:
+                print("  ✓ History was not imported a second time")
+            else:
+                print(f"  ✗ History was imported again ({store.count()} entries)")
+                return False
+
+    except Exception as e:
+        print(f"  ✗ JSON migration test failed: {e}")
+        return False
+
+    print()
+    return True
+
+
+def test_search():
+    """Test full-text search with field and size filters."""
+    print("Testing history search...")
+
+    try:
+        from app.history_store import HistoryStore
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = HistoryStore(os.path.join(tmp_dir, 'history.db'), legacy_json_path=None)
+            cats = store.add({"title": "Funny cats compilation", "path": "/videos/cats.mp4",
+                              "size": 2 * 1024 ** 3, "source_site": "youtube.com"})
+            dogs = store.add({"title": "Dogs at the beach", "path": "/videos/dogs.mp4",
+                              "size": 300 * 1024 ** 2, "source_site": "vimeo.com"})
+
+            checks = [
+                ("cat", [cats]),
+                ("source:youtube", [cats]),
+                ("source:youtube dogs", []),
+                ("size>1GB", [cats]),
+                ("videos size<1GB", [dogs]),
+            ]
+            for query, expected in checks:
+                result = sorted(store.search(query))
+                if result != expected:
+                    print(f"  ✗ Query '{query}' returned {result}, expected {expected}")
+                    return False
+            print("  ✓ Prefix, field and size queries matched the right entries")
+
+            store.update(dogs, title="Puppies at the beach")
+            if store.search("puppies") == [dogs] and store.search("title:dogs") == []:
+                print("  ✓ Search index followed an updated title")
+            else:
+                print("  ✗ Search index was not updated")
+                return False
+
+    except Exception as e:
+        print(f"  ✗ History search test failed: {e}")
+        return False
+
+    print()
+    return True
+
+
+def test_aggregates():
+    """Test running and filtered per-site/per-day aggregates."""
+    print("Testing history aggregates...")
+
+    try:
+        from app.history_stats import HistoryAggregates
+
+        gb = 1024 ** 3
+        aggregates = HistoryAggregates()
+        aggregates.reset([
+            {"id": 1, "path": "/v/a.mp4", "size": 2 * gb, "source_site": "youtube.com",
+             "download_date": "2026-01-01 10:00:00"},
+            {"id": 2, "path": "/v/b.mkv", "size": 1 * gb, "source_site": "youtube.com",
+             "download_date": "2026-01-02 10:00:00"},
+            {"id": 3, "path": "/v/c.mp4", "size": None, "source_site": "vimeo.com",
+             "download_date": "2026-01-02 11:00:00"},
+        ])
+        aggregates.add({"id": 2, "path": "/v/b.mkv", "size": 3 * gb, "source_site": "vimeo.com",
+                        "download_date": "2026-01-02 10:00:00"})
+        aggregates.remove(3)
+
+        summary = aggregates.summary()
+        if summary['count'] == 2 and summary['bytes'] == 5 * gb \
+                and summary['site_day'] == {("youtube.com", "2026-01-01"): (1, 2 * gb),
+                                            ("vimeo.com", "2026-01-02"): (1, 3 * gb)} \
+                and summary['by_format'] == {"mp4": (1, 2 * gb), "mkv": (1, 3 * gb)}:
+            print("  ✓ Running aggregates followed updates and removals")
+        else:
+            print(f"  ✗ Unexpected aggregates: {summary}")
+            return False
+
+        filtered = aggregates.summary({2, 3})
+        if aggregates.totals({2, 3}) == (1, 3 * gb) and filtered['by_site'] == {"vimeo.com": (1, 3 * gb)}:
+            print("  ✓ Filtered aggregates only counted matching entries")
+        else:
+            print(f"  ✗ Unexpected filtered aggregates: {filtered}")
+            return False
+
+    except Exception as e:
+        print(f"  ✗ History aggregates test failed: {e}")
+        return False
+
+    print()
+    return True
+
+
+def test_reconcile():
+    """Test that a scan flags missing and resized files and finds untracked media."""
+    print("Testing history reconciliation...")
+
+    try:
+        from app.history_store import HistoryStore, FILE_MISSING, FILE_RESIZED
+        from app.history_scanner import ReconcileWorker
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = HistoryStore(os.path.join(tmp_dir, 'history.db'), legacy_json_path=None)
+            for name, content in (("kept.mp4", b"1234"), ("changed.mp4", b"12"), ("estimated.mp4", b"123"),
+                                  ("untracked.mkv", b"1")):
+                with open(os.path.join(tmp_dir, name), 'wb') as f:
+                    f.write(content)
+            kept = store.add({"title": "Kept", "path": os.path.join(tmp_dir, "kept.mp4"), "size": 4, "file_size": 4})
+            changed = store.add({"title": "Changed", "path": os.path.join(tmp_dir, "changed.mp4"), "size": 4,
+                                 "file_size": 4})
+            gone = store.add({"title": "Gone", "path": os.path.join(tmp_dir, "gone.mp4"), "size": 4, "file_size": 4})
+            # Only yt-dlp's estimate is known: not a resize, the size on disk becomes the reference
+            estimated = store.add({"title": "Estimated", "path": os.path.join(tmp_dir, "estimated.mp4"), "size": 9})
+
+            results = []
+            worker = ReconcileWorker(store)
+            worker.finished.connect(lambda folders, result: results.append(result))
+            worker.scan(None)
+
+            states = {entry_id: store.get(entry_id).get('file_state') for entry_id in (kept, changed, gone, estimated)}
+            if states == {kept: None, changed: FILE_RESIZED, gone: FILE_MISSING, estimated: None} \
+                    and store.get(estimated)['file_size'] == 3:
+                print("  ✓ Missing and resized files were flagged")
+            else:
+                print(f"  ✗ Unexpected file states: {states}")
+                return False
+
+            untracked = [os.path.basename(path) for items in results[0].untracked.values() for path, _, _ in items]
+            if untracked == ["untracked.mkv"]:
+                print("  ✓ Untracked media file was found")
+            else:
+                print(f"  ✗ Unexpected untracked files: {untracked}")
+                return False
+
+    except Exception as e:
+        print(f"  ✗ History reconciliation test failed: {e}")
+        return False
+
+    print()
+    return True
+
+
+def test_duplicates():
+    """Test that other links to a downloaded video are recognised as duplicates."""
+    print("Testing duplicate detection...")
+
+    try:
+        from app.history_store import HistoryStore
+        from app.duplicate_check import DuplicateChecker, POLICY_SKIP, POLICY_REDOWNLOAD
+        from app.url_utils import normalize_url, site_host
+
+        if normalize_url("https://youtu.be/abc?si=xyz") == normalize_url("https://www.youtube.com/watch?v=abc&t=10") \
+                and normalize_url("https://a.com/v?id=1&utm_source=x") == normalize_url("http://a.com/v/?id=1"):
+            print("  ✓ Equivalent URLs normalize to the same key")
+        else:
+            print("  ✗ Equivalent URLs were normalized differently")
+            return False
+
+        if normalize_url("https://a.com/v?source=1") != normalize_url("https://a.com/v?source=2") \
+                and normalize_url("https://youtube.com/watch?v=abc&list=PL1", keep_playlist=True) \
+                != normalize_url("https://youtube.com/watch?v=abc"):
+            print("  ✓ Content parameters of unknown sites and playlist ids were kept")
+        else:
+            print("  ✗ Different pages were normalized to the same key")
+            return False
+
+        if site_host("https://www.youtube.com/watch") == "youtube.com" and site_host("https://awww.example.com") == "awww.example.com":
+            print("  ✓ Only a leading www. was removed from hosts")
+        else:
+            print("  ✗ Hosts were shortened wrongly")
+            return False
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = HistoryStore(os.path.join(tmp_dir, 'history.db'), legacy_json_path=None)
+            path = os.path.join(tmp_dir, "video.mp4")
+            with open(path, 'wb') as f:
+                f.write(b"video")
+            store.add({"title": "Video", "path": path, "url": "https://www.youtube.com/watch?v=abc",
+                       "video_id": "abc", "extractor": "Youtube"})
+            store.add({"title": "Gone", "path": os.path.join(tmp_dir, "gone.mp4"), "url": "https://a.com/gone"})
+
+            checker = DuplicateChecker(POLICY_SKIP, store=store)
+            found = [
+                checker.find(url="https://youtu.be/abc"),
+                checker.find(info={"id": "abc", "extractor_key": "Youtube", "webpage_url": "https://other.com"}),
+            ]
+            if all(entry and entry['title'] == "Video" for entry in found) \
+                    and checker.find(url="https://a.com/gone") is None \
+                    and DuplicateChecker(POLICY_REDOWNLOAD, store=store).find(url="https://youtu.be/abc") is None:
+                print("  ✓ Duplicates were found by URL and video id, missing files were ignored")
+            else:
+                print(f"  ✗ Unexpected duplicate lookups: {found}")
+                return False
+
+            playlist_url = "https://www.youtube.com/watch?v=abc&list=PL1"
+            if checker.find(url=playlist_url) is None \
+                    and DuplicateChecker(POLICY_SKIP, store=store, playlists=False).find(url=playlist_url):
+                print("  ✓ A playlist link was not taken for its first video")
+            else:
+                print("  ✗ A playlist link was taken for its first video")
+                return False
+
+            if checker.handle(found[0], tmp_dir) == path and checker.skipped == 1:
+                print("  ✓ Skipped duplicate was counted")
+            else:
+                print("  ✗ Skipped duplicate was not counted")
+                return False
+
+    except Exception as e:
+        print(f"  ✗ Duplicate detection test failed: {e}")
+        return False
+
+    print()
+    return True
+
+
+def test_media_probe():
+    """Test ffprobe output parsing and metadata served from the history cache."""
+    print("Testing media probe...")
+
+    try:
+        from app.history_store import HistoryStore
+        from app.media_probe import MediaProbe, parse_ffprobe, probe_key
+
+        output = json.dumps({
+            "format": {"duration": "61.5", "bit_rate": "800000"},
+            "streams": [
+                {"codec_type": "video", "codec_name": "mjpeg", "disposition": {"attached_pic": 1}},
+                {"codec_type": "video", "codec_name": "h264", "width": 1920, "height": 1080},
+                {"codec_type": "audio", "codec_name": "aac"},
+            ],
+        })
+        fields = parse_ffprobe(output)
+        if fields == {"duration": 61.5, "width": 1920, "height": 1080, "video_codec": "h264",
+                      "audio_codec": "aac", "bitrate": 800000}:
+            print("  ✓ ffprobe output was parsed, cover art ignored")
+        else:
+            print(f"  ✗ Unexpected probe fields: {fields}")
+            return False
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = HistoryStore(os.path.join(tmp_dir, 'history.db'), legacy_json_path=None)
+            path = os.path.join(tmp_dir, "video.mp4")
+            with open(path, 'wb') as f:
+                f.write(b"video")
+            store.add(dict(fields, title="Video", path=path, size=5, probe_key=probe_key(path)))
+            probe = MediaProbe(store=store)
+            probe.available = False  # Answered from the cache, ffprobe must not be needed
+            if probe.duration(path) == 61.5 and probe.metadata(path)['video_codec'] == "h264":
+                print("  ✓ Metadata of an unchanged file came from the history")
+            else:
+                print(f"  ✗ Unexpected cached metadata: {probe.metadata(path)}")
+                return False
+
+            # A probe must not overwrite the recorded size, or the scanner could not see the file change
+            resized = store.add({"title": "Resized", "path": path, "size": 999, "file_size": 999})
+            MediaProbe(store=store)._probe_entry(resized, path)
+            if store.get(resized)['size'] == 999 and store.get(resized)['file_size'] == 999:
+                print("  ✓ Probing left the recorded sizes alone")
+            else:
+                print(f"  ✗ Probing changed the recorded size: {store.get(resized)}")
+                return False
+
+            # The GUI thread never waits for ffprobe: a stale entry is probed in the background
+            stale = store.add({"title": "Stale", "path": path, "size": 5, "probe_key": "0:0"})
+            probe = MediaProbe(store=store)
+            probe.available = True
+            probe.probe_file = lambda probed_path: {"duration": 3.0, "probe_key": probe_key(probed_path)}
+            cached = probe.cached_metadata(store.get(stale))
+            probe.executor.shutdown(wait=True)
+            if cached is None and store.get(stale)['duration'] == 3.0 \
+                    and probe.cached_metadata(store.get(stale))['duration'] == 3.0:
+                print("  ✓ A stale entry was probed in the background and then served from the history")
+            else:
+                print(f"  ✗ Unexpected background probe result: {cached}, {store.get(stale)}")
+                return False
+
+    except Exception as e:
+        print(f"  ✗ Media probe test failed: {e}")
+        return False
+
+    print()
+    return True
+
+
+def test_sort_order():
+    """Test numeric size sorting with an earlier sort column breaking ties."""
+    print("Testing history sorting...")
+
+    try:
+        from PyQt5.QtCore import Qt
+        from app.history_model import HistoryTableModel, SORT_ROLE, SIZE_COLUMN, SOURCE_COLUMN, DATE_COLUMN
+
+        model = HistoryTableModel()
+        model.set_entries([
+            {"id": 1, "title": "A", "path": "/v/a.mp4", "size": 9 * 1024 ** 2, "source_site": "b.com"},
+            {"id": 2, "title": "B", "path": "/v/b.mp4", "size": 12 * 1024 ** 2, "source_site": "b.com"},
+            {"id": 3, "title": "C", "path": "/v/c.mp4", "size": 9 * 1024 ** 2, "source_site": "a.com"},
+            {"id": 4, "title": "D", "path": "/v/d.mp4", "size": None, "source_site": "a.com"},
+        ])
+        model.sort(SOURCE_COLUMN, Qt.AscendingOrder)
+        model.sort(SIZE_COLUMN, Qt.DescendingOrder)
+        titles = [model.index(row, 0).data() for row in range(model.rowCount())]
+        sizes = [model.index(row, SIZE_COLUMN).data(SORT_ROLE) for row in range(model.rowCount())]
+        # "12.00 MB" sorts below "9.00 MB" as text; sizes must compare as numbers
+        if titles == ["B", "C", "A", "D"] and sizes[-1] == -1:
+            print("  ✓ Largest files first, ties ordered by source")
+        else:
+            print(f"  ✗ Unexpected order: {titles}")
+            return False
+
+        if model.sort_columns() == [(SIZE_COLUMN, Qt.DescendingOrder), (SOURCE_COLUMN, Qt.AscendingOrder)]:
+            print("  ✓ Sort columns were recorded for saving")
+        else:
+            print(f"  ✗ Unexpected sort columns: {model.sort_columns()}")
+            return False
+
+        # The header's "no column" indicator and the current order must not re-sort
+        model.sort(-1, Qt.AscendingOrder)
+        model.sort(SIZE_COLUMN, Qt.DescendingOrder)
+        if model.sort_columns() == [(SIZE_COLUMN, Qt.DescendingOrder), (SOURCE_COLUMN, Qt.AscendingOrder)]:
+            print("  ✓ Sorting again by the current order changes nothing")
+        else:
+            print(f"  ✗ Sort columns changed: {model.sort_columns()}")
+            return False
+
+        model = HistoryTableModel()
+        model.set_entries([
+            {"id": 1, "title": "Old", "path": "/v/a.mp4", "download_date": "2023-12-31 23:59:59"},
+            {"id": 2, "title": "New", "path": "/v/b.mp4", "download_date": "2024-01-01 00:00:00"},
+            {"id": 3, "title": "None", "path": "/v/c.mp4", "download_date": None},
+        ])
+        model.sort(DATE_COLUMN, Qt.DescendingOrder)
+        titles = [model.index(row, 0).data() for row in range(model.rowCount())]
+        if titles == ["New", "Old", "None"] and isinstance(model.index(0, DATE_COLUMN).data(SORT_ROLE), float):
+            print("  ✓ Download dates sort by time, unknown dates last")
+        else:
+            print(f"  ✗ Unexpected date order: {titles}")
+            return False
+
+    except Exception as e:
+        print(f"  ✗ History sorting test failed: {e}")
+        return False
+
+    print()
+    return True
+
+
+def main():
+    """Run all tests."""
+    print("="*60)
+    print("UVDM History Store Test Suite")
+    print("="*60)
+    print()
+
+    results = []
+
+    # Run tests
+    results.append(("History Entries", test_add_update_delete()))
+    results.append(("JSON Migration", test_json_migration()))
+    results.append(("History Search", test_search()))
+    results.append(("History Aggregates", test_aggregates()))
+    results.append(("History Reconciliation", test_reconcile()))
+    results.append(("Duplicate Detection", test_duplicates()))
+    results.append(("Media Probe", test_media_probe()))
+    results.append(("History Sorting", test_sort_order()))
+
+    # Summary
+    print("="*60)
+    print("Test Summary")
+    print("="*60)
+
+    passed = sum(1 for _, result in results if result)
+    total = len(results)
+
+    for test_name, result in results:
+        status = "✓ PASS" if result else "✗ FAIL"
+        print(f"{test_name:30s} {status}")
+
+    print()
+    print(f"Total: {passed}/{total} tests passed")
+    print()
+
+    if passed == total:
+        print("🎉 All tests passed!")
+        return 0
+    else:
+        print("⚠️  Some tests failed. Please review the output above.")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Test script for the download history views in UVDM.
+Tests incremental row updates of the history model, the thumbnail cache
+variants and the grid view's cell sizing.
+"""
+
+import sys
+import os
+import time
+import tempfile
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+_app = None
+
+
+def get_app():
+    """The QApplication pixmaps and widgets need; kept alive for the whole run."""
+    global _app
+    from PyQt5.QtWidgets import QApplication
+    if _app is None:
+        _app = QApplication.instance() or QApplication([])
+    return _app
+
+
+def process_events_until(condition, timeout=10):
+    """Run the Qt event loop until condition() is true; returns its last value."""
+    app = get_app()
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        app.processEvents()
+        time.sleep(0.01)
+    return condition()
+
+
+def test_incremental_updates():
+    """Test that inserts, updates and removals change single rows without a reset."""
+    print("Testing incremental history updates...")
+
+    try:
+        from PyQt5.QtCore import Qt
+        from app.history_model import HistoryTableModel, SIZE_COLUMN
+
+        model = HistoryTableModel()
+        model.set_entries([
+            {"id": 1, "title": "A", "path": "/v/a.mp4", "size": 100},
+            {"id": 2, "title": "B", "path": "/v/b.mp4", "size": 300},
+            {"id": 3, "title": "Notes", "path": "/v/notes.txt", "size": 1},
+        ])
+        model.sort(SIZE_COLUMN, Qt.AscendingOrder)
+        signals = []
+        model.modelReset.connect(lambda: signals.append('reset'))
+        model.rowsInserted.connect(lambda parent, first, last: signals.append(('inserted', first)))
+        model.rowsRemoved.connect(lambda parent, first, last: signals.append(('removed', first)))
+        model.dataChanged.connect(lambda top_left, bottom_right: signals.append(('changed', top_left.row())))
+
+        def titles():
+            return [model.index(row, 0).data() for row in range(model.rowCount())]
+
+        model.insert_entries([{"id": 4, "title": "C", "path": "/v/c.mp4", "size": 200}])
+        if titles() == ["A", "C", "B"] and signals == [('inserted', 1)]:
+            print("  ✓ New entry was inserted at its sorted row")
+        else:
+            print(f"  ✗ Unexpected rows {titles()} or signals {signals}")
+            return False
+
+        signals.clear()
+        model.update_entries([{"id": 4, "title": "C", "path": "/v/c.mp4", "size": 200, "thumbnail": "/t.jpg"}])
+        model.update_entries([{"id": 1, "title": "A", "path": "/v/a.mp4", "size": 400}])
+        if titles() == ["C", "B", "A"] and signals == [('changed', 1), ('removed', 0), ('inserted', 2)]:
+            print("  ✓ Changed entries were repainted in place or moved to their new row")
+        else:
+            print(f"  ✗ Unexpected rows {titles()} or signals {signals}")
+            return False
+
+        model.set_filter_ids({2, 4})
+        signals.clear()
+        model.insert_entries([{"id": 5, "title": "D", "path": "/v/d.mp4", "size": 50}], matching_ids=set())
+        model.remove_ids([2, 3])
+        if titles() == ["C"] and signals == [('removed', 1)] and model.aggregates.totals() == (3, 650):
+            print("  ✓ Filtered views hide non-matching entries; totals still count them")
+        else:
+            print(f"  ✗ Unexpected rows {titles()}, signals {signals} or statistics {model.statistics()}")
+            return False
+
+    except Exception as e:
+        print(f"  ✗ Incremental update test failed: {e}")
+        return False
+
+    print()
+    return True
+
+
+def test_thumbnail_cache():
+    """Test that thumbnails are decoded once per variant, off the GUI thread."""
+    print("Testing thumbnail cache...")
+
+    try:
+        get_app()
+        from PyQt5.QtGui import QImage, QColor
+        from app.thumbnail_cache import ThumbnailCache, variant_width, variant_path
+
+        if [variant_width(width) for width in (100, 160, 161, 300, 900)] == [160, 160, 320, 320, 320]:
+            print("  ✓ Cells use the smallest variant at least as wide as they are")
+        else:
+            print("  ✗ Unexpected variant widths")
+            return False
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            source = os.path.join(tmp_dir, 'thumb.jpg')
+            image = QImage(1280, 720, QImage.Format_RGB32)
+            image.fill(QColor('red'))
+            image.save(source, 'JPG')
+            cache_dir = os.path.join(tmp_dir, 'cache')
+            cache = ThumbnailCache(cache_dir=cache_dir)
+            ready = []
+            cache.thumbnail_ready.connect(ready.append)
+
+            if cache.pixmap(source, 150) is None \
+                    and process_events_until(lambda: cache.pixmap(source, 150) is not None):
+                pixmap = cache.pixmap(source, 150)
+            else:
+                print("  ✗ Thumbnail was not decoded")
+                return False
+            stat = os.stat(source)
+            variant_file = variant_path(cache_dir, (source, stat.st_mtime_ns, stat.st_size), 160)
+            if pixmap.width() == 160 and os.path.exists(variant_file) and ready == [source]:
+                print("  ✓ Thumbnail was decoded at 160 px and stored as a variant on disk")
+            else:
+                print(f"  ✗ Unexpected pixmap width {pixmap.width()} or missing variant file")
+                return False
+
+            missing = os.path.join(tmp_dir, 'missing.jpg')
+            cache.pixmap(missing, 150)
+            if process_events_until(lambda: cache.is_missing(missing)):
+                print("  ✓ Missing thumbnails are remembered as missing")
+            else:
+                print("  ✗ Missing thumbnail was not reported")
+                return False
+
+            small = ThumbnailCache(cache_dir=cache_dir, memory_budget=1)
+            small.pixmap(source, 150)
+            small.pixmap(source, 300)
+            process_events_until(lambda: not small._pending)
+            if len(small._pixmaps) == 1 and small._memory <= 320 * 180 * 4:
+                print("  ✓ Decoded pixmaps are evicted beyond the memory budget")
+            else:
+                print(f"  ✗ {len(small._pixmaps)} pixmaps kept over the budget")
+                return False
+
+    except Exception as e:
+        print(f"  ✗ Thumbnail cache test failed: {e}")
+        return False
+
+    print()
+    return True
+
+
+def test_grid_cell_size():
+    """Test that the grid fills its rows with cells between the size limits."""
+    print("Testing grid cell sizes...")
+
+    try:
+        get_app()
+        from app.history_model import HistoryTableModel
+        from app.history_grid import HistoryGridView, MIN_THUMB_WIDTH, MAX_THUMB_WIDTH, CELL_PADDING
+
+        view = HistoryGridView(HistoryTableModel())
+        widths = {}
+        for available in (100, 500, 1000, 2000):
+            view.adjust_thumb_width(available)
+            widths[available] = view.delegate.thumb_width
+        # As many columns as fit at the minimum width, each grown to share the row
+        fills_rows = all(
+            (available // (MIN_THUMB_WIDTH + CELL_PADDING)) * (width + CELL_PADDING) <= available
+            for available, width in widths.items() if available >= MIN_THUMB_WIDTH + CELL_PADDING
+        )
+        if widths[100] == MIN_THUMB_WIDTH and all(MIN_THUMB_WIDTH <= w <= MAX_THUMB_WIDTH for w in widths.values()) \
+                and widths[500] > MIN_THUMB_WIDTH and fills_rows:
+            print(f"  ✓ Thumbnail widths follow the available width: {widths}")
+        else:
+            print(f"  ✗ Unexpected thumbnail widths: {widths}")
+            return False
+
+    except Exception as e:
+        print(f"  ✗ Grid cell size test failed: {e}")
+        return False
+
+    print()
+    return True
+
+
+def main():
+    """Run all tests."""
+    print("="*60)
+    print("UVDM History Views Test Suite")
+    print("="*60)
+    print()
+
+    results = []
+
+    # Run tests
+    results.append(("Incremental Updates", test_incremental_updates()))
+    results.append(("Thumbnail Cache", test_thumbnail_cache()))
+    results.append(("Grid Cell Sizes", test_grid_cell_size()))
+
+    # Summary
+    print("="*60)
+    print("Test Summary")
+    print("="*60)
+
+    passed = sum(1 for _, result in results if result)
+    total = len(results)
+
+    for test_name, result in results:
+        status = "✓ PASS" if result else "✗ FAIL"
+        print(f"{test_name:30s} {status}")
+
+    print()
+    print(f"Total: {passed}/{total} tests passed")
+    print()
+
+    if passed == total:
+        print("🎉 All tests passed!")
+        return 0
+    else:
+        print("⚠️  Some tests failed. Please review the output above.")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
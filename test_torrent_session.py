@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Test script for the shared torrent session in UVDM.
+Tests rate caps and seed limits, fast-resume data and restoring the
+session's torrents, and streaming a torrent's file over HTTP. Torrents are
+created from local files and seeded without any network access.
+"""
+
+import sys
+import os
+import time
+import tempfile
+import warnings
+import urllib.request
+import urllib.error
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# No DHT, local discovery or port mapping; the test torrents are only seeded locally
+OFFLINE_SETTINGS = {'enable_dht': False, 'enable_lsd': False, 'enable_upnp': False, 'enable_natpmp': False}
+
+
+def create_torrent(folder):
+    """Write a two-file torrent of random data into `folder`; returns (.torrent path, video bytes)."""
+    import libtorrent as lt
+
+    content = os.path.join(folder, 'content')
+    os.makedirs(content)
+    video = os.urandom(3 * 1024 * 1024 + 4321)
+    with open(os.path.join(content, 'a_video.mp4'), 'wb') as f:
+        f.write(video)
+    with open(os.path.join(content, 'b_readme.txt'), 'wb') as f:
+        f.write(b'readme')
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning)
+        file_storage = lt.file_storage()
+        lt.add_files(file_storage, content)
+        torrent = lt.create_torrent(file_storage, 256 * 1024)
+        lt.set_piece_hashes(torrent, folder)
+    torrent_path = os.path.join(folder, 'content.torrent')
+    with open(torrent_path, 'wb') as f:
+        f.write(lt.bencode(torrent.generate()))
+    return torrent_path, video
+
+
+def wait_for(condition, timeout=20):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return condition()
+
+
+def new_manager(resume_folder):
+    from app.torrent_session import TorrentSessionManager
+    from app.torrent_resume import ResumeStore
+    return TorrentSessionManager('127.0.0.1:0', dict(OFFLINE_SETTINGS), ResumeStore(resume_folder))
+
+
+def is_seeding(manager, info_hash):
+    status = manager.status(info_hash)
+    return bool(status and status['is_seeding'])
+
+
+def test_range_parsing():
+    """Test HTTP Range parsing for the stream server."""
+    print("Testing Range header parsing...")
+
+    try:
+        from app.torrent_stream import parse_range
+        from app.torrent_session import _capped
+
+        cases = {
+            'bytes=0-99': (0, 99), 'bytes=500-': (500, 999), 'bytes=-100': (900, 999),
+            'bytes=990-5000': (990, 999), 'bytes=-5000': (0, 999),
+            'bytes=1000-': None, 'bytes=5-2': None, 'bytes=-': None, 'items=0-1': None, None: None,
+        }
+        results = {header: parse_range(header, 1000) for header in cases}
+        if results == cases:
+            print("  ✓ Ranges, open ranges and suffix ranges are parsed; unsatisfiable ones refused")
+        else:
+            print(f"  ✗ Unexpected ranges: {results}")
+            return False
+
+        if (_capped(0, 0), _capped(500, 0), _capped(500, 200), _capped(0, 300)) == (-1, 500, 200, 300):
+            print("  ✓ Rate limits take the smaller of the bandwidth share and the torrent's cap")
+        else:
+            print("  ✗ Unexpected rate limits")
+            return False
+
+    except Exception as e:
+        print(f"  ✗ Range parsing test failed: {e}")
+        return False
+
+    print()
+    return True
+
+
+def test_caps_and_seed_limits():
+    """Test per-torrent rate caps and share ratio limits in the shared session."""
+    print("Testing rate caps and seed limits...")
+
+    try:
+        from app.torrent_session import EVENT_ADDED
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            torrent_path, _ = create_torrent(tmp_dir)
+            manager = new_manager(os.path.join(tmp_dir, 'resume'))
+            events = []
+            manager.subscribe(lambda event, info_hash, payload: events.append((event, info_hash)))
+            try:
+                info_hash = manager.add_torrent(torrent_path, tmp_dir)
+                if manager.add_torrent(torrent_path, tmp_dir) == info_hash and manager.info_hashes() == [info_hash] \
+                        and (EVENT_ADDED, info_hash) in events and wait_for(lambda: is_seeding(manager, info_hash)):
+                    print("  ✓ Torrent was added once and seeds the files on disk")
+                else:
+                    print(f"  ✗ Unexpected torrents {manager.info_hashes()} or events {events}")
+                    return False
+
+                manager.set_torrent_options(info_hash, download_limit=50000, upload_limit=20000)
+                handle = manager.handle(info_hash)
+                if handle.download_limit() == 50000 and handle.upload_limit() == 20000:
+                    print("  ✓ Rate caps were applied to the torrent")
+                else:
+                    print(f"  ✗ Unexpected limits {handle.download_limit()} / {handle.upload_limit()}")
+                    return False
+
+                status = manager.status(info_hash)
+                manager.set_seed_limits(ratio_limit=5.0)
+                manager._check_seed_limits(dict(status, ratio=3.0))
+                still_seeding = manager.status(info_hash)['auto_managed']
+                manager.set_torrent_options(info_hash, ratio_limit=2.0)
+                manager._check_seed_limits(dict(status, ratio=3.0))
+                if still_seeding and wait_for(lambda: not manager.status(info_hash)['auto_managed']):
+                    print("  ✓ The torrent's own ratio limit overrides the session's and stops seeding")
+                else:
+                    print("  ✗ Seed limits were not applied")
+                    return False
+            finally:
+                manager.shutdown()
+
+    except Exception as e:
+        print(f"  ✗ Rate cap and seed limit test failed: {e}")
+        return False
+
+    print()
+    return True
+
+
+def test_resume_and_restore():
+    """Test that the session's torrents come back after a restart, from their resume data."""
+    print("Testing fast resume and restore...")
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            torrent_path, _ = create_torrent(tmp_dir)
+            resume_folder = os.path.join(tmp_dir, 'resume')
+            manager = new_manager(resume_folder)
+            info_hash = manager.add_torrent(torrent_path, tmp_dir)
+            manager.set_torrent_options(info_hash, seed_time_limit=3600)
+            wait_for(lambda: is_seeding(manager, info_hash))
+            manager.shutdown()
+
+            if os.path.exists(os.path.join(resume_folder, info_hash + '.fastresume')) \
+                    and [entry['info_hash'] for entry in manager.resume_store.load_torrent_list()] == [info_hash]:
+                print("  ✓ Resume data and the torrent list were saved on shutdown")
+            else:
+                print(f"  ✗ Missing resume data or torrent list in {os.listdir(resume_folder)}")
+                return False
+
+            # The .torrent file is not needed any more; the resume data carries the metadata
+            os.remove(torrent_path)
+            manager = new_manager(resume_folder)
+            try:
+                manager.restore()
+                manager.restore()
+                if manager.info_hashes() == [info_hash] \
+                        and manager.torrent_options(info_hash)['seed_time_limit'] == 3600 \
+                        and wait_for(lambda: is_seeding(manager, info_hash)) \
+                        and manager.torrent_info(info_hash).get('name') == 'content':
+                    print("  ✓ Torrent was restored once, with its options and metadata")
+                else:
+                    print(f"  ✗ Unexpected restored torrents: {manager.info_hashes()}")
+                    return False
+
+                manager.remove_torrent(info_hash)
+                if manager.resume_store.load_torrent_list() == [] \
+                        and os.path.exists(os.path.join(resume_folder, info_hash + '.fastresume')):
+                    print("  ✓ A stopped torrent is not restored again but keeps its resume data")
+                else:
+                    print("  ✗ Stopped torrent is still listed for restore")
+                    return False
+            finally:
+                manager.shutdown()
+
+    except Exception as e:
+        print(f"  ✗ Resume and restore test failed: {e}")
+        return False
+
+    print()
+    return True
+
+
+def test_streaming():
+    """Test serving a torrent's file over the local stream server with byte ranges."""
+    print("Testing torrent streaming...")
+
+    try:
+        from app.torrent_stream import StreamServer
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            torrent_path, video = create_torrent(tmp_dir)
+            manager = new_manager(os.path.join(tmp_dir, 'resume'))
+            server = StreamServer(manager)
+            try:
+                info_hash = manager.add_torrent(torrent_path, tmp_dir)
+                wait_for(lambda: is_seeding(manager, info_hash))
+                url = server.url(info_hash, 0)
+
+                request = urllib.request.Request(url, headers={'Range': 'bytes=262000-262999'})
+                with urllib.request.urlopen(request, timeout=30) as response:
+                    status, body = response.status, response.read()
+                if status == 206 and body == video[262000:263000]:
+                    print("  ✓ A range across a piece boundary was served from the torrent")
+                else:
+                    print(f"  ✗ Unexpected response {status} with {len(body)} bytes")
+                    return False
+
+                with urllib.request.urlopen(url, timeout=30) as response:
+                    body = response.read()
+                if body == video and response.headers['Content-Type'] == 'video/mp4':
+                    print("  ✓ The whole file was served in order")
+                else:
+                    print(f"  ✗ Full response had {len(body)} of {len(video)} bytes")
+                    return False
+
+                try:
+                    urllib.request.urlopen(urllib.request.Request(url, headers={'Range': 'bytes=99999999-'}), timeout=30)
+                    print("  ✗ Unsatisfiable range was served")
+                    return False
+                except urllib.error.HTTPError as e:
+                    if e.code != 416:
+                        print(f"  ✗ Unexpected status {e.code} for an unsatisfiable range")
+                        return False
+                print("  ✓ Unsatisfiable ranges get 416")
+            finally:
+                server.shutdown()
+                manager.shutdown()
+
+    except Exception as e:
+        print(f"  ✗ Torrent streaming test failed: {e}")
+        return False
+
+    print()
+    return True
+
+
+def main():
+    """Run all tests."""
+    print("="*60)
+    print("UVDM Torrent Session Test Suite")
+    print("="*60)
+    print()
+
+    results = []
+
+    # Run tests
+    results.append(("Range Parsing", test_range_parsing()))
+    results.append(("Caps and Seed Limits", test_caps_and_seed_limits()))
+    results.append(("Resume and Restore", test_resume_and_restore()))
+    results.append(("Streaming", test_streaming()))
+
+    # Summary
+    print("="*60)
+    print("Test Summary")
+    print("="*60)
+
+    passed = sum(1 for _, result in results if result)
+    total = len(results)
+
+    for test_name, result in results:
+        status = "✓ PASS" if result else "✗ FAIL"
+        print(f"{test_name:30s} {status}")
+
+    print()
+    print(f"Total: {passed}/{total} tests passed")
+    print()
+
+    if passed == total:
+        print("🎉 All tests passed!")
+        return 0
+    else:
+        print("⚠️  Some tests failed. Please review the output above.")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())